@@ -0,0 +1,55 @@
+"""Vectorized next billing dates against the PlanCost.next_billing_datetime loop.
+
+    $ python -m benchmarks.bench_billing_dates --rows 1000000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.utils import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    setup_django(migrate=False)
+    import numpy as np
+    from subscriptions_api.models import PlanCost, DAY, WEEK, MONTH, YEAR
+    from subscriptions_api.recurrence import next_billing_datetimes
+
+    rng = np.random.default_rng(0)
+    base = datetime(2020, 1, 1)
+    starts = [base + timedelta(seconds=int(s)) for s in rng.integers(0, 3 * 365 * 86400, args.rows)]
+    units = rng.choice([DAY, WEEK, MONTH, YEAR], args.rows)
+    periods = rng.integers(1, 13, args.rows)
+    costs = {}
+
+    start = time.perf_counter()
+    scalar = []
+    for current, unit, period in zip(starts, units.tolist(), periods.tolist()):
+        cost = costs.get((unit, period))
+        if cost is None:
+            cost = costs[(unit, period)] = PlanCost(recurrence_unit=unit, recurrence_period=period)
+        scalar.append(cost.next_billing_datetime(current))
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = next_billing_datetimes(starts, units, periods)
+    vectorized_time = time.perf_counter() - start
+
+    starts64 = np.array(starts, dtype='datetime64[us]')
+    start = time.perf_counter()
+    next_billing_datetimes(starts64, units, periods)
+    vectorized64_time = time.perf_counter() - start
+
+    assert vectorized.tolist() == scalar
+    print('rows: {}'.format(args.rows))
+    print('scalar loop:                 {:.3f}s'.format(scalar_time))
+    print('vectorized (datetime list):  {:.3f}s ({:.1f}x)'.format(vectorized_time, scalar_time / vectorized_time))
+    print('vectorized (datetime64):     {:.3f}s ({:.1f}x)'.format(vectorized64_time, scalar_time / vectorized64_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Throughput and memory of the streaming transaction export.
+
+The defaults seed 5M transactions (100000 subscriptions with 50
+transactions each), seeding takes a while, use smaller numbers for a quick
+run. Peak memory (tracemalloc) should not depend on the number of rows.
+
+    $ python -m benchmarks.bench_export --subscriptions 100000 --transactions 50
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.utils import setup_django, seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscriptions', type=int, default=100000)
+    parser.add_argument('--transactions', type=int, default=50, help='Transactions per subscription')
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    import swapper
+    from subscriptions_api.export import export_lines
+
+    SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+    seed(args.subscriptions, transactions_per_subscription=args.transactions)
+    queryset = SubscriptionTransaction.objects.order_by('date_transaction', 'id')
+    rows = queryset.count()
+
+    for export_format in ('csv', 'ndjson'):
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = sum(len(line) for line in export_lines(queryset, export_format, chunk_size=args.chunk_size))
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print('{:<7} {} rows {:.3f}s  {:.0f} rows/s  {:.1f} MB written  {:.1f} MB peak'.format(
+            export_format, rows, elapsed, rows / elapsed, size / 1e6, peak / 1e6,
+        ))
+
+
+if __name__ == '__main__':
+    main()
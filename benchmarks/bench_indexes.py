@@ -0,0 +1,79 @@
+"""Query plans and timings of the hot subscription queries with and without
+the composite/partial indexes of the subscription models.
+
+    $ python -m benchmarks.bench_indexes --subscriptions 200000
+"""
+import argparse
+
+from benchmarks.utils import setup_django, seed, timed
+
+
+def hot_queries():
+    import swapper
+    from django.utils import timezone
+    from subscriptions_api.billing import BillingEngine
+    from subscriptions_api.expressions import flag
+
+    UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+    SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+    now = timezone.now()
+    subscription = UserSubscription.objects.filter(active=True).order_by('pk').first()
+
+    return {
+        'due scan': BillingEngine(now=now).get_queryset().order_by('date_billing_next', 'pk')[:1000],
+        'active subscriptions of user': UserSubscription.objects.filter(
+            user_id=subscription.user_id, **flag('active', True)
+        ).order_by(),
+        'unpaid transactions of subscription': SubscriptionTransaction.objects.filter(
+            subscription=subscription, paid=False
+        ),
+        'subscriptions default ordering': UserSubscription.objects.all()[:100],
+        'transactions default ordering': SubscriptionTransaction.objects.all()[:100],
+    }
+
+
+def run(label):
+    print('=' * 20, label, '=' * 20)
+    for name, queryset in hot_queries().items():
+        print('--', name)
+        print(queryset.explain())
+        print('median {:.3f} ms'.format(timed(lambda: list(queryset.all())) * 1000))
+    print()
+
+
+def analyze():
+    from django.db import connection
+
+    if connection.vendor in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def drop_indexes():
+    import swapper
+    from django.db import connection
+
+    with connection.schema_editor() as editor:
+        for model_name in ('UserSubscription', 'SubscriptionTransaction'):
+            model = swapper.load_model('subscriptions_api', model_name)
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscriptions', type=int, default=100000)
+    parser.add_argument('--transactions', type=int, default=3, help='transactions per subscription')
+    args = parser.parse_args()
+
+    setup_django()
+    seed(args.subscriptions, transactions_per_subscription=args.transactions)
+    analyze()
+    run('with indexes')
+    drop_indexes()
+    analyze()
+    run('without indexes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Throughput of sending each notification synchronously from notify(),
+EmailNotification.send_many and the notification outbox worker.
+
+Uses the locmem mail backend by default, pass ``--backend smtp`` with
+``--port`` to measure against a local SMTP stand-in e.g
+``python -m aiosmtpd -n -l localhost:8025``.
+
+    $ python -m benchmarks.bench_outbox --notifications 2000 --batch-size 200
+"""
+import argparse
+import time
+
+from benchmarks.utils import setup_django, seed
+
+BACKENDS = {
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+    'smtp': 'django.core.mail.backends.smtp.EmailBackend',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--notifications', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='locmem')
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    settings.EMAIL_BACKEND = BACKENDS[args.backend]
+    settings.EMAIL_HOST = 'localhost'
+    settings.EMAIL_PORT = args.port
+
+    import swapper
+    from subscriptions_api.models import NotificationOutbox
+    from subscriptions_api.notifications import EmailNotification
+    from subscriptions_api.outbox import OutboxWorker
+
+    UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+    from django.contrib.auth import get_user_model
+    from django.db.models import Value
+    from django.db.models.functions import Concat
+
+    seed(args.notifications)
+    get_user_model().objects.update(email=Concat('username', Value('@example.com')))
+    subscriptions = list(UserSubscription.objects.select_related('user')[:args.notifications])
+
+    start = time.perf_counter()
+    for subscription in subscriptions:
+        subscription.notify_overdue()
+    elapsed = time.perf_counter() - start
+    print('{:<10} {:.3f}s  {:.1f} notifications/s'.format('notify()', elapsed, len(subscriptions) / elapsed))
+
+    start = time.perf_counter()
+    report = EmailNotification.send_many(subscriptions, 'notify_overdue')
+    elapsed = time.perf_counter() - start
+    print('{:<10} {:.3f}s  {:.1f} notifications/s'.format('send_many', elapsed, len(report.sent) / elapsed))
+
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(subscription=subscription, notification='notify_overdue')
+        for subscription in subscriptions
+    ])
+    stats = OutboxWorker(batch_size=args.batch_size).run()
+    print('{:<10} {:.3f}s  {:.1f} notifications/s ({} batches)'.format('outbox', stats.elapsed, stats.rate, stats.batches))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Attribute access on SubscriptionPlan features, parsing the json on every
+lookup (previous behaviour) against the per instance parsed cache.
+
+    $ python -m benchmarks.bench_plan_features --lookups 100000
+"""
+import argparse
+import json
+import time
+
+from benchmarks.utils import setup_django
+
+
+def old_getattr(plan, name):
+    """SubscriptionPlan.__getattr__ before the parsed features cache."""
+    feature_dict = json.loads(plan.features) if plan.features else {}
+    try:
+        return feature_dict[name]
+    except KeyError:
+        raise AttributeError(name)
+
+
+def run(label, lookup, plan, lookups):
+    start = time.perf_counter()
+    for _ in range(lookups):
+        lookup(plan, 'api_calls_per_minute')
+        try:
+            lookup(plan, '_prefetched_objects_cache')
+        except AttributeError:
+            pass
+    elapsed = time.perf_counter() - start
+    print('{:<10} {:.3f}s  {:.2f} us/lookup'.format(label, elapsed, elapsed / (2 * lookups) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--features', type=int, default=30, help='number of features of the plan')
+    args = parser.parse_args()
+
+    setup_django(migrate=False)
+    from subscriptions_api.models import SubscriptionPlan
+
+    features = {'feature_{}'.format(i): i for i in range(args.features)}
+    features['api_calls_per_minute'] = 600
+    plan = SubscriptionPlan(plan_name='Bench Plan', features=json.dumps(features))
+
+    print('{} feature hits and {} misses'.format(args.lookups, args.lookups))
+    run('before', old_getattr, plan, args.lookups)
+    run('after', getattr, plan, args.lookups)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Credit computation over many subscriptions: the per instance
+unused_daily_balance property, prorate() and the with_unused_balance()
+database annotation.
+
+    $ python -m benchmarks.bench_proration --subscriptions 50000
+"""
+import argparse
+
+from benchmarks.utils import setup_django, seed, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscriptions', type=int, default=50000)
+    args = parser.parse_args()
+
+    setup_django()
+    import swapper
+    from django.db.models import Sum
+    from subscriptions_api.proration import prorate
+
+    UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+    seed(args.subscriptions)
+    queryset = UserSubscription.objects.filter(active=True)
+
+    def properties():
+        return sum(subscription.unused_daily_balance for subscription in queryset.select_related('plan_cost'))
+
+    def batch():
+        return sum(prorate(queryset).values())
+
+    def annotation():
+        return queryset.with_unused_balance().aggregate(total=Sum('unused_balance'))['total']
+
+    for label, func in (('property', properties), ('prorate', batch), ('annotate', annotation)):
+        print('{:<10} {:.3f}s  total {}'.format(label, timed(func, repeat=3), func()))
+
+
+if __name__ == '__main__':
+    main()
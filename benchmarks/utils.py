@@ -0,0 +1,106 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database by default, set
+``DJANGO_SETTINGS_MODULE`` to run them against your own database settings
+(the database is migrated and seeded so don't point it at real data).
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(migrate=True):
+    sys.path.insert(0, BASE_DIR)
+    import django
+    from django.conf import settings
+
+    if not os.environ.get('DJANGO_SETTINGS_MODULE'):
+        settings.configure(
+            DATABASES={'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(tempfile.mkdtemp(), 'bench.sqlite3'),
+            }},
+            INSTALLED_APPS=(
+                'django.contrib.auth',
+                'django.contrib.contenttypes',
+                'rest_framework',
+                'subscriptions_api',
+            ),
+            SECRET_KEY='not very secret in benchmarks',
+            USE_TZ=True,
+            DEFAULT_AUTO_FIELD='django.db.models.AutoField',
+        )
+    django.setup()
+
+    if migrate:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+
+
+def timed(func, repeat=5):
+    """Returns the median wall time of ``func`` in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def seed(subscriptions, transactions_per_subscription=1, plans=5, batch_size=5000):
+    """Seeds users, plans, subscriptions and transactions in bulk."""
+    import swapper
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import Group
+    from django.utils import timezone
+    from subscriptions_api.models import SubscriptionPlan, PlanCost, MONTH
+
+    User = get_user_model()
+    UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+    SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+
+    now = timezone.now()
+    costs = []
+    for i in range(plans):
+        group = Group.objects.create(name='Bench Plan {}'.format(i))
+        plan = SubscriptionPlan.objects.create(plan_name='Bench Plan {}'.format(i), group=group)
+        costs.append(PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=Decimal('9.99') * (i + 1)))
+
+    for offset in range(0, subscriptions, batch_size):
+        count = min(batch_size, subscriptions - offset)
+        users = User.objects.bulk_create(
+            [User(username='bench_{}'.format(offset + i)) for i in range(count)]
+        )
+        if users[0].pk is None:
+            users = list(User.objects.filter(username__startswith='bench_').order_by('-pk')[:count])
+        subs = []
+        for i, user in enumerate(users):
+            cost = costs[i % plans]
+            start = now - timedelta(days=(offset + i) % 32)
+            subs.append(UserSubscription(
+                user=user,
+                plan_cost=cost,
+                active=(offset + i) % 4 != 0,
+                date_billing_start=start,
+                date_billing_next=cost.next_billing_datetime(start),
+                date_billing_end=cost.next_billing_datetime(start),
+            ))
+        UserSubscription.objects.bulk_create(subs)
+        SubscriptionTransaction.objects.bulk_create([
+            SubscriptionTransaction(
+                user_id=sub.user_id,
+                subscription=sub,
+                date_transaction=sub.date_billing_start - timedelta(days=30 * n),
+                amount=sub.plan_cost.cost,
+                paid=n > 0 or (offset + i) % 3 != 0,
+            )
+            for i, sub in enumerate(subs)
+            for n in range(transactions_per_subscription)
+        ])
+    return costs
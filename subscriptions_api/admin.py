@@ -1,6 +1,7 @@
 from django.contrib import admin
 from swapper import load_model
-from subscriptions_api.models import PlanList, PlanListDetail, PlanTag, PlanCost, SubscriptionPlan
+from subscriptions_api.models import PlanList, PlanListDetail, PlanTag, PlanCost, SubscriptionPlan, NotificationOutbox, \
+    NotificationLedger, DailyRevenueRollup
 
 UserSubscription = load_model('subscriptions_api', 'UserSubscription')
 SubscriptionTransaction = load_model('subscriptions_api', 'SubscriptionTransaction')
@@ -12,3 +13,6 @@ admin.site.register(PlanList)
 admin.site.register(PlanListDetail)
 admin.site.register(UserSubscription)
 admin.site.register(SubscriptionTransaction)
+admin.site.register(NotificationOutbox)
+admin.site.register(NotificationLedger)
+admin.site.register(DailyRevenueRollup)
@@ -1,4 +1,6 @@
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 
 
 def string_to_module_and_class(string):
@@ -21,6 +23,15 @@ def compile_settings():
             dict: All possible Django Flexible Subscriptions settings.
     """
     default_plan_cost_id = getattr(settings, 'DFS_DEFAULT_PLAN_COST_ID', None)
+    billing_chunk_size = getattr(settings, 'DFS_BILLING_CHUNK_SIZE', 1000)
+    entitlements_cache = getattr(settings, 'DFS_ENTITLEMENTS_CACHE', 'default')
+    entitlements_timeout = getattr(settings, 'DFS_ENTITLEMENTS_TIMEOUT', 300)
+    throttle_cache = getattr(settings, 'DFS_THROTTLE_CACHE', None)
+    catalog_cache = getattr(settings, 'DFS_CATALOG_CACHE', 'default')
+    catalog_timeout = getattr(settings, 'DFS_CATALOG_TIMEOUT', 3600)
+    catalog_gzip = getattr(settings, 'DFS_CATALOG_GZIP', False)
+    pagination_count = getattr(settings, 'DFS_PAGINATION_COUNT', None)
+    notify_outbox = getattr(settings, 'DFS_NOTIFY_OUTBOX', False)
     plans_concrete_module = getattr(
         settings, 'DFS_CONCRETE_PLANS_MODULE', 'subscriptions_api.plans'
     )
@@ -64,6 +75,11 @@ def compile_settings():
     )
     subscribe_notify_deactivate_class = string_to_module_and_class(subscribe_notify_deactivate)
 
+    subscribe_notify_digest = getattr(
+        settings, 'DFS_NOTIFY_DIGEST', 'subscriptions_api.notifications.DigestEmailNotification'
+    )
+    subscribe_notify_digest_class = string_to_module_and_class(subscribe_notify_digest)
+
     return {
         'notify_processing': subscribe_notify_processing_class,
         'notify_expired': subscribe_notify_expired_class,
@@ -73,9 +89,27 @@ def compile_settings():
         'notify_deactivate': subscribe_notify_deactivate_class,
         'notify_payment_error': subscribe_notify_payment_error_class,
         'notify_payment_success': subscribe_notify_payment_success_class,
+        'notify_digest': subscribe_notify_digest_class,
         'plans_concrete_module': plans_concrete_module,
-        'default_plan_cost_id': default_plan_cost_id
+        'default_plan_cost_id': default_plan_cost_id,
+        'billing_chunk_size': billing_chunk_size,
+        'entitlements_cache': entitlements_cache,
+        'entitlements_timeout': entitlements_timeout,
+        'throttle_cache': throttle_cache,
+        'catalog_cache': catalog_cache,
+        'catalog_timeout': catalog_timeout,
+        'catalog_gzip': catalog_gzip,
+        'pagination_count': pagination_count,
+        'notify_outbox': notify_outbox,
     }
 
 
 SETTINGS = compile_settings()
+
+
+@receiver(setting_changed, dispatch_uid='subscriptions_api_reload_settings')
+def reload_settings(setting, **kwargs):
+    """Recompiles SETTINGS in place when a DFS_* setting is overridden."""
+    if setting.startswith('DFS_'):
+        SETTINGS.clear()
+        SETTINGS.update(compile_settings())
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class SubscriptionsApiConfig(AppConfig):
+    name = 'subscriptions_api'
+
+    def ready(self):
+        from subscriptions_api import signals  # noqa: F401
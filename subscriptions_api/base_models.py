@@ -1,8 +1,9 @@
-import importlib
 from datetime import timedelta
 from uuid import uuid4
 
 import swapper
+from asgiref.sync import sync_to_async
+from django.apps import apps
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.db import models
@@ -10,6 +11,9 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from subscriptions_api.app_settings import SETTINGS
+from subscriptions_api.expressions import flag
+from subscriptions_api.managers import SubscriptionTransactionQuerySet, UserSubscriptionQuerySet
+from subscriptions_api.notifications import asend_notifier, get_notifier
 
 SubscriptionTransactionModel = swapper.get_model_name(
     "subscriptions_api", "SubscriptionTransaction"
@@ -17,7 +21,72 @@ SubscriptionTransactionModel = swapper.get_model_name(
 UserSubscriptionModel = swapper.get_model_name("subscriptions_api", "UserSubscription")
 
 
-class BaseUserSubscription(models.Model):
+class DirtyFieldsMixin:
+    """Tracks the concrete field values an instance was loaded or last saved with.
+
+    ``get_dirty_fields()`` returns the fields changed since then. The tracked
+    state is only reset once ``save()`` returns so pre_save and post_save
+    receivers can use ``instance.get_dirty_fields()`` to skip work when
+    nothing relevant changed.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_fields()
+        return instance
+
+    def _current_field_values(self):
+        # Deferred fields are not in __dict__ and are not tracked
+        return {
+            field.name: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def _snapshot_fields(self, fields=None):
+        current = self._current_field_values()
+        if fields is None or "_loaded_field_values" not in self.__dict__:
+            self._loaded_field_values = current
+            return
+        for name in fields:
+            name = self._meta.get_field(name).name
+            if name in current:
+                self._loaded_field_values[name] = current[name]
+
+    def get_dirty_fields(self):
+        """Returns a dict of changed field names and their previous values
+        (all fields with None for instances not loaded from the database)."""
+        current = self._current_field_values()
+        loaded = self.__dict__.get("_loaded_field_values")
+        if loaded is None:
+            return dict.fromkeys(current)
+        return {
+            name: loaded.get(name)
+            for name, value in current.items()
+            if name not in loaded or loaded[name] != value
+        }
+
+    def save_changes(self):
+        """Saves only the changed fields (the whole row for new instances)."""
+        if self._state.adding or "_loaded_field_values" not in self.__dict__:
+            self.save()
+            return
+        dirty_fields = [name for name in self.get_dirty_fields() if not self._meta.get_field(name).primary_key]
+        if dirty_fields:
+            self.save(update_fields=dirty_fields)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields", args[3] if len(args) > 3 else None)
+        self._snapshot_fields(update_fields)
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot_fields(fields)
+
+
+class BaseUserSubscription(DirtyFieldsMixin, models.Model):
     """Details of a user's specific subscription."""
 
     id = models.UUIDField(
@@ -77,11 +146,28 @@ class BaseUserSubscription(models.Model):
         default=False, help_text=_("whether this subscription is cancelled or not"),
     )
 
+    objects = UserSubscriptionQuerySet.as_manager()
+
     class Meta:
         ordering = (
             "user",
             "date_billing_start",
         )
+        indexes = [
+            # Due subscriptions scan of the billing run, in its (date_billing_next, pk) keyset order
+            models.Index(fields=["active", "date_billing_next", "id"], name="dfs_usub_active_next_id_idx"),
+            # Active subscriptions of a user e.g deactivate_previous_subscriptions
+            models.Index(fields=["user", "active"], name="dfs_usub_user_active_idx"),
+            # Default ordering
+            models.Index(fields=["user", "date_billing_start"], name="dfs_usub_user_start_idx"),
+            # Keyset of the subscriptions cursor pagination
+            models.Index(fields=["date_billing_start", "id"], name="dfs_usub_start_id_idx"),
+            # Endpoint filters (filters.py), plan_cost and user have their foreign key index
+            models.Index(fields=["date_billing_next"], name="dfs_usub_next_idx"),
+            models.Index(fields=["due", "date_billing_next"], name="dfs_usub_due_next_idx"),
+            models.Index(fields=["cancelled", "date_billing_next"], name="dfs_usub_cancel_next_idx"),
+            models.Index(fields=["reference"], name="dfs_usub_reference_idx"),
+        ]
         abstract = True
 
     def record_transaction(self, amount=None, transaction_date=None, paid=False):
@@ -105,6 +191,7 @@ class BaseUserSubscription(models.Model):
         return SubscriptionTransaction.objects.create(
             user=self.user,
             subscription=self,  # A transaction should link to is subscription
+            plan_cost=self.plan_cost,
             date_transaction=transaction_date,
             amount=amount,
             paid=paid
@@ -161,8 +248,8 @@ class BaseUserSubscription(models.Model):
         self.date_billing_next = next_billing_date
         self._add_user_to_group()
         if mark_transaction_paid:
-            self.transactions.update(paid=True)
-        self.save()
+            self.transactions.mark_paid()
+        self.save_changes()
 
     def deactivate(self, activate_default=False):
         current_date = timezone.now()
@@ -171,16 +258,14 @@ class BaseUserSubscription(models.Model):
         self.cancelled = True
         self.due = False
         self._remove_user_from_group()
-        self.save()
+        self.save_changes()
         if activate_default:
             self.plan_cost.activate_default_user_subscription(self.user)
 
     def deactivate_previous_subscriptions(self, del_multiple_subscription=False):
-        previous_subscriptions = self.user.subscriptions.filter(active=True).all()
-        for sub in previous_subscriptions:
-            sub.deactivate()
-            if del_multiple_subscription:
-                sub.delete()
+        """Deactivates (or deletes) all other active subscriptions of the user."""
+        previous_subscriptions = self.user.subscriptions.filter(**flag('active', True)).exclude(pk=self.pk)
+        previous_subscriptions.bulk_deactivate(delete=del_multiple_subscription)
 
     def _add_user_to_group(self):
         try:
@@ -202,16 +287,42 @@ class BaseUserSubscription(models.Model):
         """
         param notififer: notifie class that takes usersubscription object and has a send method
         """
-        if SETTINGS[notifier] is None:
+        Notify = get_notifier(notifier)  # pylint: disable=invalid-name
+        if Notify is None:
             return
-        Notify = getattr(  # pylint: disable=invalid-name
-            importlib.import_module(SETTINGS[notifier]["module"]),
-            SETTINGS[notifier]["class"],
-        )
+        if SETTINGS["notify_outbox"]:
+            return self.enqueue_notification(notifier, **kwargs)
+        notify_obj = Notify(self, notifier, **kwargs)
+        send = getattr(notify_obj, "send", None)
+        if send is not None:
+            send()
+        return notify_obj
+
+    async def anotify(self, notifier, **kwargs):
+        """
+        Async version of notify(), awaits the asend() of the notifier
+        """
+        Notify = get_notifier(notifier)  # pylint: disable=invalid-name
+        if Notify is None:
+            return
+        if SETTINGS["notify_outbox"]:
+            return await sync_to_async(self.enqueue_notification)(notifier, **kwargs)
         notify_obj = Notify(self, notifier, **kwargs)
-        notify_obj.send()
+        await asend_notifier(notify_obj)
         return notify_obj
 
+    def enqueue_notification(self, notifier, **kwargs):
+        """Queues a notification in the outbox, the send_outbox command sends it.
+            The row is written on the current transaction so a notification
+            queued inside transaction.atomic() together with a lifecycle
+            change is only sent if the change is committed. kwargs must be
+            json serializable.
+            Returns:
+                obj: The NotificationOutbox instance.
+        """
+        NotificationOutbox = apps.get_model("subscriptions_api", "NotificationOutbox")
+        return NotificationOutbox.objects.create(subscription=self, notification=notifier, kwargs=kwargs)
+
     def notify_processing(self, **kwargs):
         """Sends notification of processing subscription.
 
@@ -260,6 +371,38 @@ class BaseUserSubscription(models.Model):
         """
         return self.notify("notify_payment_success", **kwargs)
 
+    async def anotify_processing(self, **kwargs):
+        """Async version of notify_processing()."""
+        return await self.anotify("notify_processing", **kwargs)
+
+    async def anotify_expired(self, **kwargs):
+        """Async version of notify_expired()."""
+        return await self.anotify("notify_expired", **kwargs)
+
+    async def anotify_overdue(self, **kwargs):
+        """Async version of notify_overdue()."""
+        return await self.anotify("notify_overdue", **kwargs)
+
+    async def anotify_new(self, **kwargs):
+        """Async version of notify_new()."""
+        return await self.anotify("notify_new", **kwargs)
+
+    async def anotify_activate(self, **kwargs):
+        """Async version of notify_activate()."""
+        return await self.anotify("notify_activate", **kwargs)
+
+    async def anotify_deactivate(self, **kwargs):
+        """Async version of notify_deactivate()."""
+        return await self.anotify("notify_deactivate", **kwargs)
+
+    async def anotify_payment_error(self, **kwargs):
+        """Async version of notify_payment_error()."""
+        return await self.anotify("notify_payment_error", **kwargs)
+
+    async def anotify_payment_success(self, **kwargs):
+        """Async version of notify_payment_success()."""
+        return await self.anotify("notify_payment_success", **kwargs)
+
     def __str__(self):
         return "{}|{}|{}|{}|{}|{}|{}".format(
             self.id,
@@ -272,7 +415,7 @@ class BaseUserSubscription(models.Model):
         )
 
 
-class BaseSubscriptionTransaction(models.Model):
+class BaseSubscriptionTransaction(DirtyFieldsMixin, models.Model):
     """Details for a subscription plan billing."""
 
     id = models.UUIDField(
@@ -292,6 +435,22 @@ class BaseSubscriptionTransaction(models.Model):
         on_delete=models.SET_NULL,
         related_name="transactions",
     )
+    plan = models.ForeignKey(
+        "subscriptions_api.SubscriptionPlan",
+        blank=True,
+        help_text=_("the plan the subscription was billed with"),
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="transactions",
+    )
+    plan_cost = models.ForeignKey(
+        "subscriptions_api.PlanCost",
+        blank=True,
+        help_text=_("the plan cost the subscription was billed with"),
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="transactions",
+    )
     date_transaction = models.DateTimeField(
         help_text=_("the datetime the transaction was billed"),
         verbose_name="transaction date",
@@ -306,13 +465,39 @@ class BaseSubscriptionTransaction(models.Model):
 
     paid = models.BooleanField(default=False, help_text=_("Mark transaction has paid"))
 
+    objects = SubscriptionTransactionQuerySet.as_manager()
+
     class Meta:
         ordering = (
             "-date_transaction",
             "user",
         )
+        indexes = [
+            # Default ordering
+            models.Index(fields=["-date_transaction", "user"], name="dfs_stx_date_user_idx"),
+            # Unpaid transactions of a subscription marked paid on activation
+            models.Index(fields=["subscription"], name="dfs_stx_unpaid_idx", condition=models.Q(paid=False)),
+            # Keyset of the transactions cursor pagination
+            models.Index(fields=["date_transaction", "id"], name="dfs_stx_date_id_idx"),
+            # Paid filter of the endpoints, with a date range
+            models.Index(fields=["paid", "date_transaction"], name="dfs_stx_paid_date_idx"),
+        ]
         abstract = True
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.set_billed_plan()
+        super().save(*args, **kwargs)
+
+    def set_billed_plan(self):
+        """Keeps the plan and plan cost of the subscription on a new
+        transaction, it stays reported under them if the subscription
+        changes plan or is deleted."""
+        if self.plan_cost_id is None and self.subscription_id is not None:
+            self.plan_cost = self.subscription.plan_cost
+        if self.plan_id is None and self.plan_cost_id is not None:
+            self.plan_id = self.plan_cost.plan_id
+
     def __str__(self):
         return "{} {} {} {} {}".format(
             self.id, self.date_transaction, self.amount, self.paid, self.subscription
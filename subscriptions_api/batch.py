@@ -0,0 +1,43 @@
+"""Helpers shared by the batch jobs (billing.py and outbox.py)."""
+import time
+
+from django.db import connections
+
+
+def select_for_update(queryset, skip_locked=False):
+    """Locks the rows of the queryset until the end of the transaction where
+    the database supports it, only the rows of its own model where ``of``
+    is supported. With skip_locked rows locked by others are left out."""
+    features = connections[queryset.db].features
+    if not features.has_select_for_update:
+        return queryset
+    return queryset.select_for_update(
+        skip_locked=skip_locked and features.has_select_for_update_skip_locked,
+        of=('self',) if features.has_select_for_update_of else (),
+    )
+
+
+class RunStats:
+    """Throughput statistics of a batch run.
+
+    Subclasses list their ``counters`` (starting at 0) and name the counter
+    ``rate`` is computed from.
+    """
+    counters = ()
+    rate_counter = None
+
+    def __init__(self):
+        for name in self.counters:
+            setattr(self, name, 0)
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        """Items of the rate counter per second."""
+        if not self.elapsed:
+            return 0.0
+        return getattr(self, self.rate_counter) / self.elapsed
@@ -0,0 +1,144 @@
+"""Batch billing of due user subscriptions.
+
+The per-row helpers on the models (``record_transaction`` and
+``PlanCost.next_billing_datetime``) are fine for a single subscription, a
+billing cycle over many subscriptions should go through ``BillingEngine``
+which works on chunks keyset-paginated on (``date_billing_next``, ``pk``) and
+writes with ``bulk_create`` and ``bulk_update``.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+import swapper
+from django.db import router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from subscriptions_api.app_settings import SETTINGS
+from subscriptions_api.batch import RunStats, select_for_update
+from subscriptions_api.expressions import flag
+from subscriptions_api.rollup import record_transactions
+
+
+class BillingStats(RunStats):
+    """Throughput statistics of a billing run, rate is in subscriptions billed per second."""
+    counters = ('chunks', 'subscriptions', 'transactions')
+    rate_counter = 'subscriptions'
+
+    def __init__(self):
+        super().__init__()
+        self.amount = Decimal('0.00')
+
+    def __str__(self):
+        return 'Billed {} subscriptions ({} transactions, {} total) in {} chunks, {:.2f}s, {:.1f} subscriptions/s'.format(
+            self.subscriptions, self.transactions, self.amount, self.chunks, self.elapsed, self.rate
+        )
+
+
+class BillingEngine:
+    """Bills every active subscription whose ``date_billing_next`` has passed.
+
+        Parameters:
+            chunk_size (int): Number of subscriptions billed per chunk
+                (defaults to DFS_BILLING_CHUNK_SIZE).
+            now (datetime): Datetime of the billing run (defaults to the
+                current datetime).
+            mark_paid (bool): Create the transactions as paid instead of
+                flagging the subscriptions as due.
+    """
+    update_fields = ('date_billing_last', 'date_billing_next', 'date_billing_end', 'due')
+
+    def __init__(self, chunk_size=None, now=None, mark_paid=False):
+        self.chunk_size = chunk_size or SETTINGS['billing_chunk_size']
+        self.now = now or timezone.now()
+        self.mark_paid = mark_paid
+        self.UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+        self.SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+        self.using = router.db_for_write(self.UserSubscription)
+
+    def get_queryset(self):
+        """Returns the subscriptions due for billing."""
+        return self.UserSubscription._default_manager.using(self.using).filter(
+            **flag('active', True),
+            plan_cost__isnull=False,
+            date_billing_next__lte=self.now,
+        ).exclude(
+            # Already billed by this run, their next billing date may still be due
+            date_billing_last=self.now,
+        ).select_related('plan_cost__plan')
+
+    def next_chunk(self, last=None):
+        """Returns the next chunk of due subscriptions.
+            Parameters:
+                last (tuple): (date_billing_next, pk) of the last subscription
+                    of the previous chunk.
+        """
+        queryset = self.get_queryset()
+        if last is not None:
+            date_billing_next, pk = last
+            queryset = queryset.filter(
+                Q(date_billing_next__gt=date_billing_next) | Q(date_billing_next=date_billing_next, pk__gt=pk)
+            )
+        queryset = queryset.order_by('date_billing_next', 'pk')
+        return list(select_for_update(queryset, skip_locked=True)[:self.chunk_size])
+
+    def build_transaction(self, subscription):
+        return self.SubscriptionTransaction(
+            user_id=subscription.user_id,
+            subscription=subscription,
+            plan_id=subscription.plan_cost.plan_id,
+            plan_cost=subscription.plan_cost,
+            date_transaction=self.now,
+            amount=subscription.plan_cost.cost,
+            paid=self.mark_paid,
+        )
+
+    def advance(self, subscription):
+        """Moves the billing dates of a subscription to the next period."""
+        plan_cost = subscription.plan_cost
+        next_billing_date = plan_cost.next_billing_datetime(subscription.date_billing_next)
+        subscription.date_billing_last = self.now
+        subscription.date_billing_next = next_billing_date
+        if next_billing_date is not None:
+            subscription.date_billing_end = next_billing_date + timedelta(days=plan_cost.plan.grace_period)
+        subscription.due = not self.mark_paid
+
+    def bill_chunk(self, subscriptions, stats):
+        transactions = []
+        for subscription in subscriptions:
+            transactions.append(self.build_transaction(subscription))
+            self.advance(subscription)
+        self.SubscriptionTransaction._default_manager.using(self.using).bulk_create(transactions)
+        # bulk_create sends no post_save
+        record_transactions(transactions, using=self.using)
+        self.UserSubscription._default_manager.using(self.using).bulk_update(subscriptions, self.update_fields)
+        self.after_chunk(subscriptions, transactions)
+
+        stats.chunks += 1
+        stats.subscriptions += len(subscriptions)
+        stats.transactions += len(transactions)
+        stats.amount += sum((txn.amount or 0 for txn in transactions), Decimal('0.00'))
+
+    def after_chunk(self, subscriptions, transactions):
+        """Override to act on a billed chunk e.g to queue notifications"""
+        pass
+
+    def run(self):
+        """Bills all due subscriptions chunk by chunk.
+            Returns:
+                obj: BillingStats of the run.
+        """
+        stats = BillingStats()
+        last = None
+        while True:
+            with transaction.atomic(using=self.using):
+                subscriptions = self.next_chunk(last)
+                if not subscriptions:
+                    break
+                # Keep the keyset position before the billing dates move forward
+                last = (subscriptions[-1].date_billing_next, subscriptions[-1].pk)
+                self.bill_chunk(subscriptions, stats)
+            if len(subscriptions) < self.chunk_size:
+                break
+        stats.finish()
+        return stats
@@ -0,0 +1,31 @@
+"""Version numbers of the entitlement and plan catalog caches.
+
+Entries are cached under a version stored in the same cache, bumping it
+drops every entry at once without knowing their keys. Invalidations run
+with ``after_commit()`` once the database transaction of the change
+commits, a request reading the rows before that can only cache them under
+the version being replaced.
+"""
+from django.db import transaction
+
+
+def get_version(cache, key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # No version yet, nothing is cached under it
+        cache.add(key, 1, None)
+
+
+def after_commit(func, using=None):
+    """Runs func once the current transaction of the database commits, right
+    away in autocommit mode."""
+    transaction.on_commit(func, using=using)
@@ -0,0 +1,128 @@
+"""Cache of the rendered public plan catalog.
+
+The plan list, subscription plan and plan cost endpoints serve the same
+bytes to everyone until a catalog model changes. ``CatalogCacheMixin`` keeps
+the rendered responses in the DFS_CATALOG_CACHE cache under a catalog
+version that save and delete signals bump once committed (see signals.py),
+with a strong ETag so clients revalidate with ``If-None-Match`` and get a
+304. With DFS_CATALOG_GZIP the bodies are also stored gzipped for clients
+accepting gzip.
+
+Writes that send no signals (queryset ``update()``) are only seen once
+DFS_CATALOG_TIMEOUT expires or ``bump_catalog_version()`` is called.
+"""
+import gzip
+import hashlib
+
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from subscriptions_api.app_settings import SETTINGS
+from subscriptions_api.cache_versions import after_commit, bump_version, get_version
+
+# Bump when the cached entry format changes
+CACHE_KEY_VERSION = 1
+VERSION_KEY = 'subscriptions_api:catalog:version'
+
+
+def _cache():
+    return caches[SETTINGS['catalog_cache']]
+
+
+def get_catalog_version():
+    return get_version(_cache(), VERSION_KEY)
+
+
+def bump_catalog_version(using=None):
+    """Drops every cached catalog response e.g after a plan changed, once
+    the transaction of the database alias commits."""
+    after_commit(lambda: bump_version(_cache(), VERSION_KEY), using=using)
+
+
+def _accepts_gzip(request):
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+def _etag_matches(request, etags):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison
+    requested = {etag[2:] if etag.startswith('W/') else etag for etag in parse_etags(header)}
+    return '*' in requested or not requested.isdisjoint(etags)
+
+
+class CatalogCacheMixin:
+    """Serves list and retrieve responses of a viewset from the catalog cache.
+
+    Only renderers whose format is in ``catalog_cache_formats`` are cached,
+    the browsable API is rendered per request. Responses are keyed on the
+    path and the whole query string (pagination, filters and search read
+    it). A viewset knowing the query parameters it reads can list them in
+    ``catalog_query_params``, the others then share the entry.
+    """
+    catalog_cache_formats = ('json',)
+    catalog_query_params = None
+
+    def get_catalog_cache_key(self, request):
+        names = request.query_params.keys() if self.catalog_query_params is None else self.catalog_query_params
+        params = [(name, request.query_params.getlist(name)) for name in sorted(names)]
+        return 'subscriptions_api:catalog:{}:{}:{}:{}'.format(
+            CACHE_KEY_VERSION,
+            get_catalog_version(),
+            request.accepted_media_type,
+            hashlib.sha256(repr((request.path, params)).encode()).hexdigest(),
+        )
+
+    def render_catalog_entry(self, request, response):
+        renderer = request.accepted_renderer
+        body = renderer.render(response.data, request.accepted_media_type, self.get_renderer_context())
+        if isinstance(body, str):
+            body = body.encode(renderer.charset or 'utf-8')
+        content_type = request.accepted_media_type
+        if renderer.charset:
+            content_type = '{}; charset={}'.format(content_type, renderer.charset)
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        return {
+            'body': body,
+            'gzip': gzip.compress(body, mtime=0) if SETTINGS['catalog_gzip'] else None,
+            'content_type': content_type,
+            'etag': '"{}"'.format(etag),
+            'gzip_etag': '"{}-gzip"'.format(etag),
+        }
+
+    def catalog_response(self, request, entry):
+        use_gzip = entry['gzip'] is not None and _accepts_gzip(request)
+        etag = entry['gzip_etag'] if use_gzip else entry['etag']
+        if _etag_matches(request, (entry['etag'], entry['gzip_etag'])):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry['gzip'] if use_gzip else entry['body'], content_type=entry['content_type'])
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        if entry['gzip'] is not None:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def cached_catalog_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format not in self.catalog_cache_formats:
+            return handler(request, *args, **kwargs)
+        cache = _cache()
+        key = self.get_catalog_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = self.render_catalog_entry(request, response)
+            cache.set(key, entry, SETTINGS['catalog_timeout'])
+        return self.catalog_response(request, entry)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_catalog_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_catalog_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,85 @@
+"""Concurrent sending of notifications on an asyncio event loop.
+
+``AsyncNotificationDispatcher`` fans a notification out to many
+subscriptions, at most ``concurrency`` sends are in flight and every
+destination (``get_destination()`` of the notifier, its class by default)
+is rate limited with a token bucket. Notifiers with an ``async def asend()``
+(webhooks, chat) run natively, ``send()`` only notifiers run in a thread.
+
+    dispatcher = AsyncNotificationDispatcher(concurrency=50, rate=10)
+    report = dispatcher.run(subscriptions, 'notify_overdue')
+
+Subscriptions are used as passed in, load what the notifiers need
+(e.g ``select_related('user')``) before dispatching.
+"""
+import asyncio
+
+from subscriptions_api.notifications import SendReport, asend_notifier, get_notifier
+from subscriptions_api.throttling import TokenBucket
+
+
+class AsyncNotificationDispatcher:
+    """Sends notifications concurrently.
+
+        Parameters:
+            concurrency (int): Maximum number of notifications sent at once.
+            rate (float): Sends per second allowed per destination (None
+                for no limit).
+            burst (int): Sends allowed at once per destination (defaults
+                to rate).
+    """
+
+    def __init__(self, concurrency=100, rate=None, burst=None):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self.buckets = {}
+
+    def get_destination(self, notify_obj):
+        get_destination = getattr(notify_obj, 'get_destination', None)
+        if get_destination is not None:
+            return get_destination()
+        return type(notify_obj).__name__
+
+    async def throttle(self, destination):
+        """Waits until the destination's token bucket allows another send."""
+        if self.rate is None:
+            return
+        loop = asyncio.get_running_loop()
+        bucket = self.buckets.get(destination)
+        if bucket is None:
+            bucket = self.buckets[destination] = TokenBucket(self.burst, self.rate)
+        while not bucket.consume(loop.time()):
+            await asyncio.sleep(bucket.wait_time())
+
+    async def send(self, subscription, notification, semaphore, report, **kwargs):
+        try:
+            Notify = get_notifier(notification)  # pylint: disable=invalid-name
+            if Notify is None:
+                return
+            notify_obj = Notify(subscription, notification, **kwargs)
+            await self.throttle(self.get_destination(notify_obj))
+            async with semaphore:
+                await asend_notifier(notify_obj)
+        except Exception as error:  # pylint: disable=broad-except
+            report.failed.append((subscription, error))
+        else:
+            report.sent.append(notify_obj)
+
+    async def dispatch(self, subscriptions, notification, **kwargs):
+        """Sends a notification to all subscriptions, failures do not stop the others.
+            Returns:
+                obj: SendReport with the sent notifiers and the
+                    (subscription, error) pairs that failed.
+        """
+        report = SendReport()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(
+            self.send(subscription, notification, semaphore, report, **kwargs)
+            for subscription in subscriptions
+        ))
+        return report
+
+    def run(self, subscriptions, notification, **kwargs):
+        """Runs dispatch() on a new event loop from synchronous code."""
+        return asyncio.run(self.dispatch(subscriptions, notification, **kwargs))
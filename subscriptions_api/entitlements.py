@@ -0,0 +1,102 @@
+"""Entitlements of a user, the merged features of all their active subscriptions.
+
+Entitlements are cached in the DFS_ENTITLEMENTS_CACHE cache, so warm checks
+cost no queries. Once committed, subscription changes invalidate the entry
+of their user and plan changes bump a generation number shared by all
+entries.
+
+    if has_feature(request.user, 'exports'):
+        ...
+"""
+import swapper
+from django.apps import apps
+from django.core.cache import caches
+
+from subscriptions_api.app_settings import SETTINGS
+from subscriptions_api.cache_versions import after_commit, bump_version, get_version
+from subscriptions_api.expressions import flag
+
+# Bump when the cached value format changes
+CACHE_KEY_VERSION = 1
+GENERATION_KEY = 'subscriptions_api:entitlements:generation'
+
+
+def _cache():
+    return caches[SETTINGS['entitlements_cache']]
+
+
+def _cache_key(user_id, generation):
+    return 'subscriptions_api:entitlements:{}:{}:{}'.format(CACHE_KEY_VERSION, generation, user_id)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def merge_features(feature_dicts):
+    """Merges feature dicts, booleans are or-ed, numbers take the highest
+    value and anything else is taken from the last dict."""
+    merged = {}
+    for features in feature_dicts:
+        for key, value in features.items():
+            current = merged.get(key)
+            if isinstance(value, bool) and isinstance(current, bool):
+                value = current or value
+            elif _is_number(value) and _is_number(current):
+                value = max(current, value)
+            merged[key] = value
+    return merged
+
+
+def compute_entitlements(user):
+    """Returns the merged features of the plans of the active subscriptions of the user (no caching)."""
+    SubscriptionPlan = apps.get_model('subscriptions_api', 'SubscriptionPlan')
+    UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+    active_plans = UserSubscription._default_manager.filter(
+        user_id=user.pk, **flag('active', True),
+    ).values('plan_cost__plan')
+    plans = SubscriptionPlan.objects.filter(pk__in=active_plans).order_by('sequence', 'plan_name')
+    return merge_features(features for features in (plan.get_features() for plan in plans) if isinstance(features, dict))
+
+
+def get_entitlements(user):
+    """Returns the (cached) merged features of the active subscriptions of the user."""
+    if user is None or user.pk is None:
+        return {}
+    cache = _cache()
+    key = _cache_key(user.pk, get_version(cache, GENERATION_KEY))
+    entitlements = cache.get(key)
+    if entitlements is None:
+        entitlements = compute_entitlements(user)
+        cache.set(key, entitlements, SETTINGS['entitlements_timeout'])
+    return entitlements
+
+
+def get_feature(user, key, default=None):
+    return get_entitlements(user).get(key, default)
+
+
+def has_feature(user, key):
+    """Whether any active subscription of the user enables the feature."""
+    return bool(get_entitlements(user).get(key))
+
+
+def invalidate_entitlements(user_ids, using=None):
+    """Drops the cached entitlements of the given users once the transaction
+    of the database alias commits."""
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if not user_ids:
+        return
+
+    def delete():
+        cache = _cache()
+        generation = get_version(cache, GENERATION_KEY)
+        cache.delete_many([_cache_key(user_id, generation) for user_id in user_ids])
+
+    after_commit(delete, using=using)
+
+
+def invalidate_all_entitlements(using=None):
+    """Drops the cached entitlements of all users e.g after plan features
+    changed, once the transaction of the database alias commits."""
+    after_commit(lambda: bump_version(_cache(), GENERATION_KEY), using=using)
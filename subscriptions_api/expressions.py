@@ -0,0 +1,56 @@
+"""Database functions used by the queryset annotations and filters."""
+from django.db import models
+
+
+def flag(field, value):
+    """Lookup of a boolean field, for ``filter(**flag('active', True))``.
+
+    ``filter(active=True)`` compiles to a bare boolean column that SQLite
+    can't search an index with, comparing with a parameter uses the
+    (flag, ...) indexes of the models.
+    """
+    return {field: models.Value(value)}
+
+
+class DaysBetween(models.Func):
+    """Whole days from ``start`` to ``end``, the SQL version of
+    ``(end - start).days`` for positive intervals."""
+    arity = 2
+    output_field = models.IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def _compile(self, compiler, template):
+        end, end_params = compiler.compile(self.source_expressions[0])
+        start, start_params = compiler.compile(self.source_expressions[1])
+        if template.index('{end}') < template.index('{start}'):
+            params = (*end_params, *start_params)
+        else:
+            params = (*start_params, *end_params)
+        return template.format(end=end, start=start), params
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # PostgreSQL
+        return self._compile(compiler, 'CAST(FLOOR(EXTRACT(EPOCH FROM ({end} - {start})) / 86400) AS integer)')
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self._compile(compiler, 'CAST((julianday({end}) - julianday({start})) AS integer)')
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self._compile(compiler, 'TIMESTAMPDIFF(DAY, {start}, {end})')
+
+    def as_oracle(self, compiler, connection, **extra_context):
+        return self._compile(compiler, 'FLOOR(CAST({end} AS DATE) - CAST({start} AS DATE))')
+
+
+class Divide(models.Func):
+    """Decimal division, SQLite would divide integral values as integers."""
+    arity = 2
+    arg_joiner = ' / '
+    template = '(%(expressions)s)'
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        dividend, dividend_params = compiler.compile(self.source_expressions[0])
+        divisor, divisor_params = compiler.compile(self.source_expressions[1])
+        return '(CAST({} AS REAL) / {})'.format(dividend, divisor), (*dividend_params, *divisor_params)
@@ -0,0 +1,108 @@
+"""Server side filtering of the user subscription and transaction endpoints.
+
+Query parameters are validated with a serializer (a 400 response lists the
+invalid ones) and applied by a filter function the export command shares.
+
+    /subscription-transactions/?start=2024-05-01T00:00&end=2024-06-01T00:00&paid=false
+    /user-subscriptions/?active=true&plan=pro&date_billing_next_before=2024-06-01T00:00
+
+Every filter is backed by an index of the models (see tests/test_filters.py).
+"""
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+from subscriptions_api.expressions import flag
+
+
+class TransactionFilterSerializer(serializers.Serializer):
+    """Query parameters of the transaction filters"""
+    start = serializers.DateTimeField(required=False, help_text='Transactions from this datetime')
+    end = serializers.DateTimeField(required=False, help_text='Transactions before this datetime')
+    paid = serializers.BooleanField(required=False, allow_null=True)
+
+
+class SubscriptionFilterSerializer(serializers.Serializer):
+    """Query parameters of the user subscription filters"""
+    start = serializers.DateTimeField(required=False, help_text='Subscriptions started from this datetime')
+    end = serializers.DateTimeField(required=False, help_text='Subscriptions started before this datetime')
+    active = serializers.BooleanField(required=False, allow_null=True)
+    due = serializers.BooleanField(required=False, allow_null=True)
+    cancelled = serializers.BooleanField(required=False, allow_null=True)
+    plan_cost = serializers.UUIDField(required=False, help_text='Subscriptions of this plan cost id')
+    plan = serializers.SlugField(required=False, help_text='Subscriptions of the plan with this slug')
+    reference = serializers.CharField(required=False, help_text='Subscriptions with this external reference')
+    date_billing_next_after = serializers.DateTimeField(
+        required=False, help_text='Subscriptions billed next from this datetime',
+    )
+    date_billing_next_before = serializers.DateTimeField(
+        required=False, help_text='Subscriptions billed next before this datetime',
+    )
+
+
+def filter_transactions(queryset, start=None, end=None, paid=None):
+    if start is not None:
+        queryset = queryset.filter(date_transaction__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date_transaction__lt=end)
+    if paid is not None:
+        queryset = queryset.filter(**flag('paid', paid))
+    return queryset
+
+
+def filter_subscriptions(queryset, start=None, end=None, date_billing_next_after=None, date_billing_next_before=None,
+                         active=None, due=None, cancelled=None, plan=None, plan_cost=None, reference=None):
+    """Filters user subscriptions, None values are ignored."""
+    if start is not None:
+        queryset = queryset.filter(date_billing_start__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date_billing_start__lt=end)
+    if date_billing_next_after is not None:
+        queryset = queryset.filter(date_billing_next__gte=date_billing_next_after)
+    if date_billing_next_before is not None:
+        queryset = queryset.filter(date_billing_next__lt=date_billing_next_before)
+    for field, value in (('active', active), ('due', due), ('cancelled', cancelled)):
+        if value is not None:
+            queryset = queryset.filter(**flag(field, value))
+    if plan is not None:
+        queryset = queryset.filter(plan_cost__plan__slug=plan)
+    if plan_cost is not None:
+        queryset = queryset.filter(plan_cost=plan_cost)
+    if reference is not None:
+        queryset = queryset.filter(reference=reference)
+    return queryset
+
+
+class QueryFilterBackend(BaseFilterBackend):
+    """Filters with the validated query parameters of ``serializer_class``."""
+    serializer_class = None
+    filter_function = None
+
+    def get_filters(self, request):
+        query = self.serializer_class(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return query.validated_data
+
+    def filter_queryset(self, request, queryset, view):
+        return self.filter_function(queryset, **self.get_filters(request))
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': name,
+                'required': False,
+                'in': 'query',
+                'description': str(field.help_text or name),
+                'schema': {'type': 'boolean' if isinstance(field, serializers.BooleanField) else 'string'},
+            }
+            for name, field in self.serializer_class().fields.items()
+        ]
+
+
+class TransactionFilterBackend(QueryFilterBackend):
+    serializer_class = TransactionFilterSerializer
+    filter_function = staticmethod(filter_transactions)
+
+
+class SubscriptionFilterBackend(QueryFilterBackend):
+    serializer_class = SubscriptionFilterSerializer
+    filter_function = staticmethod(filter_subscriptions)
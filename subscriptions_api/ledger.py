@@ -0,0 +1,71 @@
+"""Deduplication of notifications with the NotificationLedger.
+
+A notification is claimed once per scope (a subscription, or a user with
+``per_user``), notification and ``period_key``. Re-running a job for the same
+period notifies nobody twice and ``per_user`` sends one notification to a
+user with several subscriptions.
+
+    notify_once(UserSubscription.objects.filter(due=True), 'notify_overdue', period_key='2024-05')
+
+Combine it with the outbox (DFS_NOTIFY_OUTBOX) so failed sends are retried,
+a claimed notification is not claimed again.
+"""
+from uuid import uuid4
+
+from django.utils import timezone
+
+from subscriptions_api.models import NotificationLedger
+
+
+def ledger_scope(subscription, per_user=False):
+    if per_user:
+        return 'user:{}'.format(subscription.user_id)
+    return 'subscription:{}'.format(subscription.pk)
+
+
+def default_period_key():
+    """Notifications are claimed once a day unless a period_key is given."""
+    return timezone.now().date().isoformat()
+
+
+def claim_notifications(subscriptions, notification, period_key=None, per_user=False):
+    """Records the subscriptions to notify in the ledger.
+        Parameters:
+            subscriptions (iterable): UserSubscription instances.
+            notification (str): Notification name e.g notify_overdue.
+            period_key (str): Period to notify once for (defaults to the
+                current date).
+            per_user (bool): Claim once per user instead of per
+                subscription, the first subscription of each user is kept.
+        Returns:
+            list: The subscriptions not notified yet for the period.
+    """
+    period_key = period_key or default_period_key()
+    by_scope = {}
+    for subscription in subscriptions:
+        by_scope.setdefault(ledger_scope(subscription, per_user), subscription)
+    if not by_scope:
+        return []
+    # Rows of concurrent runs conflict and are skipped, the claim token tells
+    # which rows this run inserted.
+    claim = uuid4()
+    NotificationLedger.objects.bulk_create(
+        [
+            NotificationLedger(scope=scope, notification=notification, period_key=period_key, claim=claim)
+            for scope in by_scope
+        ],
+        ignore_conflicts=True,
+    )
+    claimed = set(NotificationLedger.objects.filter(claim=claim).values_list('scope', flat=True))
+    return [subscription for scope, subscription in by_scope.items() if scope in claimed]
+
+
+def notify_once(subscriptions, notification, period_key=None, per_user=False, **kwargs):
+    """Sends (or queues) a notification to the subscriptions claimed with claim_notifications.
+        Returns:
+            list: The notified subscriptions.
+    """
+    claimed = claim_notifications(subscriptions, notification, period_key=period_key, per_user=per_user)
+    for subscription in claimed:
+        subscription.notify(notification, **kwargs)
+    return claimed
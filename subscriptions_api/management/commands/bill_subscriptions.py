@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from subscriptions_api.billing import BillingEngine
+
+
+class Command(BaseCommand):
+    help = 'Records transactions for all due subscriptions and moves their billing dates forward'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help='Number of subscriptions billed per chunk (defaults to DFS_BILLING_CHUNK_SIZE)',
+        )
+        parser.add_argument(
+            '--mark-paid', action='store_true', default=False,
+            help='Create the transactions as paid',
+        )
+
+    def handle(self, *args, **options):
+        engine = BillingEngine(chunk_size=options['chunk_size'], mark_paid=options['mark_paid'])
+        stats = engine.run()
+        self.stdout.write(str(stats))
@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from subscriptions_api.models import PlanList, SubscriptionPlan
+
+
+class Command(BaseCommand):
+    help = ('Checks that the features of all subscription plans and plan lists are valid json, '
+            'a requirement before moving the features columns to a JSONField')
+
+    def handle(self, *args, **options):
+        invalid = 0
+        for model in (SubscriptionPlan, PlanList):
+            rows = model.objects.exclude(features__isnull=True).exclude(features='').values_list('pk', 'features')
+            for pk, features in rows.iterator():
+                if not isinstance(features, str):
+                    continue
+                try:
+                    json.loads(features)
+                except ValueError as e:
+                    invalid += 1
+                    self.stderr.write('{} {}: {}'.format(model._meta.label, pk, e))
+        if invalid:
+            raise CommandError('{} rows with invalid json features'.format(invalid))
+        self.stdout.write('All features are valid json')
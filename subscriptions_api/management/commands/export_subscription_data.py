@@ -0,0 +1,67 @@
+import swapper
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from subscriptions_api.export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_lines
+from subscriptions_api.filters import filter_subscriptions, filter_transactions
+
+
+def datetime_argument(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Streams transactions or user subscriptions as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=('transactions', 'subscriptions'))
+        parser.add_argument(
+            '--export-format', choices=sorted(EXPORT_FORMATS), default='csv',
+        )
+        parser.add_argument(
+            '--start', type=datetime_argument, default=None,
+            help='Rows from this datetime e.g 2024-05-01T00:00 (transaction date or subscription start)',
+        )
+        parser.add_argument(
+            '--end', type=datetime_argument, default=None,
+            help='Rows before this datetime',
+        )
+        parser.add_argument(
+            '--paid', choices=('true', 'false'), default=None,
+            help='Only paid or unpaid transactions (transactions only)',
+        )
+        parser.add_argument(
+            '--output', default=None,
+            help='File to write to (defaults to stdout)',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Number of rows fetched from the database at once',
+        )
+
+    def handle(self, *args, **options):
+        if options['kind'] == 'transactions':
+            model = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+            paid = None if options['paid'] is None else options['paid'] == 'true'
+            queryset = filter_transactions(
+                model._default_manager.order_by('date_transaction', 'id'),
+                start=options['start'], end=options['end'], paid=paid,
+            )
+        else:
+            if options['paid'] is not None:
+                raise CommandError('--paid only filters transactions')
+            model = swapper.load_model('subscriptions_api', 'UserSubscription')
+            queryset = filter_subscriptions(
+                model._default_manager.order_by('date_billing_start', 'id'),
+                start=options['start'], end=options['end'],
+            )
+        lines = export_lines(queryset, options['export_format'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
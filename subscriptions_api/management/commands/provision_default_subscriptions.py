@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from subscriptions_api.models import get_default_plan_cost, provision_default_subscriptions
+
+
+class Command(BaseCommand):
+    help = 'Gives every user without an active subscription the default plan cost (DFS_DEFAULT_PLAN_COST_ID)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of users provisioned per batch',
+        )
+
+    def handle(self, *args, **options):
+        if get_default_plan_cost() is None:
+            raise CommandError('DFS_DEFAULT_PLAN_COST_ID is not set')
+        user_ids = list(
+            get_user_model()._default_manager.exclude(subscriptions__active=True).values_list('pk', flat=True)
+        )
+        count = provision_default_subscriptions(user_ids, batch_size=options['batch_size'])
+        self.stdout.write('Provisioned {} users with the default plan'.format(count))
@@ -0,0 +1,27 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from subscriptions_api.rollup import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily revenue rollup from the transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start', type=date.fromisoformat, default=None,
+            help='First day to rebuild e.g 2024-05-01 (defaults to the first transaction)',
+        )
+        parser.add_argument(
+            '--end', type=date.fromisoformat, default=None,
+            help='Day to stop at, excluded (defaults to rebuilding every day after start)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rollup rows inserted per query',
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild(start=options['start'], end=options['end'], batch_size=options['batch_size'])
+        self.stdout.write('Rebuilt {} daily revenue rollup rows'.format(count))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from subscriptions_api.outbox import OutboxWorker
+
+
+class Command(BaseCommand):
+    help = 'Sends the notifications queued in the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of notifications claimed per batch',
+        )
+        parser.add_argument(
+            '--max-batches', type=int, default=None,
+            help='Stop after this many batches (defaults to sending until the outbox is empty)',
+        )
+        parser.add_argument(
+            '--max-attempts', type=int, default=5,
+            help='Attempts before a notification is marked as failed',
+        )
+        parser.add_argument(
+            '--retry-backoff', type=int, default=60,
+            help='Seconds before the first retry, doubled on every following attempt',
+        )
+
+        parser.add_argument(
+            '--digest', action='store_true', default=False,
+            help='Merge the pending notifications of a user into one message',
+        )
+
+    def handle(self, *args, **options):
+        worker = OutboxWorker(
+            batch_size=options['batch_size'],
+            max_attempts=options['max_attempts'],
+            retry_backoff=options['retry_backoff'],
+            digest=options['digest'],
+        )
+        stats = worker.run(max_batches=options['max_batches'])
+        self.stdout.write(str(stats))
@@ -0,0 +1,235 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+import swapper
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from subscriptions_api.batch import select_for_update
+from subscriptions_api.entitlements import invalidate_entitlements
+from subscriptions_api.expressions import DaysBetween, Divide, flag
+from subscriptions_api.rollup import apply_deltas, mark_paid_deltas
+
+BALANCE_FIELD = models.DecimalField(max_digits=19, decimal_places=2)
+
+
+def _group_membership_model():
+    """Returns the user/group through model with its user and group field attnames."""
+    try:
+        field = get_user_model()._meta.get_field('groups')
+    except FieldDoesNotExist:
+        # No groups on the user model
+        return None, None, None
+    return (
+        field.remote_field.through,
+        '{}_id'.format(field.m2m_field_name()),
+        '{}_id'.format(field.m2m_reverse_field_name()),
+    )
+
+
+class SubscriptionPlanQuerySet(models.QuerySet):
+
+    def with_tag_summary(self):
+        """Annotates ``tag_count`` and the first tag names (``tag_1`` to
+        ``tag_3``) used by SubscriptionPlan.display_tags(), one query for
+        any number of plans without loading their tags.
+        """
+        PlanTag = apps.get_model('subscriptions_api', 'PlanTag')
+        plan_tags = PlanTag.objects.filter(plans=models.OuterRef('pk'))
+        tag_count = plan_tags.order_by().values('plans').annotate(count=models.Count('pk')).values('count')
+        names = {
+            'tag_{}'.format(position + 1): models.Subquery(
+                plan_tags.order_by('tag', 'pk').values('tag')[position:position + 1]
+            )
+            for position in range(3)
+        }
+        return self.annotate(
+            tag_count=Coalesce(models.Subquery(tag_count), 0),
+            **names,
+        )
+
+
+class UserSubscriptionQuerySet(models.QuerySet):
+    """Set based lifecycle operations on user subscriptions.
+
+    Unlike the per instance methods no model save or m2m_changed signals are
+    sent.
+    """
+
+    def _memberships(self):
+        """Returns (user_id, group_id) pairs of the subscriptions, group_id is
+        None for plans without a group."""
+        return set(
+            self.filter(user__isnull=False)
+            .order_by()
+            .values_list('user_id', 'plan_cost__plan__group_id')
+            .distinct()
+        )
+
+    def _add_users_to_groups(self, memberships):
+        through, user_field, group_field = _group_membership_model()
+        if through is None:
+            return
+        through._default_manager.bulk_create(
+            [
+                through(**{user_field: user_id, group_field: group_id})
+                for user_id, group_id in memberships if group_id is not None
+            ],
+            ignore_conflicts=True,
+        )
+
+    def _remove_users_from_groups(self, memberships):
+        through, user_field, group_field = _group_membership_model()
+        if through is None:
+            return
+        users_by_group = defaultdict(list)
+        for user_id, group_id in memberships:
+            if group_id is not None:
+                users_by_group[group_id].append(user_id)
+        if not users_by_group:
+            return
+        condition = models.Q()
+        for group_id, user_ids in users_by_group.items():
+            condition |= models.Q(**{group_field: group_id, '{}__in'.format(user_field): user_ids})
+        through._default_manager.filter(condition).delete()
+
+    def bulk_activate(
+            self,
+            subscription_date=None,
+            mark_transaction_paid=True,
+            no_multiple_subscription=False,
+            del_multiple_subscription=False,
+    ):
+        """Activates all subscriptions of the queryset, same as calling activate() on each.
+            Returns:
+                int: Number of activated subscriptions.
+        """
+        if no_multiple_subscription:
+            previous_subscriptions = self.model._default_manager.filter(
+                user__in=self.values('user'), **flag('active', True),
+            ).exclude(pk__in=self.values('pk'))
+            previous_subscriptions.bulk_deactivate(delete=del_multiple_subscription)
+
+        current_date = subscription_date or timezone.now()
+        PlanCost = apps.get_model('subscriptions_api', 'PlanCost')
+        plan_costs = list(PlanCost.objects.filter(pk__in=self.values('plan_cost')).select_related('plan'))
+
+        memberships = self._memberships()
+        self._add_users_to_groups(memberships)
+        if mark_transaction_paid:
+            SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+            SubscriptionTransaction._default_manager.filter(subscription__in=self).mark_paid()
+
+        # Billing dates depend on the plan cost, one UPDATE per plan cost
+        count = 0
+        for plan_cost in plan_costs:
+            next_billing_date = plan_cost.next_billing_datetime(current_date)
+            count += self.filter(plan_cost=plan_cost).update(
+                active=True,
+                cancelled=False,
+                due=False,
+                date_billing_start=current_date,
+                date_billing_end=next_billing_date + timedelta(days=plan_cost.plan.grace_period),
+                date_billing_next=next_billing_date,
+            )
+        invalidate_entitlements({user_id for user_id, group_id in memberships}, using=self.db)
+        return count
+
+    def bulk_deactivate(self, activate_default=False, delete=False):
+        """Deactivates all subscriptions of the queryset, same as calling deactivate() on each.
+            Parameters:
+                activate_default (bool): Activate the default plan cost for
+                    the users of the subscriptions.
+                delete (bool): Delete the subscriptions instead of updating them.
+            Returns:
+                int: Number of deactivated subscriptions.
+        """
+        current_date = timezone.now()
+        memberships = self._memberships()
+        user_ids = {user_id for user_id, group_id in memberships}
+        self._remove_users_from_groups(memberships)
+        if delete:
+            count = self.delete()[1].get(self.model._meta.label, 0)
+        else:
+            count = self.update(
+                active=False,
+                date_billing_last=current_date,
+                cancelled=True,
+                due=False,
+            )
+        invalidate_entitlements(user_ids, using=self.db)
+        if activate_default:
+            from subscriptions_api.models import provision_default_subscriptions
+            provision_default_subscriptions(user_ids)
+        return count
+
+    def _daily_balance(self, days, condition):
+        """Rounded ``days * plan_cost.daily_cost`` in Decimal arithmetic, 0 when condition does not hold."""
+        from subscriptions_api.models import DAY, WEEK, MONTH, YEAR
+        # Same average days per unit as PlanCost.daily_cost, other units have no daily cost
+        unit_days = models.Case(
+            models.When(plan_cost__recurrence_unit=DAY, then=models.Value(Decimal('1'))),
+            models.When(plan_cost__recurrence_unit=WEEK, then=models.Value(Decimal('7'))),
+            models.When(plan_cost__recurrence_unit=MONTH, then=models.Value(Decimal('30.4368'))),
+            models.When(plan_cost__recurrence_unit=YEAR, then=models.Value(Decimal('365.2425'))),
+            output_field=models.DecimalField(max_digits=9, decimal_places=4),
+        )
+        balance = Divide(
+            days * models.F('plan_cost__cost'),
+            unit_days * models.F('plan_cost__recurrence_period'),
+            output_field=BALANCE_FIELD,
+        )
+        return models.Case(
+            models.When(condition, plan_cost__recurrence_unit__in=(DAY, WEEK, MONTH, YEAR), then=Round(balance, 2)),
+            default=models.Value(Decimal('0.00')),
+            output_field=BALANCE_FIELD,
+        )
+
+    def with_unused_balance(self, as_of=None):
+        """Annotates ``unused_balance``, unused_daily_balance computed in the
+        database so it can be summed, filtered and ordered on.
+            Parameters:
+                as_of (datetime): Datetime to compute the balance at
+                    (defaults to the current datetime).
+        """
+        as_of = models.Value(as_of or timezone.now(), output_field=models.DateTimeField())
+        return self.annotate(unused_balance=self._daily_balance(
+            DaysBetween(models.F('date_billing_next'), as_of),
+            models.Q(date_billing_next__gt=as_of),
+        ))
+
+    def with_used_balance(self, as_of=None):
+        """Annotates ``used_balance``, used_daily_balance computed in the database.
+            Parameters:
+                as_of (datetime): Datetime to compute the balance at
+                    (defaults to the current datetime).
+        """
+        as_of = models.Value(as_of or timezone.now(), output_field=models.DateTimeField())
+        return self.annotate(used_balance=self._daily_balance(
+            DaysBetween(as_of, models.F('date_billing_start')),
+            models.Q(date_billing_start__lt=as_of),
+        ))
+
+
+class SubscriptionTransactionQuerySet(models.QuerySet):
+
+    def mark_paid(self):
+        """Marks the unpaid transactions of the queryset paid and adds them to
+        the paid totals of the revenue rollup.
+            Returns:
+                int: Number of transactions marked paid.
+        """
+        # Concurrent calls wait and skip the rows paid meanwhile, instead of counting them twice
+        unpaid = select_for_update(self.filter(paid=False).order_by().select_related(None))
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = list(unpaid.values_list('pk', 'date_transaction', 'plan', 'plan_cost', 'amount'))
+            if not rows:
+                return 0
+            count = self.model._default_manager.using(self.db).filter(pk__in=[row[0] for row in rows]).update(paid=True)
+            apply_deltas(mark_paid_deltas(row[1:] for row in rows), using=self.db)
+        return count
@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-16 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions_api', '0010_plancost_min_subscription_quantity'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='subscriptiontransaction',
+            options={'ordering': ('-date_transaction', 'user')},
+        ),
+        migrations.AlterModelOptions(
+            name='usersubscription',
+            options={'ordering': ('user', 'date_billing_start')},
+        ),
+        migrations.AddIndex(
+            model_name='subscriptiontransaction',
+            index=models.Index(fields=['-date_transaction', 'user'], name='dfs_stx_date_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscriptiontransaction',
+            index=models.Index(condition=models.Q(('paid', False)), fields=['subscription'], name='dfs_stx_unpaid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['active', 'date_billing_next'], name='dfs_usub_active_next_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['user', 'active'], name='dfs_usub_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['user', 'date_billing_start'], name='dfs_usub_user_start_idx'),
+        ),
+    ]
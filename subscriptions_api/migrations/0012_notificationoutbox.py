@@ -0,0 +1,36 @@
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+import swapper
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions_api', '0011_subscription_indexes'),
+        swapper.dependency('subscriptions_api', 'UserSubscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification', models.CharField(help_text='the notification to send e.g notify_overdue', max_length=64)),
+                ('kwargs', models.JSONField(blank=True, default=dict, help_text='keyword arguments passed to the notifier')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('sending', 'sending'), ('sent', 'sent'), ('failed', 'failed')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='number of failed sending attempts')),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_available', models.DateTimeField(default=django.utils.timezone.now, help_text='the notification is not sent before this date (retry backoff)')),
+                ('date_sent', models.DateTimeField(blank=True, null=True)),
+                ('subscription', models.ForeignKey(help_text='the subscription the notification is about', on_delete=django.db.models.deletion.CASCADE, related_name='outbox_notifications', to=swapper.get_model_name('subscriptions_api', 'UserSubscription'))),
+            ],
+            options={
+                'ordering': ('date_available',),
+                'indexes': [models.Index(fields=['status', 'date_available'], name='dfs_outbox_status_avail_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions_api', '0012_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationLedger',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text='who was notified e.g user:12 or subscription:<id>', max_length=64)),
+                ('notification', models.CharField(help_text='the notification sent e.g notify_overdue', max_length=64)),
+                ('period_key', models.CharField(help_text='the period the notification was sent for e.g 2024-05-01', max_length=64)),
+                ('claim', models.UUIDField(db_index=True, editable=False, help_text='the run that recorded the notification')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ('-date_created',),
+                'constraints': [models.UniqueConstraint(fields=('scope', 'notification', 'period_key'), name='dfs_ledger_unique_notification')],
+            },
+        ),
+    ]
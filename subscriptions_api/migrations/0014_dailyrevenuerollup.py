@@ -0,0 +1,31 @@
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions_api', '0013_notificationledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenueRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='the day of the transactions')),
+                ('count', models.IntegerField(default=0, help_text='number of transactions')),
+                ('gross', models.DecimalField(decimal_places=2, default=0, help_text='total amount of the transactions', max_digits=19)),
+                ('paid_count', models.IntegerField(default=0, help_text='number of paid transactions')),
+                ('paid', models.DecimalField(decimal_places=2, default=0, help_text='total amount of the paid transactions', max_digits=19)),
+                ('plan', models.ForeignKey(help_text='the plan of the billed subscriptions', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='revenue_rollups', to='subscriptions_api.subscriptionplan')),
+                ('plan_cost', models.ForeignKey(help_text='the plan cost of the billed subscriptions', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='revenue_rollups', to='subscriptions_api.plancost')),
+            ],
+            options={
+                'ordering': ('day',),
+                'constraints': [models.UniqueConstraint(fields=('day', 'plan', 'plan_cost'), name='dfs_rollup_unique_day_plan_cost')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions_api', '0014_dailyrevenuerollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscriptiontransaction',
+            index=models.Index(fields=['date_transaction', 'id'], name='dfs_stx_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['date_billing_start', 'id'], name='dfs_usub_start_id_idx'),
+        ),
+    ]
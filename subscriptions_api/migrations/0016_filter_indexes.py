@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions_api', '0015_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['date_billing_next'], name='dfs_usub_next_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['due', 'date_billing_next'], name='dfs_usub_due_next_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['cancelled', 'date_billing_next'], name='dfs_usub_cancel_next_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['reference'], name='dfs_usub_reference_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscriptiontransaction',
+            index=models.Index(fields=['paid', 'date_transaction'], name='dfs_stx_paid_date_idx'),
+        ),
+    ]
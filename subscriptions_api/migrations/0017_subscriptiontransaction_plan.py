@@ -0,0 +1,41 @@
+import django.db.models.deletion
+import swapper
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def set_billed_plan(apps, schema_editor):
+    if swapper.is_swapped('subscriptions_api', 'SubscriptionTransaction'):
+        return
+    SubscriptionTransaction = apps.get_model('subscriptions_api', 'SubscriptionTransaction')
+    UserSubscription = apps.get_model(swapper.get_model_name('subscriptions_api', 'UserSubscription'))
+    subscriptions = UserSubscription.objects.filter(pk=OuterRef('subscription'))
+    # The plan of the subscription today, the best known for past transactions
+    SubscriptionTransaction.objects.using(schema_editor.connection.alias).filter(
+        subscription__isnull=False, plan_cost__isnull=True,
+    ).update(
+        plan_cost=Subquery(subscriptions.values('plan_cost')[:1]),
+        plan=Subquery(subscriptions.values('plan_cost__plan')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions_api', '0016_filter_indexes'),
+        swapper.dependency('subscriptions_api', 'UserSubscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptiontransaction',
+            name='plan',
+            field=models.ForeignKey(blank=True, help_text='the plan the subscription was billed with', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='subscriptions_api.subscriptionplan'),
+        ),
+        migrations.AddField(
+            model_name='subscriptiontransaction',
+            name='plan_cost',
+            field=models.ForeignKey(blank=True, help_text='the plan cost the subscription was billed with', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='subscriptions_api.plancost'),
+        ),
+        migrations.RunPython(set_billed_plan, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions_api', '0017_subscriptiontransaction_plan'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='usersubscription',
+            name='dfs_usub_active_next_idx',
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['active', 'date_billing_next', 'id'], name='dfs_usub_active_next_id_idx'),
+        ),
+    ]
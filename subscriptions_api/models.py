@@ -1,6 +1,7 @@
 """Models Gotten from the Flexible Subscriptions app.
     with minor changes
 """
+import copy
 import json
 from datetime import timedelta
 from uuid import uuid4
@@ -9,10 +10,12 @@ import swapper
 from django.contrib.auth.models import Group
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from subscriptions_api.app_settings import SETTINGS
 from subscriptions_api.base_models import BaseUserSubscription, BaseSubscriptionTransaction
+from subscriptions_api.managers import SubscriptionPlanQuerySet
 
 # Convenience references for units for plan recurrence billing
 # ----------------------------------------------------------------------------
@@ -39,24 +42,104 @@ RECURRENCE_UNIT_CHOICES = (
 # ----------------------------------------------------------------------------
 
 class UserSubscription(BaseUserSubscription):
-    class Meta:
+    class Meta(BaseUserSubscription.Meta):
         swappable = swapper.swappable_setting('subscriptions_api', 'UserSubscription')
 
 
 class SubscriptionTransaction(BaseSubscriptionTransaction):
-    class Meta:
+    class Meta(BaseSubscriptionTransaction.Meta):
         swappable = swapper.swappable_setting('subscriptions_api', 'SubscriptionTransaction')
 
 
-def activate_default_user_subscription(user):
+class FeaturesMixin:
+    """Parses the json ``features`` field once per value.
+
+    The parsed value is cached on the instance together with the raw string
+    it came from, so assigning ``features`` or reloading the row invalidates
+    it. Native json values (e.g from a JSONField) are used as they are.
+    """
+
+    def _parsed_features(self):
+        features = self.features
+        if not features:
+            return {}
+        if not isinstance(features, str):
+            return features
+        cached = self.__dict__.get('_features_cache')
+        if cached is None or (cached[0] is not features and cached[0] != features):
+            cached = self.__dict__['_features_cache'] = (features, json.loads(features))
+        return cached[1]
+
+    def get_features(self):
+        return copy.copy(self._parsed_features())
+
+
+# Default plan costs by id, kept for the process lifetime and cleared when
+# plans or plan costs change
+_default_plan_costs = {}
+
+
+def get_default_plan_cost():
+    """Returns the DFS_DEFAULT_PLAN_COST_ID PlanCost (None if not set)."""
     plan_cost_id = SETTINGS['default_plan_cost_id']
-    if plan_cost_id:
-        cost_obj = PlanCost.objects.get(pk=plan_cost_id)
+    if not plan_cost_id:
+        return None
+    plan_cost = _default_plan_costs.get(plan_cost_id)
+    if plan_cost is None:
+        plan_cost = _default_plan_costs[plan_cost_id] = PlanCost.objects.select_related('plan').get(pk=plan_cost_id)
+    return plan_cost
+
+
+def clear_default_plan_cost_cache():
+    _default_plan_costs.clear()
+
+
+def activate_default_user_subscription(user):
+    cost_obj = get_default_plan_cost()
+    if cost_obj:
         cost_obj.setup_user_subscription(user, active=True, no_multiple_subscription=True,
                                          record_transaction=False, mark_transaction_paid=False,
                                          resuse=True)
 
 
+def provision_default_subscriptions(users, subscription_date=None, batch_size=1000):
+    """Gives many users the default plan cost, same as calling
+    activate_default_user_subscription on each but in a constant number of
+    queries per batch. Works for users created with bulk_create which send no
+    post_save signal.
+        Parameters:
+            users (iterable): Users or user ids.
+            subscription_date (datetime): Date to start the subscriptions.
+            batch_size (int): Number of users handled per batch.
+        Returns:
+            int: Number of activated subscriptions.
+    """
+    cost_obj = get_default_plan_cost()
+    if not cost_obj:
+        return 0
+    UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+    user_ids = [getattr(user, 'pk', user) for user in users]
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    count = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = set(user_ids[start:start + batch_size])
+        # The first subscription of a user to the default plan cost is reused like
+        # setup_user_subscription(resuse=True) does, the others are deactivated with the other plans
+        reused = {}
+        for pk, user_id in UserSubscription.objects.filter(user_id__in=batch, plan_cost=cost_obj).order_by(
+                *UserSubscription._meta.ordering, 'pk').values_list('pk', 'user_id'):
+            reused.setdefault(user_id, pk)
+        created = UserSubscription.objects.bulk_create([
+            UserSubscription(user_id=user_id, plan_cost=cost_obj, active=True, cancelled=False)
+            for user_id in batch - reused.keys()
+        ])
+        activated = [*reused.values(), *(subscription.pk for subscription in created)]
+        count += UserSubscription.objects.filter(pk__in=activated).bulk_activate(
+            subscription_date=subscription_date, mark_transaction_paid=False, no_multiple_subscription=True,
+        )
+    return count
+
+
 class PlanTag(models.Model):
     """A tag for a subscription plan."""
     tag = models.CharField(
@@ -72,7 +155,7 @@ class PlanTag(models.Model):
         return self.tag
 
 
-class SubscriptionPlan(models.Model):
+class SubscriptionPlan(FeaturesMixin, models.Model):
     """Details for a subscription plan."""
     id = models.UUIDField(
         default=uuid4,
@@ -142,37 +225,50 @@ class SubscriptionPlan(models.Model):
             'order by sequence '),
     )
 
+    objects = SubscriptionPlanQuerySet.as_manager()
+
     class Meta:
         ordering = ('sequence',)
         permissions = (
             ('subscriptions', 'Can interact with subscription details'),
         )
 
-    def get_features(self):
-        if self.features:
-            return json.loads(self.features)
-        return {}
-
     def __getattr__(self, name):
-        feature_dict = self.get_features()
+        # Special attributes and half built instances (e.g while unpickling) have no features
+        if name.startswith('__') or '_state' not in self.__dict__:
+            raise AttributeError(name)
+        feature_dict = self._parsed_features()
         if feature_dict:
             try:
                 return feature_dict[name]
-            except KeyError:
+            except (KeyError, TypeError):
                 pass
-        raise AttributeError
+        raise AttributeError(name)
 
     def __str__(self):
         return self.plan_name
 
+    def _tag_summary(self):
+        """Returns the number of tags (at most 4 when counted here) and the
+        first 3 tag names, from prefetched tags or with_tag_summary()
+        annotations when available, otherwise with one query."""
+        # __dict__ lookups, features are looked up for missing attributes
+        if 'tags' in self.__dict__.get('_prefetched_objects_cache', {}):
+            names = [tag.tag for tag in self.tags.all()]
+            return len(names), names[:3]
+        if 'tag_count' in self.__dict__:
+            names = [self.__dict__.get('tag_{}'.format(position)) for position in (1, 2, 3)]
+            return self.tag_count, [name for name in names if name is not None]
+        names = list(self.tags.order_by('tag', 'pk').values_list('tag', flat=True)[:4])
+        return len(names), names[:3]
+
     def display_tags(self):
         """Displays tags as a string (truncates if more than 3)."""
-        if self.tags.count() > 3:
-            return '{}, ...'.format(
-                ', '.join(tag.tag for tag in self.tags.all()[:3])
-            )
+        count, names = self._tag_summary()
+        if count > 3:
+            return '{}, ...'.format(', '.join(names))
 
-        return ', '.join(tag.tag for tag in self.tags.all()[:3])
+        return ', '.join(names)
 
 
 class PlanCost(models.Model):
@@ -339,6 +435,12 @@ class PlanCost(models.Model):
                                   del_multiple_subscription=del_multiple_subscription)
         return subscription
 
+    @property
+    def daily_rate(self):
+        """Exact Decimal cost per day for any recurrence unit (None for one-time costs)."""
+        from subscriptions_api.proration import daily_rate
+        return daily_rate(self.cost, self.recurrence_unit, self.recurrence_period)
+
     @property
     def daily_cost(self):
         """
@@ -365,7 +467,7 @@ class PlanCost(models.Model):
         return '{} {} {}'.format(self.plan.plan_name, self.display_billing_frequency_text, self.cost)
 
 
-class PlanList(models.Model):
+class PlanList(FeaturesMixin, models.Model):
     """Model to record details of a display list of SubscriptionPlans."""
     title = models.TextField(
         blank=True,
@@ -404,11 +506,6 @@ class PlanList(models.Model):
         help_text=_('whether this plan list is active or not.'),
     )
 
-    def get_features(self):
-        if self.features:
-            return json.loads(self.features)
-        return {}
-
     def __str__(self):
         return self.title
 
@@ -451,3 +548,171 @@ class PlanListDetail(models.Model):
 
     class Meta:
         ordering = ('order',)
+
+
+class NotificationOutbox(models.Model):
+    """A notification waiting to be sent by the outbox worker (send_outbox command)."""
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'pending'),
+        (SENDING, 'sending'),
+        (SENT, 'sent'),
+        (FAILED, 'failed'),
+    )
+    id = models.UUIDField(
+        default=uuid4,
+        editable=False,
+        primary_key=True,
+        verbose_name='ID',
+    )
+    subscription = models.ForeignKey(
+        swapper.get_model_name('subscriptions_api', 'UserSubscription'),
+        help_text=_('the subscription the notification is about'),
+        on_delete=models.CASCADE,
+        related_name='outbox_notifications',
+    )
+    notification = models.CharField(
+        help_text=_('the notification to send e.g notify_overdue'),
+        max_length=64,
+    )
+    kwargs = models.JSONField(
+        blank=True,
+        default=dict,
+        help_text=_('keyword arguments passed to the notifier'),
+    )
+    status = models.CharField(
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        max_length=16,
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text=_('number of failed sending attempts'),
+    )
+    last_error = models.TextField(
+        blank=True,
+        default='',
+    )
+    date_created = models.DateTimeField(
+        auto_now_add=True,
+    )
+    date_available = models.DateTimeField(
+        default=timezone.now,
+        help_text=_('the notification is not sent before this date (retry backoff)'),
+    )
+    date_sent = models.DateTimeField(
+        blank=True,
+        null=True,
+    )
+
+    def __str__(self):
+        return '{} {} {}'.format(self.notification, self.subscription_id, self.status)
+
+    class Meta:
+        ordering = ('date_available',)
+        indexes = [
+            models.Index(fields=['status', 'date_available'], name='dfs_outbox_status_avail_idx'),
+        ]
+
+
+class NotificationLedger(models.Model):
+    """Record of a sent notification, one per scope, notification and period (see ledger.py)."""
+    id = models.UUIDField(
+        default=uuid4,
+        editable=False,
+        primary_key=True,
+        verbose_name='ID',
+    )
+    scope = models.CharField(
+        help_text=_('who was notified e.g user:12 or subscription:<id>'),
+        max_length=64,
+    )
+    notification = models.CharField(
+        help_text=_('the notification sent e.g notify_overdue'),
+        max_length=64,
+    )
+    period_key = models.CharField(
+        help_text=_('the period the notification was sent for e.g 2024-05-01'),
+        max_length=64,
+    )
+    claim = models.UUIDField(
+        db_index=True,
+        editable=False,
+        help_text=_('the run that recorded the notification'),
+    )
+    date_created = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    def __str__(self):
+        return '{} {} {}'.format(self.scope, self.notification, self.period_key)
+
+    class Meta:
+        ordering = ('-date_created',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'notification', 'period_key'], name='dfs_ledger_unique_notification',
+            ),
+        ]
+
+
+class DailyRevenueRollup(models.Model):
+    """Transaction totals per day and plan cost, kept up to date as
+    transactions are recorded and paid (see rollup.py)."""
+    id = models.UUIDField(
+        default=uuid4,
+        editable=False,
+        primary_key=True,
+        verbose_name='ID',
+    )
+    day = models.DateField(
+        help_text=_('the day of the transactions'),
+    )
+    plan = models.ForeignKey(
+        SubscriptionPlan,
+        help_text=_('the plan of the billed subscriptions'),
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='revenue_rollups',
+    )
+    plan_cost = models.ForeignKey(
+        PlanCost,
+        help_text=_('the plan cost of the billed subscriptions'),
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='revenue_rollups',
+    )
+    count = models.IntegerField(
+        default=0,
+        help_text=_('number of transactions'),
+    )
+    gross = models.DecimalField(
+        decimal_places=2,
+        default=0,
+        help_text=_('total amount of the transactions'),
+        max_digits=19,
+    )
+    paid_count = models.IntegerField(
+        default=0,
+        help_text=_('number of paid transactions'),
+    )
+    paid = models.DecimalField(
+        decimal_places=2,
+        default=0,
+        help_text=_('total amount of the paid transactions'),
+        max_digits=19,
+    )
+
+    def __str__(self):
+        return '{} {} {} {}'.format(self.day, self.plan_cost_id, self.count, self.gross)
+
+    class Meta:
+        ordering = ('day',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'plan', 'plan_cost'], name='dfs_rollup_unique_day_plan_cost',
+            ),
+        ]
@@ -1,4 +1,82 @@
-from django.core.mail import EmailMultiAlternatives
+import importlib
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+
+from subscriptions_api.app_settings import SETTINGS
+
+# Handlers registered in code, they take precedence over the DFS_NOTIFY_* settings
+_registry = {}
+# Handlers resolved from the DFS_NOTIFY_* settings, resolved once on first use
+_resolved = {}
+
+
+def register_notifier(notifier, handler):
+    """Registers the handler of a notification e.g ``register_notifier('notify_new', WelcomeEmail)``.
+        Parameters:
+            notifier (str): Notification name e.g notify_new.
+            handler (callable): Called with the subscription, the
+                notification name and the notify kwargs. Classes like
+                EmailNotification return a notifier which is then sent, any
+                other callable or callable instance sends the notification
+                itself. None disables the notification.
+    """
+    _registry[notifier] = handler
+
+
+def unregister_notifier(notifier):
+    _registry.pop(notifier, None)
+
+
+def get_notifier(notifier):
+    """Returns the handler of a notification, None if it is disabled."""
+    if notifier in _registry:
+        return _registry[notifier]
+    if notifier not in _resolved:
+        path = SETTINGS[notifier]
+        if path is None:
+            handler = None
+        else:
+            handler = getattr(importlib.import_module(path["module"]), path["class"])
+        _resolved[notifier] = handler
+    return _resolved[notifier]
+
+
+async def asend_notifier(notify_obj):
+    """Sends a notifier built by a handler from async code.
+
+    Notifiers with an ``async def asend()`` are awaited, ``send()`` only
+    notifiers run in a thread and async handlers (coroutines) are awaited.
+    """
+    if inspect.isawaitable(notify_obj):
+        return await notify_obj
+    asend = getattr(notify_obj, 'asend', None)
+    if asend is not None:
+        return await asend()
+    send = getattr(notify_obj, 'send', None)
+    if send is not None:
+        return await sync_to_async(send)()
+
+
+@receiver(setting_changed, dispatch_uid='subscriptions_api_reset_notifiers')
+def reset_notifiers(**kwargs):
+    """Forgets the handlers resolved from settings."""
+    _resolved.clear()
+
+
+class SendReport:
+    """Outcome of EmailNotification.send_many, failures do not abort the batch."""
+
+    def __init__(self):
+        self.sent = []
+        self.failed = []
+
+    def __str__(self):
+        return 'Sent {} notifications, {} failed'.format(len(self.sent), len(self.failed))
 
 
 class EmailNotification:
@@ -8,7 +86,11 @@ class EmailNotification:
         self.subscription = subscription
         self.kwargs = kwargs
         self.notification = notification
-        self.msg = EmailMultiAlternatives(
+
+    @cached_property
+    def msg(self):
+        """The email, built on first use."""
+        return EmailMultiAlternatives(
             subject=self.get_subject(),
             body=self.get_body(),
             from_email=self.get_from_email(),
@@ -70,3 +152,67 @@ class EmailNotification:
     def send(self):
         self.extra_process()
         self.msg.send(fail_silently=self.fail_silently())
+
+    async def asend(self):
+        """Override with a native async transport (e.g webhooks), emails are sent in a thread."""
+        await sync_to_async(self.send)()
+
+    def build_message(self, connection=None):
+        """Returns the email ready to be sent, e.g with other emails in one
+        ``connection.send_messages()`` call."""
+        self.extra_process()
+        self.msg.connection = connection
+        return self.msg
+
+    def send_with(self, connection):
+        """Sends over an already open connection, errors are raised."""
+        return connection.send_messages([self.build_message(connection)])
+
+    @classmethod
+    def send_many(cls, subscriptions, notification, connection=None, **kwargs):
+        """Sends a notification to many subscriptions over one mail connection.
+            Parameters:
+                subscriptions (iterable): UserSubscription instances.
+                notification (str): Notification name e.g notify_overdue.
+                connection (obj): Mail connection to use (defaults to
+                    get_connection()).
+            Returns:
+                obj: SendReport with the sent notifiers and the
+                    (subscription, error) pairs that failed.
+        """
+        report = SendReport()
+        connection = connection or get_connection(fail_silently=False)
+        connection.open()
+        try:
+            for subscription in subscriptions:
+                try:
+                    notify_obj = cls(subscription, notification, **kwargs)
+                    notify_obj.send_with(connection)
+                except Exception as error:  # pylint: disable=broad-except
+                    report.failed.append((subscription, error))
+                else:
+                    report.sent.append(notify_obj)
+        finally:
+            connection.close()
+        return report
+
+
+class DigestEmailNotification(EmailNotification):
+    """One email for several pending notifications of a user (outbox digest mode).
+
+    ``subscription`` is the first subscription, ``items`` holds the
+    (subscription, notification, kwargs) of every merged notification.
+    """
+
+    def __init__(self, subscription, notification, items=(), **kwargs):
+        super().__init__(subscription, notification, **kwargs)
+        self.items = list(items)
+
+    def get_subject(self):
+        return "You have {} subscription notifications".format(len(self.items))
+
+    def get_body(self):
+        return "\n".join(
+            "{}: {}".format(notification.replace("notify_", "").replace("_", " "), subscription.description or subscription.pk)
+            for subscription, notification, kwargs in self.items
+        )
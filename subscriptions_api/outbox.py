@@ -0,0 +1,253 @@
+"""Sending of queued notifications.
+
+With DFS_NOTIFY_OUTBOX enabled ``notify()`` writes a ``NotificationOutbox``
+row instead of sending. ``OutboxWorker`` claims pending rows in batches
+(``SELECT ... FOR UPDATE SKIP LOCKED`` where supported) and sends the emails
+of a batch in one ``send_messages()`` call over one reused mail connection.
+Failed notifications are retried with exponential backoff until
+``max_attempts``. In digest mode the notifications of a user are claimed
+together and merged into one ``notify_digest`` message per run.
+"""
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.db import router, transaction
+from django.utils import timezone
+
+from subscriptions_api.batch import RunStats, select_for_update
+from subscriptions_api.models import NotificationOutbox
+from subscriptions_api.notifications import get_notifier
+
+
+class OutboxStats(RunStats):
+    """Throughput statistics of an outbox run, rate is in notifications sent per second."""
+    counters = ('batches', 'sent', 'failed')
+    rate_counter = 'sent'
+
+    def __str__(self):
+        return 'Sent {} notifications ({} failed) in {} batches, {:.2f}s, {:.1f} notifications/s'.format(
+            self.sent, self.failed, self.batches, self.elapsed, self.rate
+        )
+
+
+class _TrackedMessages:
+    """Messages handed to a mail backend, remembers the one being sent."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.index = -1
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        for index, message in enumerate(self.messages):
+            self.index = index
+            yield message
+
+
+def send_messages(connection, messages):
+    """Sends the messages with one ``send_messages()`` call of the connection,
+    one more call after each failing message.
+
+    Backends send the messages in order and raise at the first failure
+    (fail_silently=False), the messages before it were sent.
+        Returns:
+            dict: Error of the failed messages by index.
+    """
+    errors = {}
+    start = 0
+    while start < len(messages):
+        tracked = _TrackedMessages(messages[start:])
+        try:
+            connection.send_messages(tracked)
+        except Exception as error:  # pylint: disable=broad-except
+            failed = start + max(tracked.index, 0)
+            errors[failed] = error
+            start = failed + 1
+        else:
+            break
+    return errors
+
+
+class OutboxWorker:
+    """Sends pending outbox notifications.
+
+        Parameters:
+            batch_size (int): Number of notifications claimed per batch.
+            max_attempts (int): Attempts before a notification is marked
+                as failed.
+            retry_backoff (int): Seconds before the first retry, doubled
+                on every following attempt.
+            claim_timeout (int): Seconds a claimed notification is left to
+                a worker before others may claim it again.
+            connection (obj): Mail connection to send with (defaults to
+                get_connection()).
+            digest (bool): Merge the notifications of a user into one
+                notify_digest notification per run.
+    """
+
+    def __init__(self, batch_size=100, max_attempts=5, retry_backoff=60, claim_timeout=300, connection=None,
+                 digest=False):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.claim_timeout = claim_timeout
+        self.connection = connection
+        self.digest = digest
+        self.using = router.db_for_write(NotificationOutbox)
+
+    def get_queryset(self, now):
+        """Returns the notifications ready to be sent, claims of crashed workers expire."""
+        return NotificationOutbox.objects.using(self.using).filter(
+            status__in=(NotificationOutbox.PENDING, NotificationOutbox.SENDING),
+            date_available__lte=now,
+        ).select_related('subscription__user', 'subscription__plan_cost__plan')
+
+    def claim(self, cutoff=None):
+        """Claims the next batch of notifications available at cutoff (now by
+        default), the rows are only locked while they are claimed.
+
+        In digest mode batches are ordered by user and extended to every
+        ready notification of their last user, so the notifications of a
+        user are always claimed together.
+        """
+        now = timezone.now()
+        queryset = self.get_queryset(cutoff or now)
+        with transaction.atomic(using=self.using):
+            if self.digest:
+                ordered = queryset.order_by('subscription__user', 'date_available', 'pk')
+            else:
+                ordered = queryset.order_by('date_available')
+            notifications = list(select_for_update(ordered, skip_locked=True)[:self.batch_size])
+            if self.digest and len(notifications) == self.batch_size:
+                last_user_id = notifications[-1].subscription.user_id
+                if last_user_id is not None:
+                    notifications += select_for_update(
+                        queryset.filter(subscription__user=last_user_id).exclude(
+                            pk__in=[notification.pk for notification in notifications],
+                        ).order_by('date_available', 'pk'),
+                        skip_locked=True,
+                    )
+            if notifications:
+                NotificationOutbox.objects.using(self.using).filter(
+                    pk__in=[notification.pk for notification in notifications],
+                ).update(status=NotificationOutbox.SENDING, date_available=now + timedelta(seconds=self.claim_timeout))
+        return notifications
+
+    def _send(self, notify_obj, connection):
+        send_with = getattr(notify_obj, 'send_with', None)
+        if send_with is not None:
+            send_with(connection)
+            return
+        send = getattr(notify_obj, 'send', None)
+        if send is not None:
+            send()
+
+    def notifier(self, notifications):
+        """Returns the notifier of notifications sent together, a notify_digest
+        one for several notifications of a user, None if no notifier is set."""
+        if len(notifications) == 1:
+            notification = notifications[0]
+            Notify = get_notifier(notification.notification)  # pylint: disable=invalid-name
+            if Notify is None:
+                return None
+            return Notify(notification.subscription, notification.notification, **notification.kwargs)
+        Notify = get_notifier('notify_digest')  # pylint: disable=invalid-name
+        if Notify is None:
+            return None
+        items = [
+            (notification.subscription, notification.notification, notification.kwargs)
+            for notification in notifications
+        ]
+        return Notify(notifications[0].subscription, 'notify_digest', items=items)
+
+    def group(self, notifications):
+        """Returns the lists of notifications sent together, one list per user
+        in digest mode (one list per notification without a digest notifier)."""
+        if not self.digest or get_notifier('notify_digest') is None:
+            return [[notification] for notification in notifications]
+        groups = {}
+        for notification in notifications:
+            user_id = notification.subscription.user_id
+            key = ('user', user_id) if user_id is not None else ('notification', notification.pk)
+            groups.setdefault(key, []).append(notification)
+        return list(groups.values())
+
+    def send_batch(self, notifications, connection, stats):
+        """Sends the emails of a batch with one ``send_messages()`` call,
+        other notifiers are sent one by one."""
+        sent, failed = [], []
+
+        def fail(group, error):
+            for notification in group:
+                notification.attempts += 1
+                notification.last_error = repr(error)
+                failed.append(notification)
+
+        messages, message_groups = [], []
+        for group in self.group(notifications):
+            try:
+                notify_obj = self.notifier(group)
+                build_message = getattr(notify_obj, 'build_message', None)
+                if build_message is not None:
+                    messages.append(build_message(connection))
+                    message_groups.append(group)
+                    continue
+                self._send(notify_obj, connection)
+            except Exception as error:  # pylint: disable=broad-except
+                fail(group, error)
+            else:
+                sent.extend(notification.pk for notification in group)
+
+        errors = send_messages(connection, messages)
+        for index, group in enumerate(message_groups):
+            if index in errors:
+                fail(group, errors[index])
+            else:
+                sent.extend(notification.pk for notification in group)
+
+        now = timezone.now()
+        if sent:
+            NotificationOutbox.objects.using(self.using).filter(pk__in=sent).update(
+                status=NotificationOutbox.SENT, date_sent=now,
+            )
+        for notification in failed:
+            if notification.attempts >= self.max_attempts:
+                notification.status = NotificationOutbox.FAILED
+            else:
+                notification.status = NotificationOutbox.PENDING
+                notification.date_available = now + timedelta(
+                    seconds=self.retry_backoff * 2 ** (notification.attempts - 1)
+                )
+        NotificationOutbox.objects.using(self.using).bulk_update(
+            failed, ('attempts', 'last_error', 'status', 'date_available'),
+        )
+
+        stats.batches += 1
+        stats.sent += len(sent)
+        stats.failed += len(failed)
+
+    def run(self, max_batches=None):
+        """Sends batches until none of the notifications available when the
+        run started is left (or max_batches), notifications queued meanwhile
+        are left to the next run so a digest covers a user's whole run.
+            Returns:
+                obj: OutboxStats of the run.
+        """
+        stats = OutboxStats()
+        cutoff = timezone.now()
+        connection = self.connection or get_connection(fail_silently=False)
+        connection.open()
+        try:
+            while max_batches is None or stats.batches < max_batches:
+                notifications = self.claim(cutoff)
+                if not notifications:
+                    break
+                self.send_batch(notifications, connection, stats)
+                if len(notifications) < self.batch_size:
+                    break
+        finally:
+            connection.close()
+        stats.finish()
+        return stats
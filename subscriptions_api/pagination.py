@@ -0,0 +1,162 @@
+"""Cursor pagination of the user subscription and transaction endpoints.
+
+Pages are fetched with a keyset on (``keyset_field``, ``id``), newest first,
+backed by the (``date_transaction``, ``id``) and (``date_billing_start``,
+``id``) indexes, so deep pages cost the same as the first one. The cursor
+holds both values of the last row of the page, rows sharing a date are
+paged through by id. Rows without a date (subscriptions not started yet)
+come first.
+
+No count is returned unless DFS_PAGINATION_COUNT is set to ``exact`` (a
+``COUNT(*)`` per page) or ``estimated`` (the row estimate of the PostgreSQL
+query planner, other databases fall back to an exact count).
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+from subscriptions_api.app_settings import SETTINGS
+
+COUNT_MODES = ('exact', 'estimated')
+
+
+def estimate_count(queryset):
+    """Number of rows of a queryset as estimated by the query planner, exact
+    where the database has no estimate."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CountedCursorPagination(CursorPagination):
+    """Cursor pagination adding a ``count`` in the DFS_PAGINATION_COUNT mode."""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_count(self, queryset):
+        mode = SETTINGS['pagination_count']
+        if mode not in COUNT_MODES:
+            return None
+        if mode == 'estimated':
+            return estimate_count(queryset)
+        return queryset.count()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = self.get_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data = dict(count=self.count, **response.data)
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        if SETTINGS['pagination_count'] in COUNT_MODES:
+            response_schema['properties'] = dict(
+                count={'type': 'integer', 'example': 123},
+                **response_schema['properties'],
+            )
+        return response_schema
+
+
+class KeysetCursorPagination(CountedCursorPagination):
+    """Cursor pagination on a (``keyset_field``, ``id``) keyset, descending.
+
+    DRF's CursorPagination positions on the first ordering field only and
+    skips rows sharing it with an offset, here the position is the pair so
+    every page is a single indexed range. NULL values of ``keyset_field``
+    sort first, as in a backward scan of a PostgreSQL index.
+    """
+    keyset_field = None
+
+    def get_ordering(self, request, queryset, view):
+        return ('-{}'.format(self.keyset_field), '-id')
+
+    def get_order_by(self, reverse):
+        if reverse:
+            return F(self.keyset_field).asc(nulls_last=True), F('pk').asc()
+        return F(self.keyset_field).desc(nulls_first=True), F('pk').desc()
+
+    def encode_position(self, instance):
+        field = instance._meta.get_field(self.keyset_field)
+        value = field.value_from_object(instance)
+        return json.dumps([None if value is None else field.value_to_string(instance), str(instance.pk)])
+
+    def decode_position(self, model, position):
+        field = model._meta.get_field(self.keyset_field)
+        try:
+            value, pk = json.loads(position)
+            return (None if value is None else field.to_python(value)), model._meta.pk.to_python(pk)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def keyset_filter(self, model, value, pk, reverse):
+        """Rows after (value, pk) in the page order, before it when reverse."""
+        name = self.keyset_field
+        nullable = model._meta.get_field(name).null
+        if not reverse:
+            if value is None:
+                return Q(**{name + '__isnull': True, 'pk__lt': pk}) | Q(**{name + '__isnull': False})
+            # The redundant __lte bounds the index range
+            return Q(**{name + '__lte': value}) & (Q(**{name + '__lt': value}) | Q(**{name: value, 'pk__lt': pk}))
+        if value is None:
+            return Q(**{name + '__isnull': True, 'pk__gt': pk})
+        after = Q(**{name + '__gte': value}) & (Q(**{name + '__gt': value}) | Q(**{name: value, 'pk__gt': pk}))
+        return after | Q(**{name + '__isnull': True}) if nullable else after
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = self.get_count(queryset)
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+
+        queryset = queryset.order_by(*self.get_order_by(reverse))
+        if position is not None:
+            value, pk = self.decode_position(queryset.model, position)
+            queryset = queryset.filter(self.keyset_filter(queryset.model, value, pk, reverse))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        # An empty page continues from the cursor it was fetched with
+        self.next_position = self.encode_position(self.page[-1]) if self.page else position
+        self.previous_position = self.encode_position(self.page[0]) if self.page else position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.previous_position))
+
+
+class TransactionCursorPagination(KeysetCursorPagination):
+    keyset_field = 'date_transaction'
+
+
+class SubscriptionCursorPagination(KeysetCursorPagination):
+    keyset_field = 'date_billing_start'
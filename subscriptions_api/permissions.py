@@ -1,5 +1,7 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from subscriptions_api.entitlements import has_feature
+
 
 class IsAdminOrReadOnly(BasePermission):
     def has_permission(self, request, view):
@@ -7,3 +9,23 @@ class IsAdminOrReadOnly(BasePermission):
             return True
         else:
             return request.user.is_staff
+
+
+class HasPlanFeature(BasePermission):
+    """Allows access to users whose active subscriptions enable all the
+    features listed in ``required_plan_features`` on the view e.g
+
+        class ExportView(APIView):
+            permission_classes = (HasPlanFeature,)
+            required_plan_features = ('exports',)
+    """
+    message = 'Your subscription plan does not include this feature.'
+
+    def has_permission(self, request, view):
+        features = getattr(view, 'required_plan_features', ())
+        if not features:
+            return True
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        return all(has_feature(user, feature) for feature in features)
@@ -0,0 +1,87 @@
+"""Decimal proration of subscriptions.
+
+``PlanCost.daily_cost`` is a float kept for backwards compatibility and is 0
+for units shorter than a day. ``daily_rate`` is the exact Decimal cost per
+day for every recurrence unit, it is cached per (cost, unit, period) so a
+saved change of the plan cost gives a new rate.
+
+``credit()`` prorates the time left to the microsecond, so plans billed by
+the hour or minute get a credit too. ``unused_daily_balance`` and
+``with_unused_balance()`` keep counting whole days left (``.days``) and
+give less for a partly used day, e.g 6.67 instead of 6.83 with 20.5 days
+left of a 10.00 per 30 days plan.
+
+    credits = prorate(UserSubscription.objects.filter(active=True), as_of=timezone.now())
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from subscriptions_api.models import ONCE, SECOND, MINUTE, HOUR, DAY, WEEK, MONTH, YEAR
+
+SECONDS_PER_DAY = 86400
+# Months and years use the average Gregorian lengths like PlanCost.daily_cost
+UNIT_SECONDS = {
+    SECOND: Decimal('1'),
+    MINUTE: Decimal('60'),
+    HOUR: Decimal('3600'),
+    DAY: Decimal('86400'),
+    WEEK: Decimal('604800'),
+    MONTH: Decimal('2629739.52'),
+    YEAR: Decimal('31556952'),
+}
+UNIT_DAYS = {unit: seconds / SECONDS_PER_DAY for unit, seconds in UNIT_SECONDS.items()}
+CENT = Decimal('0.01')
+
+
+@lru_cache(maxsize=1024)
+def daily_rate(cost, recurrence_unit, recurrence_period):
+    """Returns the Decimal cost per day of a plan cost, None for one-time costs."""
+    if cost is None or recurrence_unit == ONCE or recurrence_unit not in UNIT_SECONDS:
+        return None
+    return Decimal(cost) * SECONDS_PER_DAY / (UNIT_SECONDS[recurrence_unit] * recurrence_period)
+
+
+def credit(rate, date_billing_next, as_of):
+    """Unused value of the time left until date_billing_next, rounded to
+    cents. Partial days count, unlike unused_daily_balance."""
+    if rate is None or date_billing_next is None or date_billing_next <= as_of:
+        return Decimal('0.00')
+    remaining = date_billing_next - as_of
+    days = (Decimal(remaining.days * SECONDS_PER_DAY + remaining.seconds) + Decimal(remaining.microseconds) / 1000000) / SECONDS_PER_DAY
+    return (rate * days).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def prorate(subscriptions, as_of=None):
+    """Computes the unused credit of many subscriptions e.g for upgrades.
+        Parameters:
+            subscriptions (iterable): UserSubscription instances or a
+                queryset (only the needed columns are loaded).
+            as_of (datetime): Datetime to prorate at (defaults to the
+                current datetime).
+        Returns:
+            dict: Decimal credit, rounded to cents, by subscription pk.
+    """
+    as_of = as_of or timezone.now()
+    if isinstance(subscriptions, QuerySet):
+        rows = subscriptions.values_list(
+            'pk', 'date_billing_next', 'plan_cost__cost', 'plan_cost__recurrence_unit', 'plan_cost__recurrence_period',
+        )
+    else:
+        rows = (
+            (
+                subscription.pk,
+                subscription.date_billing_next,
+                *(
+                    (subscription.plan_cost.cost, subscription.plan_cost.recurrence_unit, subscription.plan_cost.recurrence_period)
+                    if subscription.plan_cost_id else (None, None, None)
+                ),
+            )
+            for subscription in subscriptions
+        )
+    return {
+        pk: credit(daily_rate(cost, unit, period), date_billing_next, as_of)
+        for pk, date_billing_next, cost, unit, period in rows
+    }
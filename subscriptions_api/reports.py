@@ -0,0 +1,199 @@
+"""Revenue reporting computed with database aggregates.
+
+Recurring revenue normalizes every PlanCost to a monthly amount (its cost
+times the average number of its periods in a month) and sums it over the
+active subscriptions. Transaction totals are grouped by a truncated period.
+Each report is a single query, transaction totals can read the daily
+revenue rollup (see rollup.py) to scan a row per day instead of every
+transaction.
+
+    recurring_revenue(group_by='plan')
+    transaction_totals(period='month', group_by='plan_cost', rollup=True)
+"""
+from datetime import datetime
+from decimal import Decimal
+
+import swapper
+from django.db import models
+from django.db.models.functions import Trunc
+
+from subscriptions_api.expressions import Divide
+from subscriptions_api.models import DailyRevenueRollup, MONTH
+from subscriptions_api.proration import UNIT_SECONDS
+from subscriptions_api.rollup import day_start, transaction_day
+
+CENT = Decimal('0.01')
+MONEY_FIELD = models.DecimalField(max_digits=19, decimal_places=2)
+# Periods of each recurrence unit in an average month, one-time costs are not recurring revenue
+MONTHLY_FACTORS = {
+    unit: (UNIT_SECONDS[MONTH] / seconds).quantize(Decimal('1E-10'))
+    for unit, seconds in UNIT_SECONDS.items()
+}
+GROUP_BY_CHOICES = ('plan', 'plan_cost')
+PERIOD_CHOICES = ('day', 'week', 'month', 'year')
+
+# values() of each grouping, keyed by the name used in the reports and in ordering order
+_GROUP_FIELDS = {
+    None: {},
+    'plan': {
+        'plan_name': 'plan_cost__plan__plan_name',
+        'plan': 'plan_cost__plan',
+    },
+    'plan_cost': {
+        'plan_name': 'plan_cost__plan__plan_name',
+        'plan_cost': 'plan_cost',
+        'recurrence_unit': 'plan_cost__recurrence_unit',
+        'recurrence_period': 'plan_cost__recurrence_period',
+    },
+}
+
+# Same groupings on DailyRevenueRollup and SubscriptionTransaction, which keep the plan they were billed with
+_BILLED_GROUP_FIELDS = {
+    None: {},
+    'plan': {
+        'plan_name': 'plan__plan_name',
+        'plan': 'plan',
+    },
+    'plan_cost': {
+        'plan_name': 'plan__plan_name',
+        'plan_cost': 'plan_cost',
+        'recurrence_unit': 'plan_cost__recurrence_unit',
+        'recurrence_period': 'plan_cost__recurrence_period',
+    },
+}
+
+
+def monthly_cost(prefix=''):
+    """Expression of the monthly normalized cost of the PlanCost at ``prefix`` (e.g plan_cost__)."""
+    factor = models.Case(
+        *(
+            models.When(**{'{}recurrence_unit'.format(prefix): unit, 'then': models.Value(value)})
+            for unit, value in MONTHLY_FACTORS.items()
+        ),
+        default=models.Value(Decimal('0')),
+        output_field=models.DecimalField(max_digits=20, decimal_places=10),
+    )
+    return Divide(
+        models.F('{}cost'.format(prefix)) * factor,
+        models.F('{}recurrence_period'.format(prefix)),
+        output_field=MONEY_FIELD,
+    )
+
+
+def _group_fields(group_by, prefix='', groupings=_GROUP_FIELDS):
+    if group_by not in groupings:
+        raise ValueError('group_by must be one of {}'.format(', '.join(GROUP_BY_CHOICES)))
+    return {name: prefix + lookup for name, lookup in groupings[group_by].items()}
+
+
+def _values(queryset, fields, **expressions):
+    # Fields keeping their model name can't be aliased
+    names = [name for name, lookup in fields.items() if name == lookup]
+    expressions.update({name: models.F(lookup) for name, lookup in fields.items() if name != lookup})
+    return queryset.values(*names, **expressions)
+
+
+def _money(value):
+    return (value or Decimal('0')).quantize(CENT)
+
+
+def recurring_revenue(queryset=None, group_by=None):
+    """MRR, ARR and subscription counts of the active subscriptions.
+        Parameters:
+            queryset (obj): UserSubscription queryset to report on
+                (defaults to all subscriptions).
+            group_by (str): None for totals, 'plan' or 'plan_cost'.
+        Returns:
+            list: dicts with mrr, arr, subscriptions and subscribers (plus
+                the group fields), a single dict for totals.
+    """
+    if queryset is None:
+        queryset = swapper.load_model('subscriptions_api', 'UserSubscription')._default_manager.all()
+    queryset = queryset.filter(active=True, plan_cost__isnull=False).order_by()
+    aggregates = {
+        'mrr': models.Sum(monthly_cost('plan_cost__')),
+        'subscriptions': models.Count('pk'),
+        'subscribers': models.Count('user', distinct=True),
+    }
+    fields = _group_fields(group_by)
+    if fields:
+        rows = list(_values(queryset, fields).annotate(**aggregates).order_by(*fields))
+    else:
+        rows = [queryset.aggregate(**aggregates)]
+    for row in rows:
+        row['mrr'] = _money(row['mrr'])
+        row['arr'] = row['mrr'] * 12
+    return rows if fields else rows[0]
+
+
+def _day(value):
+    return transaction_day(value) if isinstance(value, datetime) else value
+
+
+def _rollup_totals(period, group_by, start, end):
+    queryset = DailyRevenueRollup.objects.order_by()
+    if start is not None:
+        queryset = queryset.filter(day__gte=_day(start))
+    if end is not None:
+        queryset = queryset.filter(day__lt=_day(end))
+    fields = _group_fields(group_by, groupings=_BILLED_GROUP_FIELDS)
+    grouped = _values(queryset, fields, period=Trunc('day', period))
+    rows = list(grouped.annotate(
+        # Named apart from the rollup fields
+        paid_sum=models.Sum('paid'),
+        unpaid_sum=models.Sum(models.F('gross') - models.F('paid')),
+        paid_number=models.Sum('paid_count'),
+        unpaid_number=models.Sum(models.F('count') - models.F('paid_count')),
+    ).order_by('period', *fields))
+    for row in rows:
+        # Same datetime periods as the transaction totals
+        row['period'] = day_start(row['period'])
+        row['paid_total'] = _money(row.pop('paid_sum'))
+        row['unpaid_total'] = _money(row.pop('unpaid_sum'))
+        row['paid_count'] = row.pop('paid_number') or 0
+        row['unpaid_count'] = row.pop('unpaid_number') or 0
+    return rows
+
+
+def transaction_totals(queryset=None, period='month', group_by=None, start=None, end=None, rollup=False):
+    """Paid and unpaid transaction totals per period.
+        Parameters:
+            queryset (obj): SubscriptionTransaction queryset to report on
+                (defaults to all transactions).
+            period (str): day, week, month or year.
+            group_by (str): None, 'plan' or 'plan_cost' the transactions were
+                billed with.
+            start (datetime): Only transactions from this date.
+            end (datetime): Only transactions before this date.
+            rollup (bool): Read the totals of all transactions from the
+                daily revenue rollup, start and end are truncated to days.
+        Returns:
+            list: dicts with period, paid_total, unpaid_total, paid_count
+                and unpaid_count (plus the group fields) ordered by period.
+    """
+    if period not in PERIOD_CHOICES:
+        raise ValueError('period must be one of {}'.format(', '.join(PERIOD_CHOICES)))
+    if rollup:
+        if queryset is not None:
+            raise ValueError('The rollup has the totals of all transactions, a queryset can not be given')
+        return _rollup_totals(period, group_by, start, end)
+    if queryset is None:
+        queryset = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')._default_manager.all()
+    if start is not None:
+        queryset = queryset.filter(date_transaction__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date_transaction__lt=end)
+    queryset = queryset.order_by()
+    fields = _group_fields(group_by, groupings=_BILLED_GROUP_FIELDS)
+    grouped = _values(queryset, fields, period=Trunc('date_transaction', period))
+    paid = models.Q(paid=True)
+    rows = list(grouped.annotate(
+        paid_total=models.Sum('amount', filter=paid),
+        unpaid_total=models.Sum('amount', filter=~paid),
+        paid_count=models.Count('pk', filter=paid),
+        unpaid_count=models.Count('pk', filter=~paid),
+    ).order_by('period', *fields))
+    for row in rows:
+        row['paid_total'] = _money(row['paid_total'])
+        row['unpaid_total'] = _money(row['unpaid_total'])
+    return rows
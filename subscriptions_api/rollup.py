@@ -0,0 +1,234 @@
+"""Daily revenue rollup of subscription transactions.
+
+DailyRevenueRollup keeps the number and totals of the transactions per day,
+plan and plan cost. The plan and plan cost are the ones stored on the
+transaction when it was billed, so a transaction is always added and removed
+under the same row even if its subscription changes plan or is deleted.
+Rows are incremented with deltas when transactions are saved or deleted
+(signals.py), marked paid in bulk with
+``SubscriptionTransaction.objects.mark_paid()`` and billed by BillingEngine,
+so revenue reports read a row per day instead of every transaction.
+
+Transactions written with other queryset ``update()`` or ``bulk_create()``
+calls are not tracked, rebuild the affected days with
+
+    python manage.py rebuild_revenue_rollup --start 2024-05-01
+"""
+from collections import defaultdict
+from datetime import datetime, time
+from decimal import Decimal
+
+import swapper
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, models, router, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+ZERO = Decimal('0.00')
+# Transaction fields the rollup depends on
+ROLLUP_FIELDS = {'plan', 'plan_cost', 'date_transaction', 'amount', 'paid'}
+
+
+def _rollup_model():
+    return apps.get_model('subscriptions_api', 'DailyRevenueRollup')
+
+
+def _new_deltas():
+    # (day, plan_id, plan_cost_id) -> [count, gross, paid_count, paid]
+    return defaultdict(lambda: [0, ZERO, 0, ZERO])
+
+
+def transaction_day(date_transaction):
+    """Day of a transaction datetime in the current timezone, same as TruncDate."""
+    if timezone.is_aware(date_transaction):
+        date_transaction = timezone.localtime(date_transaction)
+    return date_transaction.date()
+
+
+def day_start(day):
+    """Datetime a day starts at in the current timezone."""
+    value = datetime.combine(day, time.min)
+    if settings.USE_TZ:
+        value = timezone.make_aware(value)
+    return value
+
+
+def _add(deltas, key, amount, paid, sign=1):
+    # Unsaved or just created instances may hold the amount as given e.g a string
+    amount = (Decimal(str(amount)) if amount is not None else ZERO) * sign
+    row = deltas[key]
+    row[0] += sign
+    row[1] += amount
+    if paid:
+        row[2] += sign
+        row[3] += amount
+
+
+def transaction_deltas(transactions, sign=1):
+    """Rollup deltas of transaction instances, -1 sign removes them."""
+    deltas = _new_deltas()
+    for transaction_obj in transactions:
+        _add(
+            deltas,
+            (transaction_day(transaction_obj.date_transaction), transaction_obj.plan_id, transaction_obj.plan_cost_id),
+            transaction_obj.amount,
+            transaction_obj.paid,
+            sign,
+        )
+    return deltas
+
+
+def aggregate_transactions(queryset):
+    """Rollup rows of a transaction queryset grouped in the database.
+        Returns:
+            list: dicts with day, plan, plan_cost (ids), count, gross,
+                paid_count and paid_gross.
+    """
+    paid = models.Q(paid=True)
+    return list(
+        queryset.order_by().values('plan', 'plan_cost', day=TruncDate('date_transaction')).annotate(
+            count=models.Count('pk'),
+            gross=models.Sum('amount'),
+            paid_count=models.Count('pk', filter=paid),
+            paid_gross=models.Sum('amount', filter=paid),
+        )
+    )
+
+
+def _increment(manager, key, row):
+    day, plan_id, plan_cost_id = key
+    count, gross, paid_count, paid = row
+    return manager.filter(day=day, plan_id=plan_id, plan_cost_id=plan_cost_id).update(
+        count=models.F('count') + count,
+        gross=models.F('gross') + gross,
+        paid_count=models.F('paid_count') + paid_count,
+        paid=models.F('paid') + paid,
+    )
+
+
+def apply_deltas(deltas, using=None):
+    """Adds deltas to the rollup rows, creating the missing ones.
+
+    One query finds the existing rows of the days, missing rows are
+    inserted at once and every existing row is incremented in the database
+    so concurrent writers don't overwrite each other.
+    """
+    deltas = {key: row for key, row in deltas.items() if any(row)}
+    if not deltas:
+        return
+    Rollup = _rollup_model()
+    using = using or router.db_for_write(Rollup)
+    manager = Rollup._default_manager.db_manager(using)
+    with transaction.atomic(using=using, savepoint=False):
+        existing = set(
+            manager.filter(day__in={day for day, plan_id, plan_cost_id in deltas})
+            .values_list('day', 'plan_id', 'plan_cost_id')
+        )
+        missing = [key for key in deltas if key not in existing]
+        if missing:
+            try:
+                with transaction.atomic(using=using):
+                    manager.bulk_create([
+                        Rollup(
+                            day=day, plan_id=plan_id, plan_cost_id=plan_cost_id,
+                            count=deltas[day, plan_id, plan_cost_id][0],
+                            gross=deltas[day, plan_id, plan_cost_id][1],
+                            paid_count=deltas[day, plan_id, plan_cost_id][2],
+                            paid=deltas[day, plan_id, plan_cost_id][3],
+                        )
+                        for day, plan_id, plan_cost_id in missing
+                    ])
+            except IntegrityError:
+                # Created concurrently, increment them one by one
+                for key in missing:
+                    if not _increment(manager, key, deltas[key]):
+                        day, plan_id, plan_cost_id = key
+                        count, gross, paid_count, paid = deltas[key]
+                        manager.create(
+                            day=day, plan_id=plan_id, plan_cost_id=plan_cost_id,
+                            count=count, gross=gross, paid_count=paid_count, paid=paid,
+                        )
+        for key in existing.intersection(deltas):
+            _increment(manager, key, deltas[key])
+
+
+def record_transactions(transactions, using=None):
+    """Adds newly created transactions (e.g from bulk_create) to the rollup."""
+    apply_deltas(transaction_deltas(transactions), using=using)
+
+
+def transaction_changed(instance, created):
+    """Moves a saved transaction from its previous rollup row to its current one."""
+    if created:
+        record_transactions([instance], using=instance._state.db)
+        return
+    dirty_fields = instance.get_dirty_fields()
+    if ROLLUP_FIELDS.isdisjoint(dirty_fields):
+        return
+    previous = {
+        name: dirty_fields.get(name, getattr(instance, instance._meta.get_field(name).attname))
+        for name in ROLLUP_FIELDS
+    }
+    if previous['date_transaction'] is None:
+        # Saved over a row it was not loaded from, the previous values are unknown
+        return
+    deltas = transaction_deltas([instance])
+    _add(
+        deltas,
+        (transaction_day(previous['date_transaction']), previous['plan'], previous['plan_cost']),
+        previous['amount'],
+        previous['paid'],
+        -1,
+    )
+    apply_deltas(deltas, using=instance._state.db)
+
+
+def transaction_deleted(instance):
+    apply_deltas(transaction_deltas([instance], sign=-1), using=instance._state.db)
+
+
+def mark_paid_deltas(rows):
+    """Rollup deltas of marking unpaid transactions paid.
+        Parameters:
+            rows: (date_transaction, plan_id, plan_cost_id, amount) of the
+                transactions.
+    """
+    deltas = _new_deltas()
+    for date_transaction, plan_id, plan_cost_id, amount in rows:
+        delta = deltas[transaction_day(date_transaction), plan_id, plan_cost_id]
+        delta[2] += 1
+        delta[3] += amount or ZERO
+    return deltas
+
+
+def rebuild(start=None, end=None, batch_size=1000):
+    """Recomputes the rollup rows of the days from start to end (excluded)
+    from the transactions, the whole rollup by default.
+        Returns:
+            int: Number of rollup rows written.
+    """
+    Rollup = _rollup_model()
+    SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+    rollups = Rollup._default_manager.all()
+    transactions = SubscriptionTransaction._default_manager.all()
+    if start is not None:
+        rollups = rollups.filter(day__gte=start)
+        transactions = transactions.filter(date_transaction__gte=day_start(start))
+    if end is not None:
+        rollups = rollups.filter(day__lt=end)
+        transactions = transactions.filter(date_transaction__lt=day_start(end))
+    with transaction.atomic(using=router.db_for_write(Rollup)):
+        rollups.delete()
+        created = Rollup._default_manager.bulk_create(
+            [
+                Rollup(
+                    day=row['day'], plan_id=row['plan'], plan_cost_id=row['plan_cost'],
+                    count=row['count'], gross=row['gross'] or ZERO,
+                    paid_count=row['paid_count'], paid=row['paid_gross'] or ZERO,
+                )
+                for row in aggregate_transactions(transactions)
+            ],
+            batch_size=batch_size,
+        )
+    return len(created)
@@ -1,6 +1,6 @@
 import swapper
 from rest_framework import serializers
-from subscriptions_api import models
+from subscriptions_api import models, reports
 
 UserSubscriptionModel = swapper.load_model('subscriptions_api', 'UserSubscription')
 SubscriptionTransactionModel = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
@@ -98,3 +98,46 @@ class UserSubscriptionSerializer(serializers.ModelSerializer):
 
     def get_description(self, obj):
         return obj.description
+
+
+class ReportQuerySerializer(serializers.Serializer):
+    """Query parameters of the report endpoints"""
+    group_by = serializers.ChoiceField(choices=reports.GROUP_BY_CHOICES, required=False)
+    period = serializers.ChoiceField(choices=reports.PERIOD_CHOICES, default='month')
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+
+class TransactionReportQuerySerializer(ReportQuerySerializer):
+    """Query parameters of the transaction totals report"""
+    source = serializers.ChoiceField(
+        choices=('rollup', 'transactions'), default='rollup',
+        help_text='Totals from the daily revenue rollup or aggregated from the transactions',
+    )
+
+
+class RecurringRevenueSerializer(serializers.Serializer):
+    """Recurring revenue report row, group fields are only present when grouped"""
+    plan = serializers.CharField(required=False)
+    plan_cost = serializers.CharField(required=False)
+    plan_name = serializers.CharField(required=False)
+    recurrence_unit = serializers.CharField(required=False)
+    recurrence_period = serializers.IntegerField(required=False)
+    mrr = serializers.DecimalField(max_digits=19, decimal_places=2)
+    arr = serializers.DecimalField(max_digits=19, decimal_places=2)
+    subscriptions = serializers.IntegerField()
+    subscribers = serializers.IntegerField()
+
+
+class TransactionTotalsSerializer(serializers.Serializer):
+    """Transaction totals report row"""
+    period = serializers.DateTimeField()
+    plan = serializers.CharField(required=False)
+    plan_cost = serializers.CharField(required=False)
+    plan_name = serializers.CharField(required=False)
+    recurrence_unit = serializers.CharField(required=False)
+    recurrence_period = serializers.IntegerField(required=False)
+    paid_total = serializers.DecimalField(max_digits=19, decimal_places=2)
+    unpaid_total = serializers.DecimalField(max_digits=19, decimal_places=2)
+    paid_count = serializers.IntegerField()
+    unpaid_count = serializers.IntegerField()
@@ -1,11 +1,81 @@
+import swapper
 from django.contrib.auth import get_user_model
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_save, post_delete
 
-from subscriptions_api.models import activate_default_user_subscription
+from subscriptions_api.catalog import bump_catalog_version
+from subscriptions_api.entitlements import invalidate_entitlements, invalidate_all_entitlements
+from subscriptions_api.models import (
+    activate_default_user_subscription, clear_default_plan_cost_cache, SubscriptionPlan, PlanCost, PlanTag, PlanList,
+    PlanListDetail,
+)
+from subscriptions_api.rollup import transaction_changed, transaction_deleted
+
+UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+
+# Subscription fields the entitlements of a user depend on
+ENTITLEMENT_FIELDS = {'user', 'plan_cost', 'active'}
 
 
 @receiver(post_save, sender=get_user_model(), dispatch_uid='assign_default_subscription')
 def create_default_subscription(sender, instance, created, **kwargs):
     if created:
         activate_default_user_subscription(instance)
+
+
+@receiver(post_save, sender=UserSubscription, dispatch_uid='subscription_saved_invalidate_entitlements')
+def invalidate_subscription_entitlements(sender, instance, using, **kwargs):
+    dirty_fields = instance.get_dirty_fields()
+    if ENTITLEMENT_FIELDS.isdisjoint(dirty_fields):
+        return
+    # A subscription moved to another user also changes the previous user's entitlements
+    invalidate_entitlements({instance.user_id, dirty_fields.get('user')}, using=using)
+
+
+@receiver(post_delete, sender=UserSubscription, dispatch_uid='subscription_deleted_invalidate_entitlements')
+def invalidate_deleted_subscription_entitlements(sender, instance, using, **kwargs):
+    invalidate_entitlements([instance.user_id], using=using)
+
+
+@receiver(post_save, sender=SubscriptionPlan, dispatch_uid='plan_saved_invalidate_entitlements')
+@receiver(post_delete, sender=SubscriptionPlan, dispatch_uid='plan_deleted_invalidate_entitlements')
+@receiver(post_save, sender=PlanCost, dispatch_uid='cost_saved_invalidate_entitlements')
+@receiver(post_delete, sender=PlanCost, dispatch_uid='cost_deleted_invalidate_entitlements')
+def invalidate_plan_entitlements(sender, using, **kwargs):
+    invalidate_all_entitlements(using=using)
+
+
+@receiver(post_save, sender=SubscriptionPlan, dispatch_uid='plan_saved_clear_default_plan_cost')
+@receiver(post_delete, sender=SubscriptionPlan, dispatch_uid='plan_deleted_clear_default_plan_cost')
+@receiver(post_save, sender=PlanCost, dispatch_uid='cost_saved_clear_default_plan_cost')
+@receiver(post_delete, sender=PlanCost, dispatch_uid='cost_deleted_clear_default_plan_cost')
+def clear_default_plan_cost(sender, **kwargs):
+    clear_default_plan_cost_cache()
+
+
+@receiver(post_save, sender=SubscriptionPlan, dispatch_uid='plan_saved_bump_catalog')
+@receiver(post_delete, sender=SubscriptionPlan, dispatch_uid='plan_deleted_bump_catalog')
+@receiver(m2m_changed, sender=SubscriptionPlan.tags.through, dispatch_uid='plan_tags_changed_bump_catalog')
+@receiver(post_save, sender=PlanCost, dispatch_uid='cost_saved_bump_catalog')
+@receiver(post_delete, sender=PlanCost, dispatch_uid='cost_deleted_bump_catalog')
+@receiver(post_save, sender=PlanTag, dispatch_uid='tag_saved_bump_catalog')
+@receiver(post_delete, sender=PlanTag, dispatch_uid='tag_deleted_bump_catalog')
+@receiver(post_save, sender=PlanList, dispatch_uid='plan_list_saved_bump_catalog')
+@receiver(post_delete, sender=PlanList, dispatch_uid='plan_list_deleted_bump_catalog')
+@receiver(post_save, sender=PlanListDetail, dispatch_uid='plan_list_detail_saved_bump_catalog')
+@receiver(post_delete, sender=PlanListDetail, dispatch_uid='plan_list_detail_deleted_bump_catalog')
+def bump_catalog(sender, using, **kwargs):
+    bump_catalog_version(using=using)
+
+
+@receiver(post_save, sender=SubscriptionTransaction, dispatch_uid='transaction_saved_update_rollup')
+def update_revenue_rollup(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    transaction_changed(instance, created)
+
+
+@receiver(post_delete, sender=SubscriptionTransaction, dispatch_uid='transaction_deleted_update_rollup')
+def remove_from_revenue_rollup(sender, instance, **kwargs):
+    transaction_deleted(instance)
@@ -0,0 +1,166 @@
+"""Throttles driven by plan features.
+
+Request quotas are kept in token buckets, in process memory by default or in
+the Django cache named by DFS_THROTTLE_CACHE so the quota is shared by all
+processes. Together with the cached entitlements a throttled request costs no
+database queries.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from subscriptions_api.app_settings import SETTINGS
+from subscriptions_api.entitlements import get_feature
+
+
+class TokenBucket:
+    """A bucket of ``capacity`` tokens refilled at ``refill_rate`` tokens per
+    second, times are passed in by the caller so any clock can be used."""
+
+    def __init__(self, capacity, refill_rate, tokens=None, updated=None):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity if tokens is None else tokens
+        self.updated = updated
+
+    def refill(self, now):
+        if self.updated is not None and now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def consume(self, now, tokens=1):
+        """Takes tokens from the bucket.
+            Returns:
+                bool: Whether there were enough tokens.
+        """
+        self.refill(now)
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+    def is_full(self, now):
+        """Whether the bucket is full by now, the same as a new bucket."""
+        if self.tokens >= self.capacity:
+            return True
+        if not self.refill_rate or self.updated is None:
+            return False
+        return self.updated + (self.capacity - self.tokens) / self.refill_rate <= now
+
+    def wait_time(self, tokens=1):
+        """Seconds until enough tokens are available."""
+        if self.tokens >= tokens:
+            return 0.0
+        if not self.refill_rate:
+            return None
+        return (tokens - self.tokens) / self.refill_rate
+
+
+class LocalBucketStore:
+    """Buckets in process memory, each process enforces its own quota.
+
+    Buckets are kept least recently used first. Full buckets are dropped from
+    that end as requests come in, a new bucket starts full anyway, and at
+    most ``max_buckets`` are kept.
+    """
+
+    def __init__(self, max_buckets=10000):
+        self.buckets = OrderedDict()
+        self.max_buckets = max_buckets
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, now):
+        with self.lock:
+            bucket = self.buckets.pop(key, None)
+            if bucket is None or bucket.capacity != capacity:
+                bucket = TokenBucket(capacity, refill_rate, updated=now)
+            bucket.refill_rate = refill_rate
+            allowed = bucket.consume(now)
+            self.buckets[key] = bucket
+            self.evict(now)
+            return allowed, bucket.wait_time()
+
+    def evict(self, now):
+        while self.buckets:
+            oldest = next(iter(self.buckets.values()))
+            if len(self.buckets) <= self.max_buckets and not oldest.is_full(now):
+                return
+            self.buckets.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBucketStore:
+    """Buckets in a Django cache shared by all processes.
+
+    The bucket is read and written without a lock, concurrent requests of
+    the same user may occasionally both get the last token.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def consume(self, key, capacity, refill_rate, now):
+        cache = caches[self.alias]
+        state = cache.get(key)
+        if state is None or state[0] != capacity:
+            bucket = TokenBucket(capacity, refill_rate, updated=now)
+        else:
+            bucket = TokenBucket(capacity, refill_rate, tokens=state[1], updated=state[2])
+        allowed = bucket.consume(now)
+        # Kept until a full bucket would have refilled
+        timeout = int(capacity / refill_rate) + 1 if refill_rate else None
+        cache.set(key, (capacity, bucket.tokens, bucket.updated), timeout)
+        return allowed, bucket.wait_time()
+
+    def clear(self):
+        pass
+
+
+_local_store = LocalBucketStore()
+
+
+def get_bucket_store():
+    if SETTINGS['throttle_cache']:
+        return CacheBucketStore(SETTINGS['throttle_cache'])
+    return _local_store
+
+
+class PlanFeatureRateThrottle(BaseThrottle):
+    """Limits authenticated users to the number of requests per ``period``
+    seconds set by the ``feature`` of their plans e.g
+    ``{"api_calls_per_minute": 600}``.
+
+    Users without the feature are not throttled, a limit of 0 blocks all
+    requests. Anonymous requests are left to the other throttles.
+    """
+    feature = 'api_calls_per_minute'
+    period = 60
+    scope = 'plan_feature'
+    timer = time.time
+
+    def get_cache_key(self, request, view):
+        return 'subscriptions_api:throttle:{}:{}:{}'.format(self.scope, self.feature, request.user.pk)
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        user = request.user
+        if not user or not user.is_authenticated:
+            return True
+        limit = get_feature(user, self.feature)
+        if limit is None or isinstance(limit, bool) or not isinstance(limit, (int, float)):
+            return True
+        if limit <= 0:
+            return False
+        allowed, self.wait_seconds = get_bucket_store().consume(
+            self.get_cache_key(request, view), limit, limit / self.period, self.timer(),
+        )
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
@@ -1,7 +1,7 @@
 from rest_framework import routers
 from .views import PlanTagViewSet, PlanCostViewSet, PlanListDetailViewSet, \
     PlanListViewSet, SubscriptionPlanViewSet, SubscriptionTransactionViewSet, \
-    UserSubscriptionViewSet
+    UserSubscriptionViewSet, ReportViewSet
 
 app_name = 'subscriptions_api'
 
@@ -13,5 +13,6 @@ router.register('planlist', PlanListViewSet, basename='planlist')
 router.register('subscription-plans', SubscriptionPlanViewSet, basename='subscription-plans')
 router.register('subscription-transactions', SubscriptionTransactionViewSet, basename='subscription-transactions')
 router.register('user-subscriptions', UserSubscriptionViewSet, basename='user-subscriptions')
+router.register('reports', ReportViewSet, basename='reports')
 
 urlpatterns = router.urls
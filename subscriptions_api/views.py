@@ -1,43 +1,66 @@
 import swapper
+from django.db.models import Prefetch
 from rest_framework import viewsets
-from subscriptions_api import serializers, models
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from subscriptions_api import serializers, models, reports
+from .catalog import CatalogCacheMixin
+from .export import ExportMixin
+from .filters import SubscriptionFilterBackend, TransactionFilterBackend
+from .pagination import SubscriptionCursorPagination, TransactionCursorPagination
 from .permissions import IsAdminOrReadOnly
 
 UserSubscriptionModel = swapper.load_model('subscriptions_api', 'UserSubscription')
 SubscriptionTransactionModel = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
 
 
+def plan_prefetches(prefix=''):
+    """Relations read by SubscriptionPlanSerializer, for plans at prefix (e.g plan__)."""
+    return [prefix + 'tags', prefix + 'costs']
+
+
 class PlanTagViewSet(viewsets.ModelViewSet):
     queryset = models.PlanTag.objects.all()
     serializer_class = serializers.PlanTagSerializer
     permission_classes = (IsAdminOrReadOnly,)
 
 
-class SubscriptionPlanViewSet(viewsets.ModelViewSet):
-    queryset = models.SubscriptionPlan.objects.all()
+class SubscriptionPlanViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
+    queryset = models.SubscriptionPlan.objects.prefetch_related(*plan_prefetches())
     serializer_class = serializers.SubscriptionPlanSerializer
     permission_classes = (IsAdminOrReadOnly,)
 
 
-class PlanCostViewSet(viewsets.ModelViewSet):
+class PlanCostViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = models.PlanCost.objects.all()
     serializer_class = serializers.PlanCostSerializer
     permission_classes = (IsAdminOrReadOnly,)
 
 
-class UserSubscriptionViewSet(viewsets.ModelViewSet):
+class UserSubscriptionViewSet(ExportMixin, viewsets.ModelViewSet):
     serializer_class = serializers.UserSubscriptionSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    pagination_class = SubscriptionCursorPagination
+    filter_backends = (SubscriptionFilterBackend,)
+    export_ordering = ('date_billing_start', 'id')
+    export_filename = 'subscriptions'
 
     def get_queryset(self):
+        # description reads the plan cost and plan, transactions are nested
+        queryset = UserSubscriptionModel.objects.select_related('plan_cost__plan').prefetch_related('transactions')
         if self.request.user.is_staff:
-            return UserSubscriptionModel.objects.all()
-        return UserSubscriptionModel.objects.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
 
 
-class SubscriptionTransactionViewSet(viewsets.ModelViewSet):
+class SubscriptionTransactionViewSet(ExportMixin, viewsets.ModelViewSet):
     serializer_class = serializers.SubscriptionTransactionSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    pagination_class = TransactionCursorPagination
+    filter_backends = (TransactionFilterBackend,)
+    export_ordering = ('date_transaction', 'id')
+    export_filename = 'transactions'
 
     def get_queryset(self):
         if self.request.user.is_staff:
@@ -45,13 +68,50 @@ class SubscriptionTransactionViewSet(viewsets.ModelViewSet):
         return SubscriptionTransactionModel.objects.filter(user=self.request.user)
 
 
-class PlanListViewSet(viewsets.ModelViewSet):
-    queryset = models.PlanList.objects.all()
+class PlanListViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
+    queryset = models.PlanList.objects.prefetch_related(
+        Prefetch(
+            'plan_list_details',
+            queryset=models.PlanListDetail.objects.select_related('plan').prefetch_related(*plan_prefetches('plan__')),
+        ),
+    )
     serializer_class = serializers.PlanListSerializer
     permission_classes = (IsAdminOrReadOnly,)
 
 
 class PlanListDetailViewSet(viewsets.ModelViewSet):
-    queryset = models.PlanListDetail.objects.all()
+    queryset = models.PlanListDetail.objects.select_related('plan').prefetch_related(*plan_prefetches('plan__'))
     serializer_class = serializers.PlanListDetailSerializer
     permission_classes = (IsAdminOrReadOnly,)
+
+
+class ReportViewSet(viewsets.ViewSet):
+    """Read only revenue reports for admins, computed with database aggregates"""
+    permission_classes = (IsAdminUser,)
+
+    def get_query(self, serializer_class=serializers.ReportQuerySerializer):
+        query = serializer_class(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        return query.validated_data
+
+    def list(self, request):
+        """MRR, ARR and active subscription totals"""
+        return Response(serializers.RecurringRevenueSerializer(reports.recurring_revenue()).data)
+
+    @action(detail=False)
+    def revenue(self, request):
+        """MRR and ARR grouped by plan or plan_cost (?group_by=)"""
+        group_by = self.get_query().get('group_by')
+        rows = reports.recurring_revenue(group_by=group_by)
+        return Response(serializers.RecurringRevenueSerializer(rows, many=group_by is not None).data)
+
+    @action(detail=False)
+    def transactions(self, request):
+        """Paid and unpaid transaction totals per period (?period=&group_by=&start=&end=) from the daily revenue
+        rollup, ?source=transactions aggregates the transactions instead"""
+        query = self.get_query(serializers.TransactionReportQuerySerializer)
+        rows = reports.transaction_totals(
+            period=query['period'], group_by=query.get('group_by'), start=query.get('start'), end=query.get('end'),
+            rollup=query['source'] == 'rollup',
+        )
+        return Response(serializers.TransactionTotalsSerializer(rows, many=True).data)
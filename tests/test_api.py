@@ -2,6 +2,7 @@ import json
 import pytest
 from datetime import datetime
 
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
@@ -14,6 +15,8 @@ from subscriptions_api.models import PlanList, PlanCost, SubscriptionPlan
 class BaseTest(APITestCase):
 
     def setUp(self):
+        # Catalog responses are cached across tests
+        cache.clear()
         self.user = User.objects.create_user('demo_user')
         self.admin_user = User.objects.create_user('admin_user')
         self.admin_user.is_staff = True
@@ -195,7 +198,7 @@ class BaseTest(APITestCase):
         self.client.force_authenticate(self.user)
         plans_url = reverse('subscriptions_api:subscription-plans-detail', kwargs={'pk': plan.pk})
         r = self.client.get(plans_url)
-        self.assertTrue(r.data['features']['allow_user_to_perform_action'])
+        self.assertTrue(r.json()['features']['allow_user_to_perform_action'])
 
     def test_planlist_label_returned(self):
         plan_list = PlanList(title='Bi Weekly Plans', features=json.dumps({'_name': 'Name of Plan'}))
@@ -203,7 +206,7 @@ class BaseTest(APITestCase):
         plan_list_url = reverse('subscriptions_api:planlist-detail', kwargs={'pk': plan_list.pk})
         self.client.force_authenticate(self.user)
         r = self.client.get(plan_list_url)
-        self.assertIn('Name of Plan', r.data['features']['_name'])
+        self.assertIn('Name of Plan', r.json()['features']['_name'])
 
     def create_new_user_plan(self, plan_name):
         plan = SubscriptionPlan(plan_name=plan_name, feature_ref=plan_name)
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+import swapper
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from subscriptions_api.models import PlanList, PlanListDetail, PlanCost, PlanTag, SubscriptionPlan, MONTH, YEAR
+
+pytestmark = pytest.mark.django_db
+
+SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+
+
+@pytestmark
+class TestEndpointQueryCounts(APITestCase):
+    """Listing endpoints run the same number of queries whatever the number of rows."""
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_user('query_admin', is_staff=True)
+        self.plan_list = PlanList.objects.create(title='Plans')
+        self.tags = [PlanTag.objects.create(tag='Tag {}'.format(i)) for i in range(4)]
+        self.plans = 0
+
+    def add_plans(self, count):
+        for i in range(self.plans, self.plans + count):
+            plan = SubscriptionPlan.objects.create(plan_name='Plan {}'.format(i))
+            plan.tags.set(self.tags[:i % 5])
+            monthly = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+            PlanCost.objects.create(plan=plan, recurrence_unit=YEAR, cost=100)
+            PlanListDetail.objects.create(plan_list=self.plan_list, plan=plan, order=i)
+            user = User.objects.create_user('query_user_{}'.format(i))
+            subscription = monthly.setup_user_subscription(user, active=True)
+            for day in (1, 2):
+                SubscriptionTransaction.objects.create(
+                    user=user, subscription=subscription, amount=10, date_transaction=datetime(2024, 1, day),
+                )
+        self.plans += count
+
+    def assertConstantQueries(self, url_name, expected):
+        url = reverse('subscriptions_api:{}'.format(url_name))
+        self.client.force_authenticate(self.admin_user)
+        for count in (2, 8):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.add_plans(count)
+            with CaptureQueriesContext(connection) as queries:
+                r = self.client.get(url)
+            self.assertEqual(r.status_code, status.HTTP_200_OK)
+            self.assertTrue(r.json())
+            self.assertEqual(
+                len(queries), expected,
+                '{} ran {} queries with {} plans'.format(url_name, len(queries), self.plans),
+            )
+
+    def test_subscription_plans(self):
+        self.assertConstantQueries('subscription-plans-list', 3)
+
+    def test_plan_costs(self):
+        self.assertConstantQueries('plan-costs-list', 1)
+
+    def test_plan_lists(self):
+        self.assertConstantQueries('planlist-list', 4)
+
+    def test_plan_list_details(self):
+        self.assertConstantQueries('planlist-details-list', 3)
+
+    def test_user_subscriptions(self):
+        self.assertConstantQueries('user-subscriptions-list', 2)
+
+    def test_subscription_transactions(self):
+        self.assertConstantQueries('subscription-transactions-list', 1)
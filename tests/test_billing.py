@@ -0,0 +1,101 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+import swapper
+from django.contrib.auth.models import User, Group
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from subscriptions_api.billing import BillingEngine
+from subscriptions_api.expressions import flag
+from subscriptions_api.models import SubscriptionPlan, PlanCost, MONTH
+
+pytestmark = pytest.mark.django_db
+
+UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+
+
+@pytestmark
+class TestBillingEngine(TestCase):
+
+    def setUp(self):
+        group = Group.objects.create(name='Billing Plan')
+        plan = SubscriptionPlan.objects.create(plan_name='Billing Plan', group=group, grace_period=3)
+        self.cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+        self.now = timezone.now()
+
+    def create_subscriptions(self, count, days_ago=40, **kwargs):
+        subscriptions = []
+        for i in range(count):
+            user = User.objects.create_user('billing_user_{}_{}'.format(days_ago, i))
+            subscription = self.cost.setup_user_subscription(
+                user, active=True, subscription_date=self.now - timedelta(days=days_ago)
+            )
+            if kwargs:
+                UserSubscription.objects.filter(pk=subscription.pk).update(**kwargs)
+            subscriptions.append(subscription)
+        return subscriptions
+
+    def test_due_subscriptions_billed(self):
+        subscriptions = self.create_subscriptions(5)
+        stats = BillingEngine(chunk_size=2, now=self.now).run()
+        self.assertEqual(stats.subscriptions, 5)
+        self.assertEqual(stats.transactions, 5)
+        self.assertEqual(stats.chunks, 3)
+        self.assertEqual(stats.amount, 50)
+        for subscription in subscriptions:
+            previous_billing_date = subscription.date_billing_next
+            subscription.refresh_from_db()
+            self.assertEqual(subscription.date_billing_last, self.now)
+            self.assertEqual(subscription.date_billing_next, self.cost.next_billing_datetime(previous_billing_date))
+            self.assertEqual(subscription.date_billing_end, subscription.date_billing_next + timedelta(days=3))
+            self.assertTrue(subscription.due)
+            transaction = subscription.transactions.get()
+            self.assertEqual(transaction.amount, self.cost.cost)
+            self.assertEqual(transaction.user, subscription.user)
+            self.assertFalse(transaction.paid)
+
+    def test_not_due_and_inactive_subscriptions_skipped(self):
+        self.create_subscriptions(2, days_ago=5)
+        self.create_subscriptions(2, days_ago=50, active=False)
+        stats = BillingEngine(now=self.now).run()
+        self.assertEqual(stats.subscriptions, 0)
+        self.assertFalse(SubscriptionTransaction.objects.exists())
+
+    def test_subscription_billed_once_per_run(self):
+        self.create_subscriptions(1, days_ago=100)
+        stats = BillingEngine(now=self.now).run()
+        self.assertEqual(stats.subscriptions, 1)
+        self.assertEqual(SubscriptionTransaction.objects.count(), 1)
+
+    def test_mark_paid(self):
+        subscription, = self.create_subscriptions(1)
+        BillingEngine(now=self.now, mark_paid=True).run()
+        subscription.refresh_from_db()
+        self.assertFalse(subscription.due)
+        self.assertTrue(subscription.transactions.get().paid)
+
+    def test_queries_per_chunk_constant(self):
+        self.create_subscriptions(6)
+        # savepoint, select, insert, update, release and the rollup: select, savepoint, insert, release
+        with self.assertNumQueries(9):
+            BillingEngine(chunk_size=10, now=self.now).run()
+
+    def test_due_scan_uses_index(self):
+        queryset = BillingEngine(now=self.now).get_queryset().order_by('date_billing_next', 'pk')
+        plan = queryset.explain()
+        self.assertIn('dfs_usub_active_next_id_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        user = User.objects.create_user('billing_index_user')
+        previous = user.subscriptions.filter(**flag('active', True)).order_by()
+        self.assertIn('dfs_usub_user_active_idx', previous.explain())
+
+    def test_command(self):
+        self.create_subscriptions(3)
+        out = StringIO()
+        call_command('bill_subscriptions', chunk_size=2, stdout=out)
+        self.assertIn('Billed 3 subscriptions', out.getvalue())
+        self.assertEqual(SubscriptionTransaction.objects.count(), 3)
@@ -0,0 +1,144 @@
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.test import APITestCase
+
+from subscriptions_api.catalog import bump_catalog_version, get_catalog_version
+from subscriptions_api.models import PlanCost, PlanList, PlanListDetail, PlanTag, SubscriptionPlan, MONTH
+from subscriptions_api.views import SubscriptionPlanViewSet
+
+pytestmark = pytest.mark.django_db
+
+
+@pytestmark
+class TestCatalogCache(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.plan = SubscriptionPlan.objects.create(plan_name='Catalog Plan')
+        PlanCost.objects.create(plan=self.plan, recurrence_unit=MONTH, cost=10)
+        self.url = reverse('subscriptions_api:subscription-plans-list')
+
+    def test_responses_served_from_cache(self):
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.json()[0]['plan_name'], 'Catalog Plan')
+        self.assertTrue(r['ETag'].startswith('"'))
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.content, r.content)
+        self.assertEqual(cached['ETag'], r['ETag'])
+        self.assertEqual(cached['Content-Type'], 'application/json')
+
+    def test_if_none_match(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            r = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(r['ETag'], etag)
+        self.assertFalse(r.content)
+        r = self.client.get(self.url, HTTP_IF_NONE_MATCH='W/{}'.format(etag))
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+        r = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+    def test_catalog_changes_bump_version(self):
+        etag = self.client.get(self.url)['ETag']
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.plan_name = 'Renamed Plan'
+            self.plan.save()
+            # Bumped once committed, a request before that can't cache the old rows under the new version
+            self.assertEqual(get_catalog_version(), version)
+        self.assertEqual(get_catalog_version(), version + 1)
+        r = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.json()[0]['plan_name'], 'Renamed Plan')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = PlanTag.objects.create(tag='New')
+            self.plan.tags.add(tag)
+        self.assertEqual(self.client.get(self.url).json()[0]['tags_str'], 'New')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            plan_list = PlanList.objects.create(title='Catalog')
+        plan_list_url = reverse('subscriptions_api:planlist-list')
+        self.assertEqual(self.client.get(plan_list_url).json()[0]['plan_list_details'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            PlanListDetail.objects.create(plan_list=plan_list, plan=self.plan)
+        self.assertEqual(len(self.client.get(plan_list_url).json()[0]['plan_list_details']), 1)
+
+    def test_query_string_in_key(self):
+        SubscriptionPlan.objects.create(plan_name='Second Plan')
+        SubscriptionPlan.objects.create(plan_name='Third Plan')
+        with patch.object(SubscriptionPlanViewSet, 'pagination_class', LimitOffsetPagination):
+            pages = [self.client.get(self.url, {'limit': 1, 'offset': offset}) for offset in range(3)]
+            self.assertEqual(len({page.content for page in pages}), 3)
+            self.assertEqual(len({page['ETag'] for page in pages}), 3)
+            with self.assertNumQueries(0):
+                cached = self.client.get(self.url, {'offset': 2, 'limit': 1})
+        self.assertEqual(cached.content, pages[2].content)
+        self.client.get(self.url)
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {'search': 'Second'})
+
+    def test_catalog_query_params(self):
+        with patch.object(SubscriptionPlanViewSet, 'catalog_query_params', ('page',)):
+            r = self.client.get(self.url)
+            with self.assertNumQueries(0):
+                cached = self.client.get(self.url, {'x': 'random', 'utm_source': 'ad'})
+            self.assertEqual(cached['ETag'], r['ETag'])
+            with self.assertNumQueries(3):
+                self.client.get(self.url, {'page': '2'})
+            with self.assertNumQueries(0):
+                self.client.get(self.url, {'page': '2', 'x': 'random'})
+
+    def test_unchanged_content_keeps_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_catalog_version()
+        r = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_gzip(self):
+        with patch.dict('subscriptions_api.app_settings.SETTINGS', {'catalog_gzip': True}):
+            plain = self.client.get(self.url)
+            r = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(r['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', r['Vary'])
+        self.assertNotEqual(r['ETag'], plain['ETag'])
+        self.assertEqual(gzip.decompress(r.content), plain.content)
+
+    def test_detail_and_errors(self):
+        detail_url = reverse('subscriptions_api:subscription-plans-detail', kwargs={'pk': self.plan.pk})
+        self.assertEqual(self.client.get(detail_url).json()['plan_name'], 'Catalog Plan')
+        missing_url = reverse('subscriptions_api:plan-costs-detail', kwargs={'pk': '00000000-0000-0000-0000-000000000000'})
+        self.assertEqual(self.client.get(missing_url).status_code, status.HTTP_404_NOT_FOUND)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(missing_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_uncached_formats(self):
+        with patch.object(SubscriptionPlanViewSet, 'catalog_cache_formats', ('api',)):
+            self.client.get(self.url)
+            r = self.client.get(self.url)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data[0]['plan_name'], 'Catalog Plan')
+        self.assertNotIn('ETag', r)
+
+    def test_writes_not_cached(self):
+        admin_user = User.objects.create_user('catalog_admin', is_staff=True)
+        self.client.force_authenticate(admin_user)
+        r = self.client.post(self.url, data={'plan_name': 'Posted Plan'})
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(plan['plan_name'] for plan in json.loads(self.client.get(self.url).content)),
+            ['Catalog Plan', 'Posted Plan'],
+        )
@@ -0,0 +1,207 @@
+import asyncio
+import json
+
+import pytest
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase
+
+from subscriptions_api.dispatcher import AsyncNotificationDispatcher
+from subscriptions_api.models import SubscriptionPlan, PlanCost, MONTH
+from subscriptions_api.notifications import register_notifier, unregister_notifier
+
+pytestmark = pytest.mark.django_db
+
+
+class WebhookServer:
+    """Local HTTP stand-in recording the webhooks it receives."""
+
+    def __init__(self, fail_for=()):
+        self.fail_for = fail_for
+        self.received = []
+
+    async def handle(self, reader, writer):
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        payload = json.loads(await reader.readexactly(length))
+        self.received.append((asyncio.get_running_loop().time(), payload))
+        status = b'500 Error' if payload['username'] in self.fail_for else b'200 OK'
+        writer.write(b'HTTP/1.1 ' + status + b'\r\nContent-Length: 0\r\n\r\n')
+        await writer.drain()
+        writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        WebhookNotification.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class WebhookNotification:
+    port = None
+
+    def __init__(self, subscription, notification, **kwargs):
+        self.payload = json.dumps({'username': subscription.user.username, 'notification': notification})
+
+    def get_destination(self):
+        return 'localhost:{}'.format(self.port)
+
+    async def asend(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        body = self.payload.encode()
+        writer.write(b'POST /hook HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body))
+        await writer.drain()
+        status = await reader.readline()
+        writer.close()
+        await writer.wait_closed()
+        if b' 200 ' not in status:
+            raise ConnectionError(status)
+
+
+class GatedNotifications:
+    """In process notifier whose sends wait until ``release`` is set, counts
+    the sends in flight and records when each one started."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.started = []
+        self.release = asyncio.Event()
+        self.changed = asyncio.Event()
+
+    def notifier(self):
+        gate = self
+
+        class GatedNotification:
+            def __init__(self, subscription, notification, **kwargs):
+                pass
+
+            async def asend(self):
+                gate.in_flight += 1
+                gate.max_in_flight = max(gate.max_in_flight, gate.in_flight)
+                gate.started.append(asyncio.get_running_loop().time())
+                gate.changed.set()
+                await gate.release.wait()
+                gate.in_flight -= 1
+
+        return GatedNotification
+
+    async def wait_in_flight(self, count):
+        # The timeout only turns a broken dispatcher into a failure instead of a hang
+        while self.in_flight < count:
+            self.changed.clear()
+            await asyncio.wait_for(self.changed.wait(), timeout=10)
+
+    async def settle(self):
+        """Lets every other task run until it blocks."""
+        for _ in range(20):
+            await asyncio.sleep(0)
+
+
+@pytestmark
+class TestAsyncNotifications(TestCase):
+
+    def setUp(self):
+        register_notifier('notify_overdue', WebhookNotification)
+        self.addCleanup(unregister_notifier, 'notify_overdue')
+        plan = SubscriptionPlan.objects.create(plan_name='Webhook Plan')
+        cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+        self.subscriptions = [
+            cost.setup_user_subscription(
+                User.objects.create_user('hook_{}'.format(i), 'hook_{}@example.com'.format(i)), active=True,
+            )
+            for i in range(12)
+        ]
+
+    def dispatch(self, server, dispatcher):
+        async def run():
+            await server.start()
+            try:
+                return await dispatcher.dispatch(self.subscriptions, 'notify_overdue')
+            finally:
+                await server.stop()
+        return asyncio.run(run())
+
+    def dispatch_gated(self, dispatcher, control):
+        """Dispatches to the gated notifier while ``control(gate)`` runs, the
+        sends are released once it returns."""
+        async def run():
+            gate = GatedNotifications()
+            register_notifier('notify_expired', gate.notifier())
+            dispatch = asyncio.ensure_future(dispatcher.dispatch(self.subscriptions, 'notify_expired'))
+            try:
+                await control(gate)
+            finally:
+                gate.release.set()
+            return gate, await dispatch
+        self.addCleanup(unregister_notifier, 'notify_expired')
+        return asyncio.run(run())
+
+    def test_concurrency_bounded(self):
+        async def control(gate):
+            await gate.wait_in_flight(3)
+            await gate.settle()
+            # The other sends wait for the semaphore
+            self.assertEqual(gate.in_flight, 3)
+            self.assertEqual(len(gate.started), 3)
+
+        gate, report = self.dispatch_gated(AsyncNotificationDispatcher(concurrency=3), control)
+        self.assertEqual(len(report.sent), 12)
+        self.assertEqual(len(gate.started), 12)
+        self.assertEqual(gate.max_in_flight, 3)
+        self.assertEqual(gate.in_flight, 0)
+
+    def test_destination_rate_limited(self):
+        rate, burst = 50, 2
+        starts = []
+
+        async def control(gate):
+            # Runs before the dispatch task, the bucket is created later
+            starts.append(asyncio.get_running_loop().time())
+            gate.release.set()
+
+        gate, report = self.dispatch_gated(AsyncNotificationDispatcher(rate=rate, burst=burst), control)
+        self.assertEqual(len(report.sent), 12)
+        # However late the sends run, the n-th is not sent before the bucket allows n sends
+        for count, started in enumerate(sorted(gate.started), 1):
+            self.assertLessEqual(count, burst + rate * (started - starts[0]) + 1e-6)
+
+    def test_failures_reported(self):
+        server = WebhookServer(fail_for=('hook_3',))
+        report = self.dispatch(server, AsyncNotificationDispatcher())
+        self.assertEqual(len(report.sent), 11)
+        self.assertEqual(report.failed[0][0], self.subscriptions[3])
+        self.assertIsInstance(report.failed[0][1], ConnectionError)
+
+    async def test_anotify_webhook(self):
+        server = WebhookServer()
+        await server.start()
+        try:
+            notify_obj = await self.subscriptions[0].anotify_overdue()
+        finally:
+            await server.stop()
+        self.assertIsInstance(notify_obj, WebhookNotification)
+        self.assertEqual(server.received[0][1], {'username': 'hook_0', 'notification': 'notify_overdue'})
+
+    async def test_anotify_email(self):
+        notify_obj = await self.subscriptions[0].anotify_processing()
+        self.assertEqual(notify_obj.notification, 'notify_processing')
+        self.assertEqual(mail.outbox[0].to, ['hook_0@example.com'])
+
+    async def test_anotify_async_handler(self):
+        calls = []
+
+        async def handler(subscription, notification, **kwargs):
+            calls.append((notification, kwargs))
+
+        register_notifier('notify_new', handler)
+        self.addCleanup(unregister_notifier, 'notify_new')
+        await self.subscriptions[0].anotify_new(amount=3)
+        self.assertEqual(calls, [('notify_new', {'amount': 3})])
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+import swapper
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from subscriptions_api.apps import SubscriptionsApiConfig
+from subscriptions_api.entitlements import get_entitlements, has_feature, get_feature, merge_features
+from subscriptions_api.models import SubscriptionPlan, PlanCost, MONTH
+
+pytestmark = pytest.mark.django_db
+
+UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+
+
+@pytestmark
+class TestEntitlements(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('entitled')
+        self.basic = SubscriptionPlan.objects.create(
+            plan_name='Basic', sequence=1,
+            features=json.dumps({'exports': False, 'seats': 3, 'support': 'email'}),
+        )
+        self.pro = SubscriptionPlan.objects.create(
+            plan_name='Pro', sequence=2,
+            features=json.dumps({'exports': True, 'seats': 1, 'support': 'phone'}),
+        )
+        self.basic_cost = PlanCost.objects.create(plan=self.basic, recurrence_unit=MONTH, cost=5)
+        self.pro_cost = PlanCost.objects.create(plan=self.pro, recurrence_unit=MONTH, cost=20)
+
+    def test_signal_receivers_connected(self):
+        # Connected by the app config Django picks by default (3.2+)
+        self.assertIsInstance(apps.get_app_config('subscriptions_api'), SubscriptionsApiConfig)
+
+    def test_merge_features(self):
+        merged = merge_features([{'a': False, 'b': 2, 'c': 'x'}, {'a': True, 'b': 1, 'c': 'y', 'd': 1.5}])
+        self.assertEqual(merged, {'a': True, 'b': 2, 'c': 'y', 'd': 1.5})
+
+    def test_active_subscriptions_merged(self):
+        self.basic_cost.setup_user_subscription(self.user, active=True)
+        self.pro_cost.setup_user_subscription(self.user, active=True)
+        self.assertEqual(get_entitlements(self.user), {'exports': True, 'seats': 3, 'support': 'phone'})
+        self.assertTrue(has_feature(self.user, 'exports'))
+        self.assertFalse(has_feature(self.user, 'missing'))
+        self.assertEqual(get_feature(self.user, 'missing', 0), 0)
+
+    def test_inactive_subscriptions_ignored(self):
+        self.pro_cost.setup_user_subscription(self.user, active=False)
+        self.assertEqual(get_entitlements(self.user), {})
+
+    def test_warm_checks_cost_no_queries(self):
+        self.pro_cost.setup_user_subscription(self.user, active=True)
+        has_feature(self.user, 'exports')
+        with self.assertNumQueries(0):
+            self.assertTrue(has_feature(self.user, 'exports'))
+            self.assertEqual(get_feature(self.user, 'seats'), 1)
+
+    def test_deactivate_invalidates(self):
+        subscription = self.pro_cost.setup_user_subscription(self.user, active=True)
+        self.assertTrue(has_feature(self.user, 'exports'))
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription.deactivate()
+            # Dropped once committed, an entry cached before that is dropped with it
+            self.assertTrue(has_feature(self.user, 'exports'))
+        self.assertFalse(has_feature(self.user, 'exports'))
+
+    def test_activate_invalidates(self):
+        subscription = self.pro_cost.setup_user_subscription(self.user, active=False)
+        self.assertFalse(has_feature(self.user, 'exports'))
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription.activate()
+        self.assertTrue(has_feature(self.user, 'exports'))
+
+    def test_delete_invalidates(self):
+        subscription = self.pro_cost.setup_user_subscription(self.user, active=True)
+        self.assertTrue(has_feature(self.user, 'exports'))
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription.delete()
+        self.assertFalse(has_feature(self.user, 'exports'))
+
+    def test_plan_change_invalidates(self):
+        self.pro_cost.setup_user_subscription(self.user, active=True)
+        self.assertEqual(get_feature(self.user, 'seats'), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pro.features = json.dumps({'seats': 10})
+            self.pro.save()
+        self.assertEqual(get_feature(self.user, 'seats'), 10)
+
+    def test_bulk_operations_invalidate(self):
+        self.pro_cost.setup_user_subscription(self.user, active=False)
+        self.assertFalse(has_feature(self.user, 'exports'))
+        with self.captureOnCommitCallbacks(execute=True):
+            UserSubscription.objects.filter(user=self.user).bulk_activate()
+        self.assertTrue(has_feature(self.user, 'exports'))
+        with self.captureOnCommitCallbacks(execute=True):
+            UserSubscription.objects.filter(user=self.user).bulk_deactivate()
+        self.assertFalse(has_feature(self.user, 'exports'))
+
+    def test_anonymous_user(self):
+        self.assertEqual(get_entitlements(None), {})
+        self.assertFalse(has_feature(User(), 'exports'))
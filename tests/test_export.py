@@ -0,0 +1,137 @@
+import csv
+import json
+import os
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+import pytest
+import swapper
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from subscriptions_api.export import export_fields, export_lines
+from subscriptions_api.models import PlanCost, SubscriptionPlan, MONTH
+
+pytestmark = pytest.mark.django_db
+
+UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+
+
+class ExportDataMixin:
+
+    def create_export_data(self):
+        plan = SubscriptionPlan.objects.create(plan_name='Export Plan')
+        self.cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost='12.50')
+        self.users = [User.objects.create_user('export_{}'.format(i)) for i in range(2)]
+        for i, user in enumerate(self.users):
+            subscription = self.cost.setup_user_subscription(user, subscription_date=datetime(2024, 1, 1 + i))
+            for day, paid in ((1, True), (2, False), (3, True)):
+                subscription.record_transaction(transaction_date=datetime(2024, 2 + i, day), paid=paid)
+
+
+@pytestmark
+class TestExportLines(ExportDataMixin, TestCase):
+
+    def setUp(self):
+        self.create_export_data()
+
+    def test_csv(self):
+        queryset = SubscriptionTransaction.objects.order_by('date_transaction', 'id')
+        rows = list(csv.reader(export_lines(queryset, 'csv', chunk_size=2)))
+        self.assertEqual(rows[0], export_fields(SubscriptionTransaction))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[1][rows[0].index('amount')], '12.50')
+        self.assertEqual(rows[1][rows[0].index('date_transaction')], '2024-02-01 00:00:00')
+
+    def test_ndjson(self):
+        queryset = UserSubscription.objects.select_related('plan_cost').prefetch_related('transactions')
+        with self.assertNumQueries(1):
+            rows = [json.loads(line) for line in export_lines(queryset, 'ndjson')]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['plan_cost_id'], str(self.cost.pk))
+        with self.assertRaises(ValueError):
+            export_lines(queryset, 'xml')
+
+
+@pytestmark
+class TestExportEndpoints(ExportDataMixin, APITestCase):
+
+    def setUp(self):
+        self.create_export_data()
+        self.admin_user = User.objects.create_user('export_admin', is_staff=True)
+        self.url = reverse('subscriptions_api:subscription-transactions-export')
+
+    def read(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_filtered(self):
+        self.client.force_authenticate(self.admin_user)
+        r = self.client.get(self.url, {'paid': 'false', 'start': '2024-02-01T00:00', 'end': '2024-03-01T00:00'})
+        self.assertEqual(r['Content-Type'], 'text/csv')
+        self.assertIn('transactions.csv', r['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(self.read(r))))
+        self.assertEqual([(row['date_transaction'], row['paid']) for row in rows], [('2024-02-02 00:00:00', 'False')])
+
+    def test_ndjson_export_of_own_rows(self):
+        self.client.force_authenticate(self.users[1])
+        r = self.client.get(self.url, {'export_format': 'ndjson'})
+        self.assertEqual(r['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(r).splitlines()]
+        self.assertEqual([row['user_id'] for row in rows], [self.users[1].pk] * 3)
+        self.assertEqual([row['date_transaction'][:10] for row in rows], ['2024-03-01', '2024-03-02', '2024-03-03'])
+
+    def test_subscription_export(self):
+        self.client.force_authenticate(self.admin_user)
+        r = self.client.get(reverse('subscriptions_api:user-subscriptions-export'), {'start': '2024-01-02T00:00'})
+        rows = list(csv.DictReader(StringIO(self.read(r))))
+        self.assertEqual([row['user_id'] for row in rows], [str(self.users[1].pk)])
+
+    def test_invalid_parameters(self):
+        self.client.force_authenticate(self.admin_user)
+        r = self.client.get(self.url, {'export_format': 'xml'})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        r = self.client.get(self.url, {'start': 'yesterday'})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('start', r.data)
+
+    def test_list_filtered(self):
+        self.client.force_authenticate(self.admin_user)
+        r = self.client.get(reverse('subscriptions_api:subscription-transactions-list'), {'paid': 'true'})
+        self.assertEqual(len(r.data['results']), 4)
+        r = self.client.get(reverse('subscriptions_api:subscription-transactions-list'))
+        self.assertEqual(len(r.data['results']), 6)
+
+
+@pytestmark
+class TestExportCommand(ExportDataMixin, TestCase):
+
+    def setUp(self):
+        self.create_export_data()
+
+    def test_stdout(self):
+        out = StringIO()
+        call_command('export_subscription_data', 'transactions', paid='true', export_format='ndjson', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(all(row['paid'] for row in rows))
+
+    def test_output_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'subscriptions.csv')
+        call_command('export_subscription_data', 'subscriptions', output=path, end=datetime(2024, 1, 2))
+        with open(path, newline='') as export:
+            rows = list(csv.DictReader(export))
+        self.assertEqual([row['user_id'] for row in rows], [str(self.users[0].pk)])
+
+    def test_paid_rejected_for_subscriptions(self):
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, '--paid only filters transactions'):
+            call_command('export_subscription_data', 'subscriptions', paid='true', stdout=out)
+        self.assertEqual(out.getvalue(), '')
@@ -0,0 +1,127 @@
+from datetime import datetime
+
+import pytest
+import swapper
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from subscriptions_api.filters import filter_subscriptions, filter_transactions
+from subscriptions_api.models import PlanCost, SubscriptionPlan, MONTH
+
+pytestmark = pytest.mark.django_db
+
+UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+
+
+class FilterDataMixin:
+
+    def create_filter_data(self):
+        self.pro = SubscriptionPlan.objects.create(plan_name='Pro', slug='pro')
+        self.basic = SubscriptionPlan.objects.create(plan_name='Basic', slug='basic')
+        self.pro_cost = PlanCost.objects.create(plan=self.pro, recurrence_unit=MONTH, cost='20.00')
+        self.basic_cost = PlanCost.objects.create(plan=self.basic, recurrence_unit=MONTH, cost='5.00')
+        self.users = [User.objects.create_user('filter_{}'.format(i)) for i in range(3)]
+        self.active_pro = UserSubscription.objects.create(
+            user=self.users[0], plan_cost=self.pro_cost, active=True, reference='ext-1',
+            date_billing_start=datetime(2024, 1, 1), date_billing_next=datetime(2024, 2, 1),
+        )
+        self.due_pro = UserSubscription.objects.create(
+            user=self.users[1], plan_cost=self.pro_cost, active=True, due=True,
+            date_billing_start=datetime(2024, 1, 15), date_billing_next=datetime(2024, 2, 15),
+        )
+        self.cancelled_basic = UserSubscription.objects.create(
+            user=self.users[2], plan_cost=self.basic_cost, active=False, cancelled=True,
+            date_billing_start=datetime(2024, 2, 1), date_billing_next=None,
+        )
+
+
+@pytestmark
+class TestFilterFunctions(FilterDataMixin, TestCase):
+
+    def setUp(self):
+        self.create_filter_data()
+
+    def assertFiltered(self, expected, **filters):
+        self.assertEqual(set(filter_subscriptions(UserSubscription.objects.all(), **filters)), set(expected))
+
+    def test_filter_subscriptions(self):
+        self.assertFiltered([self.active_pro, self.due_pro], active=True)
+        self.assertFiltered([self.cancelled_basic], active=False)
+        self.assertFiltered([self.due_pro], due=True)
+        self.assertFiltered([self.cancelled_basic], cancelled=True)
+        self.assertFiltered([self.active_pro, self.due_pro], plan='pro')
+        self.assertFiltered([self.cancelled_basic], plan_cost=self.basic_cost.pk)
+        self.assertFiltered([self.active_pro], reference='ext-1')
+        self.assertFiltered(
+            [self.due_pro], date_billing_next_after=datetime(2024, 2, 2), date_billing_next_before=datetime(2024, 3, 1),
+        )
+        self.assertFiltered([self.due_pro], active=True, plan='pro', date_billing_next_after=datetime(2024, 2, 2))
+        self.assertFiltered([self.active_pro, self.due_pro, self.cancelled_basic], active=None, plan=None)
+
+    def test_filter_transactions(self):
+        self.active_pro.record_transaction(transaction_date=datetime(2024, 2, 1), paid=True)
+        unpaid = self.due_pro.record_transaction(transaction_date=datetime(2024, 2, 15), paid=False)
+        queryset = filter_transactions(SubscriptionTransaction.objects.all(), paid=False, start=datetime(2024, 2, 1))
+        self.assertEqual(list(queryset), [unpaid])
+
+
+@pytestmark
+class TestFilterIndexes(TestCase):
+    """The filters search an index instead of scanning the table."""
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.order_by().explain()
+        self.assertIn(index, plan)
+        self.assertNotIn('SCAN', plan.replace('SCAN CONSTANT ROW', ''))
+
+    def subscriptions(self, **filters):
+        return filter_subscriptions(UserSubscription.objects.all(), **filters)
+
+    def test_subscription_filters(self):
+        table = UserSubscription._meta.db_table
+        self.assertUsesIndex(self.subscriptions(active=True), 'dfs_usub_active_next_id_idx')
+        self.assertUsesIndex(self.subscriptions(due=False), 'dfs_usub_due_next_idx')
+        self.assertUsesIndex(
+            self.subscriptions(cancelled=True, date_billing_next_before=datetime(2024, 1, 1)), 'dfs_usub_cancel_next_idx',
+        )
+        self.assertUsesIndex(self.subscriptions(reference='ext-1'), 'dfs_usub_reference_idx')
+        self.assertUsesIndex(self.subscriptions(date_billing_next_after=datetime(2024, 1, 1)), 'dfs_usub_next_idx')
+        self.assertUsesIndex(self.subscriptions(start=datetime(2024, 1, 1)), 'dfs_usub_start_id_idx')
+        self.assertUsesIndex(self.subscriptions(plan_cost=PlanCost().pk), '{}_plan_cost_id'.format(table))
+        self.assertUsesIndex(self.subscriptions(plan='pro'), 'USING INDEX')
+
+    def test_transaction_filters(self):
+        transactions = SubscriptionTransaction.objects.all()
+        self.assertUsesIndex(filter_transactions(transactions, paid=False), 'dfs_stx_paid_date_idx')
+        self.assertUsesIndex(filter_transactions(transactions, start=datetime(2024, 1, 1)), 'USING INDEX')
+
+
+@pytestmark
+class TestSubscriptionFilterEndpoint(FilterDataMixin, APITestCase):
+
+    def setUp(self):
+        self.create_filter_data()
+        self.admin_user = User.objects.create_user('filter_admin', is_staff=True)
+        self.client.force_authenticate(self.admin_user)
+        self.url = reverse('subscriptions_api:user-subscriptions-list')
+
+    def ids(self, params):
+        r = self.client.get(self.url, params)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        return {row['id'] for row in r.data['results']}
+
+    def test_filters(self):
+        self.assertEqual(self.ids({'active': 'true', 'plan': 'pro'}), {str(self.active_pro.pk), str(self.due_pro.pk)})
+        self.assertEqual(self.ids({'due': 'true'}), {str(self.due_pro.pk)})
+        self.assertEqual(self.ids({'cancelled': 'false', 'reference': 'ext-1'}), {str(self.active_pro.pk)})
+        self.assertEqual(self.ids({'plan_cost': str(self.basic_cost.pk)}), {str(self.cancelled_basic.pk)})
+        self.assertEqual(self.ids({'date_billing_next_before': '2024-02-10T00:00'}), {str(self.active_pro.pk)})
+
+    def test_invalid_filters(self):
+        r = self.client.get(self.url, {'active': 'maybe', 'plan_cost': 'nope'})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(r.data), {'active', 'plan_cost'})
@@ -0,0 +1,80 @@
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase
+
+from subscriptions_api.ledger import claim_notifications, notify_once
+from subscriptions_api.models import SubscriptionPlan, PlanCost, NotificationLedger, NotificationOutbox, MONTH
+from subscriptions_api.outbox import OutboxWorker
+
+pytestmark = pytest.mark.django_db
+
+
+@pytestmark
+class TestNotificationLedger(TestCase):
+
+    def setUp(self):
+        plan = SubscriptionPlan.objects.create(plan_name='Seats')
+        self.cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+        self.user = User.objects.create_user('seats_user', 'seats@example.com')
+        self.other_user = User.objects.create_user('other_user', 'other@example.com')
+        self.seats = [self.cost.setup_user_subscription(self.user, active=True) for _ in range(5)]
+        self.other = self.cost.setup_user_subscription(self.other_user, active=True)
+
+    def test_claimed_once_per_period(self):
+        subscriptions = self.seats + [self.other]
+        self.assertEqual(len(claim_notifications(subscriptions, 'notify_overdue', period_key='2024-05')), 6)
+        self.assertEqual(claim_notifications(subscriptions, 'notify_overdue', period_key='2024-05'), [])
+        self.assertEqual(len(claim_notifications(subscriptions, 'notify_expired', period_key='2024-05')), 6)
+        self.assertEqual(len(claim_notifications(subscriptions, 'notify_overdue', period_key='2024-06')), 6)
+        self.assertEqual(NotificationLedger.objects.count(), 18)
+
+    def test_per_user(self):
+        claimed = claim_notifications(self.seats + [self.other], 'notify_overdue', per_user=True)
+        self.assertEqual(claimed, [self.seats[0], self.other])
+
+    def test_claim_queries_constant(self):
+        with self.assertNumQueries(2):
+            claim_notifications(self.seats + [self.other], 'notify_overdue')
+
+    def test_notify_once(self):
+        notify_once(self.seats + [self.other], 'notify_overdue', per_user=True)
+        notify_once(self.seats + [self.other], 'notify_overdue', per_user=True)
+        self.assertEqual(sorted(msg.to[0] for msg in mail.outbox), ['other@example.com', 'seats@example.com'])
+
+
+@pytestmark
+class TestOutboxDigest(TestCase):
+
+    def setUp(self):
+        plan = SubscriptionPlan.objects.create(plan_name='Digest Plan')
+        cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+        self.user = User.objects.create_user('digest_user', 'digest@example.com')
+        self.other_user = User.objects.create_user('single_user', 'single@example.com')
+        with patch.dict('subscriptions_api.app_settings.SETTINGS', {'notify_outbox': True}):
+            for _ in range(3):
+                cost.setup_user_subscription(self.user, active=True).notify_overdue()
+            cost.setup_user_subscription(self.other_user, active=True).notify_overdue()
+
+    def test_digest_merges_notifications_of_a_user(self):
+        stats = OutboxWorker(digest=True).run()
+        self.assertEqual(stats.sent, 4)
+        self.assertEqual(len(mail.outbox), 2)
+        digest = next(msg for msg in mail.outbox if msg.to == ['digest@example.com'])
+        self.assertEqual(digest.subject, 'You have 3 subscription notifications')
+        self.assertEqual(digest.body.count('overdue: Digest Plan'), 3)
+        self.assertFalse(NotificationOutbox.objects.exclude(status=NotificationOutbox.SENT).exists())
+
+    def test_one_digest_per_user_across_batches(self):
+        # The 3 notifications of the user don't fit a batch of 2
+        stats = OutboxWorker(digest=True, batch_size=2).run()
+        self.assertEqual(stats.sent, 4)
+        self.assertEqual(sorted(msg.to[0] for msg in mail.outbox), ['digest@example.com', 'single@example.com'])
+        digest = next(msg for msg in mail.outbox if msg.to == ['digest@example.com'])
+        self.assertEqual(digest.subject, 'You have 3 subscription notifications')
+
+    def test_without_digest(self):
+        OutboxWorker().run()
+        self.assertEqual(len(mail.outbox), 4)
@@ -1,12 +1,28 @@
+import copy
 import json
+import pickle
 from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.contrib.auth.models import User, Group
 import pytest
 import swapper
-from subscriptions_api.models import SubscriptionPlan, PlanCost, DAY, MONTH, WEEK, YEAR, activate_default_user_subscription
+from subscriptions_api.notifications import (
+    EmailNotification, get_notifier, register_notifier, unregister_notifier, reset_notifiers,
+)
+from subscriptions_api.models import (
+    SubscriptionPlan, PlanCost, PlanTag, DAY, MONTH, WEEK, YEAR, activate_default_user_subscription,
+    provision_default_subscriptions, get_default_plan_cost,
+)
 
 pytestmark = pytest.mark.django_db
 
@@ -261,3 +277,434 @@ class TestSubscriptionModel(TestCase):
 
     def tearDown(self):
         self.user.delete()
+
+
+@pytestmark
+class TestUserSubscriptionBulkOperations(TestCase):
+
+    def setUp(self):
+        self.group = Group.objects.create(name='Bulk Plan')
+        plan = SubscriptionPlan.objects.create(plan_name='Bulk Plan', group=self.group, grace_period=2)
+        self.cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+        other_plan = SubscriptionPlan.objects.create(plan_name='Other Bulk Plan')
+        self.other_cost = PlanCost.objects.create(plan=other_plan, recurrence_unit=YEAR, cost=100)
+
+    def create_subscriptions(self, count, cost=None, active=False):
+        subscriptions = []
+        for i in range(count):
+            user = User.objects.create_user('bulk_user_{}'.format(User.objects.count()))
+            subscriptions.append((cost or self.cost).setup_user_subscription(user, active=active))
+        return subscriptions
+
+    def test_bulk_activate(self):
+        subscriptions = self.create_subscriptions(3) + self.create_subscriptions(2, cost=self.other_cost)
+        transaction = subscriptions[0].record_transaction()
+        date = timezone.now() - timedelta(days=3)
+        count = UserSubscription.objects.filter(active=False).bulk_activate(subscription_date=date)
+        self.assertEqual(count, 5)
+        for subscription in subscriptions:
+            subscription.refresh_from_db()
+            cost = subscription.plan_cost
+            self.assertTrue(subscription.active)
+            self.assertFalse(subscription.cancelled)
+            self.assertFalse(subscription.due)
+            self.assertEqual(subscription.date_billing_start, date)
+            self.assertEqual(subscription.date_billing_next, cost.next_billing_datetime(date))
+            self.assertEqual(subscription.date_billing_end,
+                             cost.next_billing_datetime(date) + timedelta(days=cost.plan.grace_period))
+        self.assertEqual(self.group.user_set.count(), 3)
+        transaction.refresh_from_db()
+        self.assertTrue(transaction.paid)
+
+    def test_bulk_activate_query_count_constant(self):
+        self.create_subscriptions(2)
+        with self.assertNumQueries(5):
+            UserSubscription.objects.filter(active=False).bulk_activate()
+        self.create_subscriptions(10)
+        with self.assertNumQueries(5):
+            UserSubscription.objects.filter(active=False).bulk_activate()
+
+    def test_bulk_activate_no_multiple_subscription(self):
+        old_subscriptions = self.create_subscriptions(2, active=True)
+        new_subscriptions = [
+            self.other_cost.setup_user_subscription(subscription.user, active=False)
+            for subscription in old_subscriptions
+        ]
+        UserSubscription.objects.filter(pk__in=[sub.pk for sub in new_subscriptions]).bulk_activate(
+            no_multiple_subscription=True
+        )
+        self.assertFalse(UserSubscription.objects.filter(plan_cost=self.cost, active=True).exists())
+        self.assertEqual(UserSubscription.objects.filter(plan_cost=self.other_cost, active=True).count(), 2)
+        self.assertFalse(self.group.user_set.exists())
+
+        UserSubscription.objects.filter(plan_cost=self.cost).bulk_activate(
+            no_multiple_subscription=True, del_multiple_subscription=True
+        )
+        self.assertFalse(UserSubscription.objects.filter(plan_cost=self.other_cost).exists())
+        self.assertEqual(self.group.user_set.count(), 2)
+
+    def test_bulk_deactivate(self):
+        subscriptions = self.create_subscriptions(3, active=True)
+        self.assertEqual(self.group.user_set.count(), 3)
+        with self.assertNumQueries(3):
+            count = UserSubscription.objects.filter(active=True).bulk_deactivate()
+        self.assertEqual(count, 3)
+        for subscription in subscriptions:
+            subscription.refresh_from_db()
+            self.assertFalse(subscription.active)
+            self.assertTrue(subscription.cancelled)
+            self.assertFalse(subscription.due)
+            self.assertIsNotNone(subscription.date_billing_last)
+        self.assertFalse(self.group.user_set.exists())
+
+    def test_bulk_deactivate_activate_default(self):
+        subscriptions = self.create_subscriptions(2, active=True)
+        with patch.dict('subscriptions_api.app_settings.SETTINGS', {'default_plan_cost_id': self.other_cost.pk}):
+            UserSubscription.objects.filter(plan_cost=self.cost).bulk_deactivate(activate_default=True)
+        for subscription in subscriptions:
+            self.assertTrue(subscription.user.subscriptions.filter(plan_cost=self.other_cost, active=True).exists())
+
+    def create_previous_subscriptions(self, user, count):
+        for _ in range(count):
+            self.cost.setup_user_subscription(user, active=True)
+        return self.other_cost.setup_user_subscription(user, active=False)
+
+    def test_deactivate_previous_subscriptions_query_budget(self):
+        user = User.objects.create_user('many_seats_user')
+        subscription = self.create_previous_subscriptions(user, 10)
+        self.assertTrue(self.group.user_set.filter(pk=user.pk).exists())
+        # group memberships, group removal, update
+        with self.assertNumQueries(3):
+            subscription.deactivate_previous_subscriptions()
+        self.assertEqual(user.subscriptions.filter(active=False, cancelled=True).count(), 10)
+        self.assertFalse(self.group.user_set.filter(pk=user.pk).exists())
+
+    def test_delete_previous_subscriptions_query_budget(self):
+        user = User.objects.create_user('many_seats_user')
+        subscription = self.create_previous_subscriptions(user, 10)
+        transaction = user.subscriptions.filter(plan_cost=self.cost).first().record_transaction()
+        # group memberships, group removal, select, delete outbox notifications, unlink transactions, delete
+        with self.assertNumQueries(6):
+            subscription.deactivate_previous_subscriptions(del_multiple_subscription=True)
+        self.assertEqual(list(user.subscriptions.all()), [subscription])
+        self.assertFalse(self.group.user_set.filter(pk=user.pk).exists())
+        transaction.refresh_from_db()
+        self.assertIsNone(transaction.subscription)
+
+    def test_activate_keeps_subscription_with_previous_deleted(self):
+        user = User.objects.create_user('single_plan_user')
+        subscription = self.create_previous_subscriptions(user, 2)
+        subscription.record_transaction()
+        subscription.activate(no_multiple_subscription=True, del_multiple_subscription=True)
+        self.assertEqual(list(user.subscriptions.all()), [subscription])
+        self.assertEqual(subscription.transactions.count(), 1)
+        self.assertTrue(subscription.active)
+
+
+@pytestmark
+class TestDirtyFields(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('dirty_user')
+        plan = SubscriptionPlan.objects.create(plan_name='Dirty Plan')
+        self.cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+
+    def test_dirty_fields_tracked(self):
+        subscription = self.cost.setup_user_subscription(self.user, active=True)
+        subscription = UserSubscription.objects.get(pk=subscription.pk)
+        self.assertEqual(subscription.get_dirty_fields(), {})
+        subscription.reference = 'ref-1'
+        self.assertEqual(subscription.get_dirty_fields(), {'reference': None})
+        subscription.save()
+        self.assertEqual(subscription.get_dirty_fields(), {})
+
+    def test_new_instance_all_dirty(self):
+        subscription = UserSubscription(user=self.user, plan_cost=self.cost)
+        self.assertIn('plan_cost', subscription.get_dirty_fields())
+
+    def test_lifecycle_saves_only_changed_fields(self):
+        subscription = self.cost.setup_user_subscription(self.user, active=True)
+        with CaptureQueriesContext(connection) as queries:
+            subscription.deactivate()
+        update, = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "subscriptions_api_usersubscription"')]
+        set_clause = update.split(' WHERE ')[0]
+        for column in ('"active"', '"cancelled"', '"date_billing_last"'):
+            self.assertIn(column, set_clause)
+        for column in ('"reference"', '"date_billing_start"', '"user_id"', '"due"'):
+            self.assertNotIn(column, set_clause)
+
+    def test_signal_receivers_see_dirty_fields(self):
+        subscription = self.cost.setup_user_subscription(self.user, active=True)
+        received = []
+
+        def receiver(sender, instance, **kwargs):
+            received.append((instance.get_dirty_fields(), kwargs['update_fields']))
+
+        post_save.connect(receiver, sender=UserSubscription)
+        try:
+            subscription.deactivate()
+        finally:
+            post_save.disconnect(receiver, sender=UserSubscription)
+        (dirty_fields, update_fields), = received
+        self.assertEqual(dirty_fields['active'], True)
+        self.assertEqual(set(dirty_fields), set(update_fields))
+        self.assertEqual(subscription.get_dirty_fields(), {})
+
+    def test_transaction_dirty_fields(self):
+        subscription = self.cost.setup_user_subscription(self.user, active=True)
+        transaction = SubscriptionTransaction.objects.get(pk=subscription.record_transaction().pk)
+        transaction.paid = True
+        self.assertEqual(transaction.get_dirty_fields(), {'paid': False})
+
+
+@pytestmark
+class TestSubscriptionPlanFeatures(TestCase):
+
+    def test_features_parsed_once(self):
+        plan = SubscriptionPlan.objects.create(plan_name='Cached Plan', features=json.dumps({'limit': 10}))
+        plan = SubscriptionPlan.objects.get(pk=plan.pk)
+        with patch('subscriptions_api.models.json.loads', wraps=json.loads) as loads:
+            for _ in range(5):
+                self.assertEqual(plan.limit, 10)
+                self.assertFalse(hasattr(plan, 'unknown_feature'))
+            self.assertEqual(plan.get_features(), {'limit': 10})
+        self.assertEqual(loads.call_count, 1)
+
+    def test_features_cache_invalidated_on_assignment(self):
+        plan = SubscriptionPlan(plan_name='Cached Plan', features=json.dumps({'limit': 10}))
+        self.assertEqual(plan.limit, 10)
+        plan.features = json.dumps({'limit': 20})
+        self.assertEqual(plan.limit, 20)
+        plan.features = None
+        self.assertFalse(hasattr(plan, 'limit'))
+
+    def test_features_cache_invalidated_on_reload(self):
+        plan = SubscriptionPlan.objects.create(plan_name='Cached Plan', features=json.dumps({'limit': 10}))
+        self.assertEqual(plan.limit, 10)
+        SubscriptionPlan.objects.filter(pk=plan.pk).update(features=json.dumps({'limit': 30}))
+        plan.refresh_from_db()
+        self.assertEqual(plan.limit, 30)
+
+    def test_get_features_returns_copy(self):
+        plan = SubscriptionPlan(plan_name='Cached Plan', features=json.dumps({'limit': 10}))
+        plan.get_features()['limit'] = 0
+        self.assertEqual(plan.limit, 10)
+
+    def test_native_json_features(self):
+        plan = SubscriptionPlan(plan_name='Native Plan', features={'exports': True})
+        self.assertTrue(plan.exports)
+
+    def test_plan_copy(self):
+        plan = SubscriptionPlan.objects.create(plan_name='Copied Plan', features=json.dumps({'limit': 10}))
+        self.assertEqual(copy.deepcopy(plan).limit, 10)
+        self.assertEqual(pickle.loads(pickle.dumps(plan)).limit, 10)
+
+    def test_check_plan_features_command(self):
+        SubscriptionPlan.objects.create(plan_name='Valid Plan', features=json.dumps({'limit': 10}))
+        call_command('check_plan_features', stdout=StringIO())
+        SubscriptionPlan.objects.create(plan_name='Invalid Plan', features='{limit: 10')
+        with self.assertRaises(CommandError):
+            call_command('check_plan_features', stdout=StringIO(), stderr=StringIO())
+
+
+@pytestmark
+class TestPlanTagSummary(TestCase):
+
+    def setUp(self):
+        tags = [PlanTag.objects.create(tag=name) for name in ('d', 'b', 'a', 'c')]
+        self.many = SubscriptionPlan.objects.create(plan_name='Many', sequence=1)
+        self.many.tags.set(tags)
+        self.few = SubscriptionPlan.objects.create(plan_name='Few', sequence=2)
+        self.few.tags.set(tags[:2])
+        SubscriptionPlan.objects.create(plan_name='None', sequence=3)
+
+    def display_tags(self, plans):
+        return [plan.display_tags() for plan in plans]
+
+    def test_display_tags(self):
+        plans = list(SubscriptionPlan.objects.all())
+        with self.assertNumQueries(3):
+            self.assertEqual(self.display_tags(plans), ['a, b, c, ...', 'b, d', ''])
+
+    def test_prefetched_tags(self):
+        plans = list(SubscriptionPlan.objects.prefetch_related('tags'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.display_tags(plans), ['a, b, c, ...', 'b, d', ''])
+
+    def test_tag_summary_annotation(self):
+        with self.assertNumQueries(1):
+            plans = list(SubscriptionPlan.objects.with_tag_summary())
+            self.assertEqual(self.display_tags(plans), ['a, b, c, ...', 'b, d', ''])
+        self.assertEqual([plan.tag_count for plan in plans], [4, 2, 0])
+
+
+@pytestmark
+class TestDefaultPlanProvisioning(TestCase):
+
+    def setUp(self):
+        self.group = Group.objects.create(name='Free')
+        plan = SubscriptionPlan.objects.create(plan_name='Free', group=self.group)
+        self.default_cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=0)
+        paid_plan = SubscriptionPlan.objects.create(plan_name='Paid')
+        self.paid_cost = PlanCost.objects.create(plan=paid_plan, recurrence_unit=MONTH, cost=10)
+        self.settings_patch = patch.dict(
+            'subscriptions_api.app_settings.SETTINGS', {'default_plan_cost_id': self.default_cost.pk}
+        )
+        self.settings_patch.start()
+        self.addCleanup(self.settings_patch.stop)
+
+    def bulk_create_users(self, count):
+        User.objects.bulk_create([User(username='imported_{}'.format(i)) for i in range(count)])
+        return list(User.objects.filter(username__startswith='imported_'))
+
+    def test_default_plan_cost_cached(self):
+        get_default_plan_cost()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_default_plan_cost(), self.default_cost)
+        self.default_cost.cost = 1
+        self.default_cost.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_default_plan_cost().cost, 1)
+
+    def test_bulk_created_users_provisioned(self):
+        users = self.bulk_create_users(5)
+        self.assertEqual(provision_default_subscriptions(users), 5)
+        for user in users:
+            subscription = user.subscriptions.get()
+            self.assertEqual(subscription.plan_cost, self.default_cost)
+            self.assertTrue(subscription.active)
+            self.assertIsNotNone(subscription.date_billing_next)
+        self.assertEqual(self.group.user_set.count(), 5)
+
+    def test_existing_subscriptions_reused_and_others_deactivated(self):
+        user, other_user = self.bulk_create_users(2)
+        reused = self.default_cost.setup_user_subscription(user, active=False)
+        paid = self.paid_cost.setup_user_subscription(other_user, active=True)
+        provision_default_subscriptions([user.pk, other_user.pk])
+        reused.refresh_from_db()
+        paid.refresh_from_db()
+        self.assertTrue(reused.active)
+        self.assertEqual(user.subscriptions.count(), 1)
+        self.assertFalse(paid.active)
+        self.assertTrue(other_user.subscriptions.get(plan_cost=self.default_cost).active)
+
+    def test_one_default_subscription_activated(self):
+        user, = self.bulk_create_users(1)
+        reused = self.default_cost.setup_user_subscription(user, active=False)
+        UserSubscription.objects.filter(pk=reused.pk).update(date_billing_start=timezone.now() - timedelta(days=10))
+        duplicate = self.default_cost.setup_user_subscription(user, active=True)
+        self.assertEqual(provision_default_subscriptions([user]), 1)
+        reused.refresh_from_db()
+        duplicate.refresh_from_db()
+        self.assertTrue(reused.active)
+        self.assertFalse(duplicate.active)
+        self.assertEqual(user.subscriptions.filter(active=True).get(), reused)
+
+    def test_queries_per_batch_constant(self):
+        get_default_plan_cost()
+        small = self.bulk_create_users(3)
+        with CaptureQueriesContext(connection) as small_queries:
+            provision_default_subscriptions(small)
+        User.objects.all().delete()
+        large = self.bulk_create_users(30)
+        with CaptureQueriesContext(connection) as large_queries:
+            provision_default_subscriptions(large)
+        self.assertEqual(len(small_queries), len(large_queries))
+
+    def test_command(self):
+        users = self.bulk_create_users(3)
+        self.paid_cost.setup_user_subscription(users[0], active=True)
+        out = StringIO()
+        call_command('provision_default_subscriptions', stdout=out)
+        self.assertIn('Provisioned 2 users', out.getvalue())
+        self.assertFalse(users[0].subscriptions.filter(plan_cost=self.default_cost).exists())
+
+
+class RecordingNotification:
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, subscription, notification, **kwargs):
+        self.calls.append((subscription, notification, kwargs))
+
+
+@pytestmark
+class TestNotifierResolution(TestCase):
+
+    def setUp(self):
+        reset_notifiers()
+        self.user = User.objects.create_user('notified_user', 'notified@example.com')
+        plan = SubscriptionPlan.objects.create(plan_name='Notified Plan')
+        cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+        self.subscription = cost.setup_user_subscription(self.user, active=True)
+
+    def test_notifier_resolved_once(self):
+        self.subscription.notify_processing()
+        with patch('importlib.import_module') as import_module:
+            self.subscription.notify_processing()
+        import_module.assert_not_called()
+        self.assertIs(get_notifier('notify_processing'), EmailNotification)
+
+    def test_registered_callable(self):
+        recorder = RecordingNotification()
+        register_notifier('notify_new', recorder)
+        self.addCleanup(unregister_notifier, 'notify_new')
+        self.subscription.notify_new(amount=10)
+        self.assertEqual(recorder.calls, [(self.subscription, 'notify_new', {'amount': 10})])
+
+    def test_registered_none_disables_notification(self):
+        register_notifier('notify_expired', None)
+        self.addCleanup(unregister_notifier, 'notify_expired')
+        self.assertIsNone(self.subscription.notify_expired())
+
+    def test_reset_on_setting_changed(self):
+        self.assertIs(get_notifier('notify_overdue'), EmailNotification)
+        with override_settings(DFS_NOTIFY_OVERDUE='tests.test_models.RecordingNotification'):
+            self.assertIs(get_notifier('notify_overdue'), RecordingNotification)
+        self.assertIs(get_notifier('notify_overdue'), EmailNotification)
+
+
+@pytestmark
+class TestBalanceAnnotations(TestCase):
+
+    def setUp(self):
+        plan = SubscriptionPlan.objects.create(plan_name='Balance Plan')
+        self.now = timezone.now()
+        start = self.now - timedelta(days=3, hours=5)
+        costs = [
+            (MONTH, 1, '100.00'), (YEAR, 2, '999.99'), (WEEK, 2, '7.50'), (DAY, 2, '3.00'), (DAY, 10, '3.00'),
+        ]
+        self.subscriptions = []
+        for i, (unit, period, amount) in enumerate(costs):
+            cost = PlanCost.objects.create(plan=plan, recurrence_unit=unit, recurrence_period=period, cost=amount)
+            user = User.objects.create_user('balance_{}'.format(i))
+            self.subscriptions.append(cost.setup_user_subscription(user, subscription_date=start))
+
+    def test_matches_properties(self):
+        with patch('django.utils.timezone.now', return_value=self.now):
+            expected = {
+                subscription.pk: (subscription.unused_daily_balance, subscription.used_daily_balance)
+                for subscription in self.subscriptions
+            }
+        with self.assertNumQueries(1):
+            annotated = list(UserSubscription.objects.with_unused_balance(self.now).with_used_balance(self.now))
+        self.assertEqual(len(annotated), 5)
+        for subscription in annotated:
+            unused, used = expected[subscription.pk]
+            self.assertAlmostEqual(subscription.unused_balance, Decimal(str(unused)), places=2)
+            self.assertAlmostEqual(subscription.used_balance, Decimal(str(used)), places=2)
+
+    def test_sum_filter_and_order_in_database(self):
+        queryset = UserSubscription.objects.with_unused_balance(self.now)
+        total = queryset.aggregate(total=Sum('unused_balance'))['total']
+        self.assertAlmostEqual(total, sum(subscription.unused_balance for subscription in queryset), places=2)
+        largest = queryset.filter(unused_balance__gt=0).order_by('-unused_balance').first()
+        self.assertEqual(largest.plan_cost.recurrence_unit, YEAR)
+
+    def test_one_time_costs_have_no_balance(self):
+        cost = PlanCost.objects.create(plan=SubscriptionPlan.objects.create(plan_name='Hourly'), recurrence_unit='3', cost=5)
+        subscription = cost.setup_user_subscription(User.objects.create_user('hourly'), subscription_date=self.now)
+        annotated = UserSubscription.objects.with_unused_balance(self.now).with_used_balance(self.now).get(pk=subscription.pk)
+        self.assertEqual(annotated.unused_balance, 0)
+        self.assertEqual(annotated.used_balance, 0)
@@ -0,0 +1,60 @@
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase
+
+from subscriptions_api.models import SubscriptionPlan, PlanCost, MONTH
+from subscriptions_api.notifications import EmailNotification
+
+pytestmark = pytest.mark.django_db
+
+
+class OverdueEmail(EmailNotification):
+
+    def get_subject(self):
+        return 'Overdue'
+
+    def get_html_content(self):
+        return '<p>{}</p>'.format(self.kwargs['amount'])
+
+    def get_to_email(self):
+        if self.subscription.user.username == 'broken':
+            raise ValueError('no address')
+        return super().get_to_email()
+
+
+@pytestmark
+class TestEmailNotificationSendMany(TestCase):
+
+    def setUp(self):
+        plan = SubscriptionPlan.objects.create(plan_name='Mail Plan')
+        cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+        self.subscriptions = [
+            cost.setup_user_subscription(User.objects.create_user(name, '{}@example.com'.format(name)), active=True)
+            for name in ('first', 'broken', 'last')
+        ]
+
+    def test_message_built_lazily(self):
+        with patch.object(OverdueEmail, 'get_subject') as get_subject:
+            notify_obj = OverdueEmail(self.subscriptions[0], 'notify_overdue', amount=1)
+            get_subject.assert_not_called()
+            self.assertIsNotNone(notify_obj.msg)
+            get_subject.assert_called_once()
+
+    def test_send_many_shares_connection_and_reports_failures(self):
+        with patch('django.core.mail.backends.locmem.EmailBackend.open') as open_connection:
+            report = OverdueEmail.send_many(self.subscriptions, 'notify_overdue', amount=5)
+        open_connection.assert_called_once()
+        self.assertEqual(len(report.sent), 2)
+        self.assertEqual(report.failed[0][0], self.subscriptions[1])
+        self.assertIsInstance(report.failed[0][1], ValueError)
+        self.assertEqual([msg.to for msg in mail.outbox], [['first@example.com'], ['last@example.com']])
+        self.assertEqual(mail.outbox[0].alternatives, [('<p>5</p>', 'text/html')])
+        self.assertEqual(str(report), 'Sent 2 notifications, 1 failed')
+
+    def test_no_alternatives_or_attachments_without_hooks(self):
+        EmailNotification.send_many(self.subscriptions[:1], 'notify_processing')
+        self.assertEqual(mail.outbox[0].alternatives, [])
+        self.assertEqual(mail.outbox[0].attachments, [])
@@ -0,0 +1,134 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from subscriptions_api.models import SubscriptionPlan, PlanCost, NotificationOutbox, MONTH
+from subscriptions_api.notifications import EmailNotification, register_notifier, unregister_notifier
+from subscriptions_api.outbox import OutboxWorker
+
+pytestmark = pytest.mark.django_db
+
+
+class OverdueEmail(EmailNotification):
+
+    def get_subject(self):
+        return 'Overdue {}'.format(self.kwargs.get('amount'))
+
+
+def failing_notifier(subscription, notification, **kwargs):
+    raise ConnectionError('smtp down')
+
+
+@pytestmark
+class TestNotificationOutbox(TestCase):
+
+    def setUp(self):
+        register_notifier('notify_overdue', OverdueEmail)
+        self.addCleanup(unregister_notifier, 'notify_overdue')
+        plan = SubscriptionPlan.objects.create(plan_name='Outbox Plan')
+        self.cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+        self.subscriptions = [
+            self.cost.setup_user_subscription(
+                User.objects.create_user('outbox_{}'.format(i), 'outbox_{}@example.com'.format(i)), active=True,
+            )
+            for i in range(5)
+        ]
+
+    def test_notify_writes_outbox_when_enabled(self):
+        subscription = self.subscriptions[0]
+        with patch.dict('subscriptions_api.app_settings.SETTINGS', {'notify_outbox': True}):
+            queued = subscription.notify_overdue(amount=10)
+        self.assertIsInstance(queued, NotificationOutbox)
+        self.assertEqual(queued.kwargs, {'amount': 10})
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_outbox_rolled_back_with_transaction(self):
+        subscription = self.subscriptions[0]
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            subscription.enqueue_notification('notify_overdue')
+            raise RuntimeError
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_worker_sends_batches_over_one_connection(self):
+        for subscription in self.subscriptions:
+            subscription.enqueue_notification('notify_overdue', amount=10)
+        with patch('django.core.mail.backends.locmem.EmailBackend.open') as open_connection, \
+                patch.object(locmem.EmailBackend, 'send_messages', autospec=True,
+                             side_effect=locmem.EmailBackend.send_messages) as send_messages:
+            stats = OutboxWorker(batch_size=2).run()
+        open_connection.assert_called_once()
+        self.assertEqual(send_messages.call_count, 3)
+        self.assertEqual(stats.sent, 5)
+        self.assertEqual(stats.batches, 3)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].subject, 'Overdue 10')
+        self.assertFalse(NotificationOutbox.objects.exclude(status=NotificationOutbox.SENT).exists())
+        self.assertEqual(OutboxWorker().run().sent, 0)
+
+    def test_failed_notifications_retried_with_backoff(self):
+        register_notifier('notify_expired', failing_notifier)
+        self.addCleanup(unregister_notifier, 'notify_expired')
+        queued = self.subscriptions[0].enqueue_notification('notify_expired')
+        worker = OutboxWorker(max_attempts=2, retry_backoff=60)
+        stats = worker.run()
+        self.assertEqual(stats.failed, 1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, NotificationOutbox.PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('smtp down', queued.last_error)
+        self.assertGreater(queued.date_available, timezone.now() + timedelta(seconds=50))
+        # Not retried before the backoff
+        self.assertEqual(worker.run().failed, 0)
+        NotificationOutbox.objects.update(date_available=timezone.now())
+        worker.run()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, NotificationOutbox.FAILED)
+        self.assertEqual(queued.attempts, 2)
+
+    def test_failed_message_of_batch(self):
+        for subscription in self.subscriptions:
+            subscription.enqueue_notification('notify_overdue', amount=10)
+        failing_email = self.subscriptions[2].user.email
+
+        def send_messages(backend, messages):
+            count = 0
+            for message in messages:
+                if failing_email in message.to:
+                    raise ConnectionError('recipient refused')
+                mail.outbox.append(message)
+                count += 1
+            return count
+
+        with patch.object(locmem.EmailBackend, 'send_messages', autospec=True, side_effect=send_messages) as send:
+            stats = OutboxWorker().run()
+        # The messages after the failed one are sent with a second call
+        self.assertEqual(send.call_count, 2)
+        self.assertEqual(stats.sent, 4)
+        self.assertEqual(stats.failed, 1)
+        self.assertEqual(len(mail.outbox), 4)
+        failed = NotificationOutbox.objects.get(status=NotificationOutbox.PENDING)
+        self.assertEqual(failed.subscription, self.subscriptions[2])
+        self.assertIn('recipient refused', failed.last_error)
+        self.assertEqual(NotificationOutbox.objects.filter(status=NotificationOutbox.SENT).count(), 4)
+
+    def test_expired_claims_reclaimed(self):
+        queued = self.subscriptions[0].enqueue_notification('notify_overdue')
+        NotificationOutbox.objects.filter(pk=queued.pk).update(
+            status=NotificationOutbox.SENDING, date_available=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(OutboxWorker().run().sent, 1)
+
+    def test_command(self):
+        self.subscriptions[0].enqueue_notification('notify_overdue')
+        out = StringIO()
+        call_command('send_outbox', stdout=out)
+        self.assertIn('Sent 1 notifications', out.getvalue())
@@ -0,0 +1,142 @@
+from base64 import b64encode
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from unittest.mock import patch
+
+import pytest
+import swapper
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from subscriptions_api.models import PlanCost, SubscriptionPlan, MONTH
+from subscriptions_api.pagination import SubscriptionCursorPagination, TransactionCursorPagination, estimate_count
+
+pytestmark = pytest.mark.django_db
+
+UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+
+
+@pytestmark
+class TestCursorPagination(APITestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user('pagination_admin', is_staff=True)
+        self.user = User.objects.create_user('pagination_user')
+        plan = SubscriptionPlan.objects.create(plan_name='Paged Plan')
+        self.cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+        start = datetime(2024, 1, 1)
+        for i in range(5):
+            subscription = self.cost.setup_user_subscription(self.user, subscription_date=start + timedelta(days=i))
+            for hours in (0, 0, 1):
+                # Transactions sharing a date are ordered by id
+                subscription.record_transaction(transaction_date=start + timedelta(days=i, hours=hours))
+
+    def walk_back(self, data):
+        ids = []
+        while data['previous']:
+            r = self.client.get(data['previous'])
+            self.assertEqual(r.status_code, status.HTTP_200_OK)
+            data = r.data
+            ids[:0] = [row['id'] for row in data['results']]
+        return ids
+
+    def fetch_all(self, url, **params):
+        ids, pages = [], 0
+        r = self.client.get(url, params)
+        while True:
+            self.assertEqual(r.status_code, status.HTTP_200_OK)
+            pages += 1
+            ids.extend(row['id'] for row in r.data['results'])
+            if not r.data['next']:
+                return ids, pages, r.data
+            r = self.client.get(r.data['next'])
+
+    def test_transactions_paginated(self):
+        self.client.force_authenticate(self.admin_user)
+        ids, pages, last_page = self.fetch_all(reverse('subscriptions_api:subscription-transactions-list'), page_size=4)
+        expected = [
+            str(pk) for pk in SubscriptionTransaction.objects.order_by('-date_transaction', '-id').values_list('pk', flat=True)
+        ]
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 4)
+        self.assertNotIn('count', last_page)
+
+    def test_subscriptions_paginated(self):
+        self.client.force_authenticate(self.user)
+        ids, pages, last_page = self.fetch_all(reverse('subscriptions_api:user-subscriptions-list'), page_size=2)
+        expected = [
+            str(pk) for pk in UserSubscription.objects.order_by('-date_billing_start', '-id').values_list('pk', flat=True)
+        ]
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_unstarted_subscriptions_paginated(self):
+        other_user = User.objects.create_user('pagination_other')
+        self.cost.setup_user_subscription(other_user, subscription_date=datetime(2024, 3, 1))
+        for _ in range(3):
+            # Left without a billing start date
+            self.cost.setup_user_subscription(other_user, active=False)
+        self.client.force_authenticate(other_user)
+        ids, pages, last_page = self.fetch_all(reverse('subscriptions_api:user-subscriptions-list'), page_size=1)
+        expected = [
+            str(pk) for pk in UserSubscription.objects.filter(user=other_user).order_by(
+                F('date_billing_start').desc(nulls_first=True), '-id',
+            ).values_list('pk', flat=True)
+        ]
+        self.assertEqual(len(expected), 4)
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 4)
+        self.assertEqual(self.walk_back(last_page), ids[:-1])
+
+    def test_previous_pages_with_shared_dates(self):
+        self.client.force_authenticate(self.admin_user)
+        ids, pages, last_page = self.fetch_all(reverse('subscriptions_api:subscription-transactions-list'), page_size=2)
+        self.assertEqual(len(set(ids)), 15)
+        # The last page holds one transaction, the previous links go back over the rest
+        self.assertEqual(self.walk_back(last_page), ids[:-1])
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(self.admin_user)
+        url = reverse('subscriptions_api:subscription-transactions-list')
+        for position in ('not json', '["2024-01-01T00:00:00", "not-a-uuid"]'):
+            cursor = b64encode(urlencode({'p': position}).encode()).decode()
+            r = self.client.get(url, {'cursor': cursor})
+            self.assertEqual(r.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_queries_constant(self):
+        self.client.force_authenticate(self.admin_user)
+        url = reverse('subscriptions_api:subscription-transactions-list')
+        with self.assertNumQueries(1):
+            r = self.client.get(url, {'page_size': 2})
+        with self.assertNumQueries(1):
+            self.client.get(r.data['next'])
+
+    def test_count_modes(self):
+        self.client.force_authenticate(self.admin_user)
+        url = reverse('subscriptions_api:subscription-transactions-list')
+        for mode in ('exact', 'estimated'):
+            with patch.dict('subscriptions_api.app_settings.SETTINGS', {'pagination_count': mode}):
+                with self.assertNumQueries(2):
+                    r = self.client.get(url, {'page_size': 2})
+            # sqlite has no planner estimate and counts exactly
+            self.assertEqual(r.data['count'], 15)
+            self.assertEqual(len(r.data['results']), 2)
+
+    def test_estimate_count_fallback(self):
+        queryset = SubscriptionTransaction.objects.filter(date_transaction__gte=datetime(2024, 1, 4))
+        self.assertEqual(estimate_count(queryset), 6)
+
+    def test_keyset_uses_index(self):
+        position = (datetime(2024, 1, 3), SubscriptionTransaction._meta.pk.default())
+        for pagination, model, index in (
+            (TransactionCursorPagination(), SubscriptionTransaction, 'dfs_stx_date_id_idx'),
+            (SubscriptionCursorPagination(), UserSubscription, 'dfs_usub_start_id_idx'),
+        ):
+            queryset = model.objects.order_by(*pagination.get_order_by(False)).filter(
+                pagination.keyset_filter(model, *position, reverse=False),
+            )
+            self.assertIn('SEARCH {} USING INDEX {}'.format(model._meta.db_table, index), queryset[:3].explain())
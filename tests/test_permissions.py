@@ -0,0 +1,115 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import User, AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from subscriptions_api.app_settings import SETTINGS
+from subscriptions_api.models import SubscriptionPlan, PlanCost, MONTH
+from subscriptions_api.permissions import HasPlanFeature
+from subscriptions_api.throttling import LocalBucketStore, PlanFeatureRateThrottle, TokenBucket, get_bucket_store
+
+pytestmark = pytest.mark.django_db
+
+
+class FakeTimerThrottle(PlanFeatureRateThrottle):
+    now = 1000.0
+
+    def timer(self):
+        return FakeTimerThrottle.now
+
+
+class ExportView(APIView):
+    permission_classes = (HasPlanFeature,)
+    throttle_classes = (FakeTimerThrottle,)
+    required_plan_features = ('exports',)
+
+    def get(self, request):
+        return Response({'ok': True})
+
+
+class TestTokenBucket(TestCase):
+
+    def test_consume_and_refill(self):
+        bucket = TokenBucket(2, 1)
+        self.assertTrue(bucket.consume(0))
+        self.assertTrue(bucket.consume(0))
+        self.assertFalse(bucket.consume(0))
+        self.assertEqual(bucket.wait_time(), 1)
+        self.assertTrue(bucket.consume(1))
+        self.assertFalse(bucket.consume(1))
+        # Never refilled past its capacity
+        bucket.refill(100)
+        self.assertEqual(bucket.tokens, 2)
+
+    def test_local_store_drops_full_buckets(self):
+        store = LocalBucketStore(max_buckets=3)
+        self.assertEqual(store.consume('a', 2, 1, 0), (True, 0))
+        store.consume('b', 2, 1, 0)
+        store.consume('b', 2, 1, 0)
+        self.assertEqual(list(store.buckets), ['a', 'b'])
+        # 'a' is full again after a second, 'b' after two
+        store.consume('c', 2, 1, 1)
+        self.assertEqual(list(store.buckets), ['b', 'c'])
+        self.assertEqual(store.consume('b', 2, 1, 1.5), (True, 0.5))
+        self.assertEqual(store.consume('b', 2, 1, 1.5), (False, 0.5))
+        for key in 'defg':
+            store.consume(key, 2, 1, 1.5)
+        # Capped, least recently used first
+        self.assertEqual(list(store.buckets), ['e', 'f', 'g'])
+
+
+@pytestmark
+class TestPlanFeaturePermissionsAndThrottles(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_bucket_store().clear()
+        FakeTimerThrottle.now = 1000.0
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user('feature_user')
+        plan = SubscriptionPlan.objects.create(
+            plan_name='Exports', features=json.dumps({'exports': True, 'api_calls_per_minute': 2}),
+        )
+        self.cost = PlanCost.objects.create(plan=plan, recurrence_unit=MONTH, cost=10)
+
+    def get(self, user):
+        request = self.factory.get('/export/')
+        force_authenticate(request, user)
+        return ExportView.as_view()(request)
+
+    def test_feature_required(self):
+        self.assertEqual(self.get(self.user).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.get(AnonymousUser()).status_code, status.HTTP_403_FORBIDDEN)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cost.setup_user_subscription(self.user, active=True)
+        self.assertEqual(self.get(self.user).status_code, status.HTTP_200_OK)
+
+    def test_requests_throttled_to_plan_limit(self):
+        self.cost.setup_user_subscription(self.user, active=True)
+        self.assertEqual(self.get(self.user).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get(self.user).status_code, status.HTTP_200_OK)
+        response = self.get(self.user)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        FakeTimerThrottle.now += 30
+        self.assertEqual(self.get(self.user).status_code, status.HTTP_200_OK)
+
+    def test_warm_checks_cost_no_queries(self):
+        self.cost.setup_user_subscription(self.user, active=True)
+        self.get(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(self.user).status_code, status.HTTP_200_OK)
+
+    def test_cache_bucket_store(self):
+        self.cost.setup_user_subscription(self.user, active=True)
+        with patch.dict(SETTINGS, throttle_cache='default'):
+            self.assertEqual(self.get(self.user).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.get(self.user).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.get(self.user).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
@@ -0,0 +1,76 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+import swapper
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from subscriptions_api.models import SubscriptionPlan, PlanCost, ONCE, SECOND, MINUTE, HOUR, DAY, WEEK, MONTH, YEAR
+from subscriptions_api.proration import prorate, UNIT_DAYS
+
+pytestmark = pytest.mark.django_db
+
+UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+
+
+@pytestmark
+class TestProration(TestCase):
+
+    def setUp(self):
+        self.plan = SubscriptionPlan.objects.create(plan_name='Prorated Plan')
+
+    def create_cost(self, unit, cost='30.00', period=1):
+        return PlanCost.objects.create(plan=self.plan, recurrence_unit=unit, cost=cost, recurrence_period=period)
+
+    def test_daily_rate_covers_all_units(self):
+        self.assertEqual(self.create_cost(DAY, '3.00', period=2).daily_rate, Decimal('1.5'))
+        self.assertEqual(self.create_cost(WEEK, '7.00').daily_rate, Decimal('1'))
+        self.assertEqual(self.create_cost(HOUR, '0.50').daily_rate, Decimal('12'))
+        self.assertEqual(self.create_cost(MINUTE, '0.01').daily_rate, Decimal('14.4'))
+        self.assertEqual(self.create_cost(SECOND, '0.01', period=10).daily_rate, Decimal('86.4'))
+        self.assertEqual(self.create_cost(YEAR, '365.2425').daily_rate, Decimal('1'))
+        self.assertAlmostEqual(self.create_cost(MONTH, '29.99').daily_rate, Decimal('29.99') / Decimal('30.4368'))
+        self.assertIsNone(self.create_cost(ONCE).daily_rate)
+        self.assertEqual(UNIT_DAYS[MONTH], Decimal('30.4368'))
+
+    def test_daily_rate_follows_saved_changes(self):
+        cost = self.create_cost(DAY, '10.00')
+        self.assertEqual(cost.daily_rate, Decimal('10'))
+        cost.cost = Decimal('20.00')
+        cost.save()
+        self.assertEqual(PlanCost.objects.get(pk=cost.pk).daily_rate, Decimal('20'))
+
+    def test_prorate(self):
+        now = timezone.now()
+        monthly = self.create_cost(DAY, '10.00', period=30)
+        hourly = self.create_cost(HOUR, '2.40')
+        subscriptions = [
+            monthly.setup_user_subscription(User.objects.create_user('monthly'), subscription_date=now - timedelta(days=10)),
+            hourly.setup_user_subscription(User.objects.create_user('hourly'), subscription_date=now - timedelta(minutes=30)),
+            monthly.setup_user_subscription(User.objects.create_user('expired'), subscription_date=now - timedelta(days=40)),
+        ]
+        credits = prorate(subscriptions, as_of=now)
+        # 20 of 30 days left, half an hour of 2.40 per hour left
+        self.assertEqual(credits, {
+            subscriptions[0].pk: Decimal('6.67'),
+            subscriptions[1].pk: Decimal('1.20'),
+            subscriptions[2].pk: Decimal('0.00'),
+        })
+        with self.assertNumQueries(1):
+            self.assertEqual(prorate(UserSubscription.objects.all(), as_of=now), credits)
+
+    def test_credit_counts_partial_days_unlike_unused_balance(self):
+        now = timezone.now()
+        cost = self.create_cost(DAY, '10.00', period=30)
+        subscription = cost.setup_user_subscription(User.objects.create_user('partial'), subscription_date=now)
+        subscription.date_billing_next = now + timedelta(days=20, hours=12)
+        subscription.save()
+        # 20.5 of 30 days left, the balances only count the 20 whole days
+        self.assertEqual(prorate([subscription], as_of=now), {subscription.pk: Decimal('6.83')})
+        self.assertEqual(subscription.unused_daily_balance, 6.67)
+        self.assertEqual(
+            UserSubscription.objects.with_unused_balance(as_of=now).get(pk=subscription.pk).unused_balance,
+            Decimal('6.67'),
+        )
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import pytest
+from django.test import SimpleTestCase
+
+from subscriptions_api.models import PlanCost, RECURRENCE_UNIT_CHOICES, ONCE, MONTH, YEAR
+
+np = pytest.importorskip('numpy')
+
+from subscriptions_api.recurrence import next_billing_datetimes  # noqa: E402
+
+
+class TestNextBillingDatetimes(SimpleTestCase):
+
+    def test_matches_scalar_method(self):
+        start = datetime(2020, 2, 29, 13, 45, 12, 345678)
+        starts, units, periods = [], [], []
+        for unit, _ in RECURRENCE_UNIT_CHOICES:
+            for period in (1, 2, 3, 7, 12, 100):
+                for days in (0, 1, 17, 400):
+                    starts.append(start + timedelta(days=days, microseconds=days))
+                    units.append(unit)
+                    periods.append(period)
+        result = next_billing_datetimes(starts, units, periods)
+        for start, unit, period, value in zip(starts, units, periods, result.tolist()):
+            expected = PlanCost(recurrence_unit=unit, recurrence_period=period).next_billing_datetime(start)
+            self.assertEqual(value, expected, (unit, period))
+
+    def test_month_and_year_averages(self):
+        start = datetime(2021, 1, 1)
+        result = next_billing_datetimes([start, start], [MONTH, YEAR], [1, 1])
+        self.assertEqual(result[0].item(), start + timedelta(days=30.4368))
+        self.assertEqual(result[1].item(), start + timedelta(days=365.2425))
+
+    def test_once_is_nat(self):
+        result = next_billing_datetimes([datetime(2021, 1, 1)], [ONCE], [1])
+        self.assertTrue(np.isnat(result[0]))
+
+    def test_scalar_unit_broadcast_and_datetime64_input(self):
+        starts = np.array(['2021-01-01T00:00', '2021-06-15T12:30'], dtype='datetime64[us]')
+        result = next_billing_datetimes(starts, MONTH, 2)
+        cost = PlanCost(recurrence_unit=MONTH, recurrence_period=2)
+        self.assertEqual(result.tolist(), [cost.next_billing_datetime(start) for start in starts.tolist()])
+
+    def test_aware_datetimes(self):
+        start = datetime(2021, 3, 1, 8, tzinfo=dt_timezone(timedelta(hours=2)))
+        result = next_billing_datetimes([start], [MONTH], [1])
+        expected = PlanCost(recurrence_unit=MONTH, recurrence_period=1).next_billing_datetime(start)
+        self.assertEqual(result[0].item(), expected.replace(tzinfo=None))
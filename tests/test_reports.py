@@ -0,0 +1,138 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+import swapper
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from subscriptions_api.models import SubscriptionPlan, PlanCost, MONTH, YEAR, WEEK
+from subscriptions_api.reports import recurring_revenue, transaction_totals
+
+pytestmark = pytest.mark.django_db
+
+UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+
+
+class ReportDataMixin:
+
+    def create_report_data(self):
+        self.basic = SubscriptionPlan.objects.create(plan_name='Basic')
+        self.pro = SubscriptionPlan.objects.create(plan_name='Pro')
+        self.monthly = PlanCost.objects.create(plan=self.basic, recurrence_unit=MONTH, cost='10.00')
+        self.yearly = PlanCost.objects.create(plan=self.pro, recurrence_unit=YEAR, cost='120.00')
+        self.quarterly = PlanCost.objects.create(plan=self.pro, recurrence_unit=MONTH, recurrence_period=3, cost='30.00')
+        self.weekly = PlanCost.objects.create(plan=self.basic, recurrence_unit=WEEK, cost='7.00')
+        self.users = [User.objects.create_user('report_{}'.format(i)) for i in range(4)]
+        self.monthly.setup_user_subscription(self.users[0], active=True)
+        self.monthly.setup_user_subscription(self.users[1], active=True)
+        self.yearly.setup_user_subscription(self.users[1], active=True)
+        self.quarterly.setup_user_subscription(self.users[2], active=True)
+        self.weekly.setup_user_subscription(self.users[3], active=False)
+        subscription = self.users[0].subscriptions.get()
+        for date, amount, paid in (
+                (datetime(2024, 1, 1), '10.00', True),
+                (datetime(2024, 1, 20), '10.00', False),
+                (datetime(2024, 2, 14), '5.00', True),
+        ):
+            SubscriptionTransaction.objects.create(
+                user=self.users[0], subscription=subscription, amount=amount, paid=paid, date_transaction=date,
+            )
+
+
+@pytestmark
+class TestReports(ReportDataMixin, TestCase):
+
+    def setUp(self):
+        self.create_report_data()
+
+    def test_recurring_revenue_totals(self):
+        with self.assertNumQueries(1):
+            totals = recurring_revenue()
+        # 2 x 10 monthly + 120 yearly + 30 quarterly, the weekly subscription is inactive
+        self.assertEqual(totals['mrr'], Decimal('40.00'))
+        self.assertEqual(totals['arr'], Decimal('480.00'))
+        self.assertEqual(totals['subscriptions'], 4)
+        self.assertEqual(totals['subscribers'], 3)
+
+    def test_recurring_revenue_by_plan(self):
+        with self.assertNumQueries(1):
+            rows = {row['plan_name']: row for row in recurring_revenue(group_by='plan')}
+        self.assertEqual(rows['Basic']['mrr'], Decimal('20.00'))
+        self.assertEqual(rows['Pro']['mrr'], Decimal('20.00'))
+        self.assertEqual(rows['Pro']['subscribers'], 2)
+        self.assertEqual(rows['Pro']['plan'], self.pro.pk)
+
+    def test_recurring_revenue_by_plan_cost(self):
+        rows = {row['plan_cost']: row for row in recurring_revenue(group_by='plan_cost')}
+        self.assertEqual(rows[self.quarterly.pk]['mrr'], Decimal('10.00'))
+        self.assertEqual(rows[self.yearly.pk]['arr'], Decimal('120.00'))
+        self.assertNotIn(self.weekly.pk, rows)
+
+    def test_weekly_costs_normalized(self):
+        UserSubscription.objects.filter(plan_cost=self.weekly).update(active=True)
+        rows = {row['plan_cost']: row for row in recurring_revenue(group_by='plan_cost')}
+        self.assertEqual(rows[self.weekly.pk]['mrr'], Decimal('30.44'))
+
+    def test_transaction_totals(self):
+        with self.assertNumQueries(1):
+            rows = transaction_totals(period='month')
+        self.assertEqual([row['period'].month for row in rows], [1, 2])
+        january, february = rows
+        self.assertEqual(january['paid_total'], Decimal('10.00'))
+        self.assertEqual(january['unpaid_total'], Decimal('10.00'))
+        self.assertEqual(january['unpaid_count'], 1)
+        self.assertEqual(february['paid_total'], Decimal('5.00'))
+        self.assertEqual(february['unpaid_total'], Decimal('0.00'))
+        grouped = transaction_totals(period='year', group_by='plan')
+        self.assertEqual(grouped[0]['plan_name'], 'Basic')
+        self.assertEqual(grouped[0]['paid_count'], 2)
+        self.assertEqual(transaction_totals(start=datetime(2024, 2, 1))[0]['paid_total'], Decimal('5.00'))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            recurring_revenue(group_by='user')
+        with self.assertRaises(ValueError):
+            transaction_totals(period='hour')
+
+
+@pytestmark
+class TestReportEndpoints(ReportDataMixin, APITestCase):
+
+    def setUp(self):
+        self.create_report_data()
+        self.admin_user = User.objects.create_user('report_admin', is_staff=True)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.users[0])
+        r = self.client.get(reverse('subscriptions_api:reports-list'))
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_summary(self):
+        self.client.force_authenticate(self.admin_user)
+        r = self.client.get(reverse('subscriptions_api:reports-list'))
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['mrr'], '40.00')
+        self.assertEqual(r.data['arr'], '480.00')
+        self.assertNotIn('plan', r.data)
+
+    def test_revenue_and_transactions(self):
+        self.client.force_authenticate(self.admin_user)
+        r = self.client.get(reverse('subscriptions_api:reports-revenue'), {'group_by': 'plan'})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['plan_name'] for row in r.data], ['Basic', 'Pro'])
+        r = self.client.get(reverse('subscriptions_api:reports-transactions'), {'period': 'month'})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['paid_total'] for row in r.data], ['10.00', '5.00'])
+        # Untracked writes only show when aggregating the transactions
+        SubscriptionTransaction.objects.update(paid=True)
+        r = self.client.get(reverse('subscriptions_api:reports-transactions'), {'period': 'month', 'source': 'transactions'})
+        self.assertEqual([row['paid_total'] for row in r.data], ['20.00', '5.00'])
+        r = self.client.get(reverse('subscriptions_api:reports-transactions'), {'period': 'hour'})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        r = self.client.get(reverse('subscriptions_api:reports-transactions'), {'source': 'cache'})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,174 @@
+from datetime import datetime, date
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+import swapper
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase
+
+from subscriptions_api.billing import BillingEngine
+from subscriptions_api.models import DailyRevenueRollup
+from subscriptions_api.reports import transaction_totals
+from subscriptions_api.rollup import rebuild
+from tests.test_reports import ReportDataMixin
+
+pytestmark = pytest.mark.django_db
+
+UserSubscription = swapper.load_model('subscriptions_api', 'UserSubscription')
+SubscriptionTransaction = swapper.load_model('subscriptions_api', 'SubscriptionTransaction')
+
+
+@pytestmark
+class TestDailyRevenueRollup(ReportDataMixin, TestCase):
+
+    def setUp(self):
+        self.create_report_data()
+        self.subscription = self.users[0].subscriptions.get()
+
+    def rollup(self, day):
+        return DailyRevenueRollup.objects.get(day=day)
+
+    def rollup_rows(self):
+        return sorted(
+            DailyRevenueRollup.objects.filter(count__gt=0).values_list(
+                'day', 'plan', 'plan_cost', 'count', 'gross', 'paid_count', 'paid'
+            )
+        )
+
+    def test_transactions_rolled_up_on_create(self):
+        rollup = self.rollup(date(2024, 1, 1))
+        self.assertEqual(rollup.plan, self.basic)
+        self.assertEqual(rollup.plan_cost, self.monthly)
+        self.assertEqual((rollup.count, rollup.gross, rollup.paid_count, rollup.paid), (1, Decimal('10.00'), 1, Decimal('10.00')))
+        SubscriptionTransaction.objects.create(
+            subscription=self.subscription, amount='2.50', date_transaction=datetime(2024, 1, 1, 18),
+        )
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.count, rollup.gross, rollup.paid_count, rollup.paid), (2, Decimal('12.50'), 1, Decimal('10.00')))
+
+    def test_changed_and_deleted_transactions(self):
+        transaction = SubscriptionTransaction.objects.get(date_transaction=datetime(2024, 1, 20))
+        transaction.paid = True
+        transaction.amount = Decimal('12.00')
+        transaction.save()
+        rollup = self.rollup(date(2024, 1, 20))
+        self.assertEqual((rollup.count, rollup.gross, rollup.paid_count, rollup.paid), (1, Decimal('12.00'), 1, Decimal('12.00')))
+        # Saving without changes is not counted twice
+        with self.assertNumQueries(1):
+            transaction.save()
+
+        transaction.date_transaction = datetime(2024, 1, 21)
+        transaction.save()
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.count, rollup.gross), (0, Decimal('0.00')))
+        self.assertEqual(self.rollup(date(2024, 1, 21)).gross, Decimal('12.00'))
+
+        transaction.delete()
+        self.assertEqual(self.rollup(date(2024, 1, 21)).count, 0)
+
+    def test_transactions_keep_billed_plan(self):
+        transaction = SubscriptionTransaction.objects.get(date_transaction=datetime(2024, 1, 1))
+        self.assertEqual((transaction.plan, transaction.plan_cost), (self.basic, self.monthly))
+        # The subscription moves to another plan, its transactions stay counted under the one they were billed with
+        self.subscription.plan_cost = self.quarterly
+        self.subscription.save()
+        transaction.delete()
+        SubscriptionTransaction.objects.filter(subscription=self.subscription).mark_paid()
+        self.subscription.delete()
+        self.assertEqual(SubscriptionTransaction.objects.filter(plan_cost=self.monthly).count(), 2)
+        expected = [
+            (date(2024, 1, 20), self.basic.pk, self.monthly.pk, 1, Decimal('10.00'), 1, Decimal('10.00')),
+            (date(2024, 2, 14), self.basic.pk, self.monthly.pk, 1, Decimal('5.00'), 1, Decimal('5.00')),
+        ]
+        self.assertEqual(self.rollup_rows(), expected)
+        self.assertFalse(DailyRevenueRollup.objects.filter(count__lt=0).exists())
+        rebuild()
+        self.assertEqual(self.rollup_rows(), expected)
+
+    def test_plan_change_moves_transaction(self):
+        transaction = SubscriptionTransaction.objects.get(date_transaction=datetime(2024, 2, 14))
+        transaction.plan_cost = self.quarterly
+        transaction.plan = self.pro
+        transaction.save()
+        self.assertEqual(self.rollup_rows(), sorted([
+            (date(2024, 1, 1), self.basic.pk, self.monthly.pk, 1, Decimal('10.00'), 1, Decimal('10.00')),
+            (date(2024, 1, 20), self.basic.pk, self.monthly.pk, 1, Decimal('10.00'), 0, Decimal('0.00')),
+            (date(2024, 2, 14), self.pro.pk, self.quarterly.pk, 1, Decimal('5.00'), 1, Decimal('5.00')),
+        ]))
+
+    def test_mark_paid_locks_unpaid_rows(self):
+        queryset = SubscriptionTransaction.objects.filter(subscription=self.subscription)
+        # SQLite has no row locks, only the query sent is checked
+        with CaptureQueriesContext(connection) as queries, patch.object(
+            connection.features, 'has_select_for_update', True,
+        ), patch.object(connection.features, 'has_select_for_update_of', False):
+            with self.assertRaises(DatabaseError):
+                queryset.mark_paid()
+        self.assertTrue(queries[0]['sql'].endswith('FOR UPDATE'))
+
+    def test_activate_marks_rollup_paid(self):
+        self.subscription.activate()
+        rollup = self.rollup(date(2024, 1, 20))
+        self.assertEqual((rollup.paid_count, rollup.paid), (1, Decimal('10.00')))
+        self.assertFalse(SubscriptionTransaction.objects.filter(paid=False).exists())
+
+    def test_mark_paid(self):
+        SubscriptionTransaction.objects.create(
+            subscription=self.subscription, amount='3.00', date_transaction=datetime(2024, 2, 14),
+        )
+        self.assertEqual(SubscriptionTransaction.objects.filter(subscription=self.subscription).mark_paid(), 2)
+        self.assertEqual(SubscriptionTransaction.objects.mark_paid(), 0)
+        self.assertEqual(self.rollup(date(2024, 1, 20)).paid, Decimal('10.00'))
+        self.assertEqual(self.rollup(date(2024, 2, 14)).paid, Decimal('8.00'))
+
+    def test_bulk_activate_marks_rollup_paid(self):
+        UserSubscription.objects.filter(pk=self.subscription.pk).bulk_activate()
+        self.assertEqual(self.rollup(date(2024, 1, 20)).paid_count, 1)
+
+    def test_billing_engine_rolled_up(self):
+        now = datetime(2030, 1, 1)
+        stats = BillingEngine(now=now).run()
+        rollups = DailyRevenueRollup.objects.filter(day=now.date())
+        self.assertEqual(sum(rollup.count for rollup in rollups), stats.transactions)
+        self.assertEqual(sum(rollup.gross for rollup in rollups), stats.amount)
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.subscription.activate()
+        SubscriptionTransaction.objects.create(
+            subscription=None, amount='1.00', paid=True, date_transaction=datetime(2024, 3, 1),
+        )
+        expected = self.rollup_rows()
+        # Untracked writes are fixed by a rebuild
+        SubscriptionTransaction.objects.update(paid=False)
+        self.assertEqual(rebuild(start=date(2024, 1, 1), end=date(2024, 2, 1)), 2)
+        self.assertEqual(self.rollup(date(2024, 1, 1)).paid, Decimal('0.00'))
+        self.assertEqual(self.rollup(date(2024, 2, 14)).paid, Decimal('5.00'))
+        SubscriptionTransaction.objects.update(paid=True)
+        out = StringIO()
+        call_command('rebuild_revenue_rollup', stdout=out)
+        self.assertIn('Rebuilt 4 daily revenue rollup rows', out.getvalue())
+        self.assertEqual(self.rollup_rows(), expected)
+
+    def test_rollup_totals_match_transaction_totals(self):
+        SubscriptionTransaction.objects.create(
+            subscription=self.users[1].subscriptions.get(plan_cost=self.yearly), amount='120.00',
+            date_transaction=datetime(2024, 2, 1),
+        )
+        for period in ('day', 'month', 'year'):
+            for group_by in (None, 'plan', 'plan_cost'):
+                self.assertEqual(
+                    transaction_totals(period=period, group_by=group_by, rollup=True),
+                    transaction_totals(period=period, group_by=group_by),
+                )
+        with self.assertNumQueries(1):
+            rows = transaction_totals(start=datetime(2024, 1, 15), end=date(2024, 2, 2), rollup=True)
+        self.assertEqual([(row['paid_total'], row['unpaid_total']) for row in rows], [
+            (Decimal('0.00'), Decimal('10.00')),
+            (Decimal('0.00'), Decimal('120.00')),
+        ])
+        with self.assertRaises(ValueError):
+            transaction_totals(SubscriptionTransaction.objects.all(), rollup=True)